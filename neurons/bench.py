@@ -0,0 +1,238 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import gc
+import subprocess
+import sys
+import time
+import tracemalloc
+from timeit import default_timer as timer
+import neurons.engine
+import neurons.model
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+
+def bench_object_memory(node_count=2000, nerve_count=1000, connection_count=3):
+
+    gc.collect()
+
+    tracemalloc.start()
+
+    model = neurons.model.get_random_model(
+        node_count=node_count,
+        nerve_count=nerve_count,
+        connection_count=connection_count,
+        seed=0,
+    )
+
+    size, peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+
+    return {
+        "nodes": len(model.nodes),
+        "nerves": len(model.nerves),
+        "bytes": size,
+        "bytes_per_node": size / len(model.nodes),
+    }
+
+
+def bench_reference_step(
+    node_count=500,
+    nerve_count=250,
+    connection_count=3,
+    steps=200,
+    dt=1 / 60,
+    repeat=5,
+):
+
+    model = neurons.model.get_random_model(
+        node_count=node_count,
+        nerve_count=nerve_count,
+        connection_count=connection_count,
+        seed=0,
+    )
+
+    # Free energy deposit logs every live free energy at INFO.
+    logging.getLogger("neurons.model").setLevel(logging.WARNING)
+
+    elapsed = []
+
+    for run in range(repeat):
+
+        start = timer()
+
+        for step in range(steps):
+
+            model.advance(dt=dt)
+
+        elapsed.append(timer() - start)
+
+    return {
+        "nodes": len(model.nodes),
+        "nerves": len(model.nerves),
+        "steps": steps,
+        "seconds_per_step": min(elapsed) / steps,
+    }
+
+
+def bench_array_step(
+    node_count=20000, nerve_count=10000, connection_count=3, steps=200, dt=1 / 60
+):
+
+    array_model = neurons.engine.ArrayModel(
+        neurons.model.get_random_model(
+            node_count=node_count,
+            nerve_count=nerve_count,
+            connection_count=connection_count,
+            seed=0,
+        )
+    )
+
+    start = timer()
+
+    for step in range(steps):
+
+        array_model.advance(dt=dt)
+
+    advance_elapsed = timer() - start
+
+    array_model.fused.run(steps=1, dt=dt)
+
+    tracemalloc.start()
+
+    start = timer()
+
+    array_model.fused.run(steps=steps, dt=dt)
+
+    fused_elapsed = timer() - start
+
+    size, peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+
+    return {
+        "nodes": array_model.layout.node_count,
+        "nerves": array_model.layout.nerve_count,
+        "steps": steps,
+        "advance_seconds_per_step": advance_elapsed / steps,
+        "fused_seconds_per_step": fused_elapsed / steps,
+        "fused_peak_bytes": peak,
+    }
+
+
+def bench_segmentize(count=20000, segment_count=10):
+
+    a = neurons.model.XY(0, 0)
+    b = neurons.model.XY(1, 1)
+
+    start = timer()
+
+    for num in range(count):
+
+        for segment in a.segmentize(b, segment_count):
+
+            pass
+
+    elapsed = timer() - start
+
+    return {"calls": count, "seconds_per_call": elapsed / count}
+
+
+# Seconds a fresh interpreter may spend importing each module, from
+# python -X importtime, and modules each must leave unimported.
+import_budgets = {
+    "neurons.config": (0.1, ["pkg_resources"]),
+    "neurons.model": (0.1, ["numpy"]),
+    "neurons.gui": (0.15, ["dearpygui", "numpy"]),
+}
+
+
+def get_import_time(module):
+
+    # (seconds, modules imported) for importing module in a new interpreter.
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys, {module}; print(' '.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    for line in completed.stderr.splitlines():
+
+        fields = [field.strip() for field in line.split("|")]
+
+        if len(fields) == 3 and fields[2] == module:
+
+            return int(fields[1]) / 1e6, completed.stdout.split()
+
+    raise RuntimeError(f"no import time for {module} in {completed.stderr!r}")
+
+
+def bench_import(budgets=import_budgets, repeat=5):
+
+    result = {}
+
+    for module, (budget, unwanted) in budgets.items():
+
+        runs = [get_import_time(module) for run in range(repeat)]
+
+        seconds = min(seconds for seconds, imported in runs)
+
+        imported = [name for name in unwanted if name in runs[0][1]]
+
+        result[module] = {
+            "seconds": seconds,
+            "budget": budget,
+            "imported": imported,
+            "ok": seconds <= budget and not imported,
+        }
+
+        if not result[module]["ok"]:
+
+            log.warning(
+                "%s imports in %0.3fs (budget %0.3fs), also imported %s",
+                module,
+                seconds,
+                budget,
+                imported,
+            )
+
+    return result
+
+
+benchmarks = {
+    "import": bench_import,
+    "object_memory": bench_object_memory,
+    "reference_step": bench_reference_step,
+    "array_step": bench_array_step,
+    "segmentize": bench_segmentize,
+}
+
+
+def main():
+
+    for name, bench in benchmarks.items():
+
+        log.info("%s: %s", name, bench())
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
@@ -2,8 +2,8 @@ import collections, datetime, functools, itertools
 import json, logging, pathlib, random, re
 import configparser
 import functools
+import importlib.resources
 import pathlib
-import pkg_resources
 
 log = logging.getLogger(__name__)
 log.silent = functools.partial(log.log, 0)
@@ -11,13 +11,16 @@ log.silent = functools.partial(log.log, 0)
 rng = random.Random()
 
 config_file_paths = (
-    pkg_resources.resource_filename(__name__, "neurons.conf"),
+    importlib.resources.files(__package__) / "neurons.conf",
     pathlib.Path("~").expanduser() / "config" / "neurons.conf",
 )
 
 
+@functools.cache
 def load():
 
+    # Parsed once per process, every caller shares the same parser so
+    # should treat it as read only. load.cache_clear() rereads the files.
     config_parser = configparser.ConfigParser(
         converters={
             "Color": lambda s: json.loads(s),
@@ -26,12 +29,12 @@ def load():
 
     for config_file_path in config_file_paths:
 
-        config_file_path = pathlib.Path(config_file_path)
-
-        if config_file_path.exists():
+        if config_file_path.is_file():
 
             log.info("loading config from %s", config_file_path)
 
-            config_parser.read(config_file_path)
+            config_parser.read_string(
+                config_file_path.read_text(), source=str(config_file_path)
+            )
 
     return config_parser
@@ -0,0 +1,412 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import math
+import numpy as np
+import neurons.engine
+import neurons.model
+import neurons.world
+from neurons.engine import ArrayModel, State
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+
+def get_poisson(uniform, rate):
+
+    # Poisson counts by inverting the CDF at each uniform.
+    counts = np.zeros(len(uniform), dtype=np.intp)
+
+    k = 0
+    cdf = probability = math.exp(-rate)
+
+    while True:
+
+        above = uniform > cdf
+
+        # Past the mean with nothing left to add, only rounding remains.
+        if not above.any() or (k > rate and cdf + probability == cdf):
+
+            return counts
+
+        counts += above
+
+        k += 1
+
+        probability = math.exp(k * math.log(rate) - rate - math.lgamma(k + 1))
+
+        cdf += probability
+
+
+class BatchModel:
+
+    # batch_size copies of one network, each ArrayModel state array gaining a
+    # leading batch axis. Edge weights are per copy so each brain can carry
+    # its own weights. Free energy is drawn per copy from its own generator
+    # in `randoms`, so a copy never depends on what it is batched with:
+    # `seed` is either one seed the generators are spawned from or a
+    # sequence of one seed (or SeedSequence) per copy. Draws are taken in
+    # order from a buffer of each generator's uniforms (see take_uniform),
+    # so a tick needs no Python loop over the copies.
+    def __init__(self, model, batch_size, dtype=np.float64, seed=None):
+
+        template = ArrayModel(model, dtype=dtype)
+
+        self.layout = template.layout
+        self.batch_size = batch_size
+
+        spec = {
+            name: ((batch_size,) + shape, array_dtype)
+            for name, (shape, array_dtype) in template.state.spec.items()
+        }
+
+        self.state = State(spec, self.layout.node_count)
+
+        for name, array in template.state.items():
+
+            getattr(self.state, name)[...] = array
+
+        self.edge_weight = np.broadcast_to(
+            self.layout.edge_weight, (batch_size, self.layout.edge_count)
+        ).copy()
+
+        self.free_energy_per_second = template.free_energy_per_second
+        self.distance_decay = template.distance_decay
+        self.distance_scale = template.distance_scale
+        self.neuron_output_per_second = template.neuron_output_per_second
+        self.energy_stop_firing_threshold = template.energy_stop_firing_threshold
+        self.energy_start_firing_threshold = template.energy_start_firing_threshold
+        self.axon_inefficiency = template.axon_inefficiency
+
+        if isinstance(seed, (list, tuple)):
+
+            if len(seed) != batch_size:
+
+                raise ValueError(f"expected {batch_size} seeds, got {len(seed)}")
+
+            seeds = seed
+
+        else:
+
+            seeds = np.random.SeedSequence(seed).spawn(batch_size)
+
+        self.randoms = [np.random.default_rng(copy_seed) for copy_seed in seeds]
+
+        # Each copy's unused uniforms are uniform_buffer[num, uniform_used[num]:].
+        self.uniform_buffer = np.empty((batch_size, 0))
+        self.uniform_used = np.zeros(batch_size, dtype=np.intp)
+
+        self.rows = np.arange(batch_size)[:, None]
+
+        self.node_index = {
+            unique_id: num for num, unique_id in enumerate(self.layout.node_ids)
+        }
+
+    def store(self, array_model, batch_num):
+
+        for name, array in self.state.items():
+
+            getattr(array_model.state, name)[...] = array[batch_num]
+
+    def take_uniform(self, counts):
+
+        # The next counts[num] uniforms of each copy's stream, concatenated in
+        # copy order. When any copy runs short every copy's buffer is
+        # topped up; a stream's values do not depend on how it is drawn in
+        # pieces, so neither does any copy's sequence.
+        available = self.uniform_buffer.shape[1] - self.uniform_used
+
+        if (available < counts).any():
+
+            width = max(256, self.uniform_buffer.shape[1], int(counts.max()))
+
+            buffer = np.empty((self.batch_size, width))
+
+            for num, random in enumerate(self.randoms):
+
+                remaining = self.uniform_buffer[num, self.uniform_used[num] :]
+
+                buffer[num, : len(remaining)] = remaining
+                buffer[num, len(remaining) :] = random.random(width - len(remaining))
+
+            self.uniform_buffer = buffer
+            self.uniform_used[:] = 0
+
+        rows = np.repeat(np.arange(self.batch_size), counts)
+
+        offsets = np.cumsum(counts) - counts
+
+        columns = self.uniform_used[rows] + np.arange(len(rows)) - offsets[rows]
+
+        self.uniform_used += counts
+
+        return self.uniform_buffer[rows, columns]
+
+    def advance(self, dt):
+
+        self.advance_free_energy(dt)
+        self.advance_nodes(dt)
+        self.advance_nerves(dt)
+
+    def advance_free_energy(self, dt):
+
+        state = self.state
+        layout = self.layout
+
+        dead = state.fe_mag < 0
+
+        state.fe_mag -= dt
+
+        rate = self.free_energy_per_second * dt
+
+        counts = get_poisson(
+            self.take_uniform(np.ones(self.batch_size, dtype=np.intp)), rate
+        )
+
+        # Each copy fills its first `count` dead slots, as ArrayModel does.
+        new = dead & (np.cumsum(dead, axis=1, dtype=np.intp) <= counts[:, None])
+
+        new_count = int(new.sum())
+
+        if not new_count:
+
+            return
+
+        batch_index = np.nonzero(new)[0]
+
+        # Each copy draws positions for as many slots as it filled.
+        pos = self.take_uniform(2 * new.sum(axis=1)).reshape(-1, 2)
+
+        x = pos[:, 0]
+        y = pos[:, 1]
+
+        state.fe_x[new] = x
+        state.fe_y[new] = y
+        state.fe_mag[new] = 1
+
+        distance = np.sqrt(
+            np.float_power(layout.node_x - x[:, None], 2)
+            + np.float_power(layout.node_y - y[:, None], 2)
+        )
+
+        np.add.at(
+            state.node_energy,
+            batch_index,
+            ArrayModel.generic_get_decay(
+                distance, self.distance_scale, self.distance_decay
+            ).astype(layout.dtype),
+        )
+
+    def advance_nodes(self, dt):
+
+        state = self.state
+
+        energy = state.node_energy
+        firing = state.node_firing
+
+        np.copyto(
+            firing,
+            np.where(
+                firing,
+                ~(energy < self.energy_stop_firing_threshold),
+                energy > self.energy_start_firing_threshold,
+            ),
+        )
+
+        output = np.where(
+            firing, np.minimum(self.neuron_output_per_second * dt, energy), 0
+        )
+
+        state.node_output[...] = output
+
+        np.add.at(
+            state.nerve_stimulation,
+            (slice(None), self.layout.node_axon),
+            output * self.axon_inefficiency,
+        )
+
+        energy[...] = np.where(
+            firing, energy - output, np.maximum(0, energy + state.node_stimulation)
+        )
+
+        state.node_stimulation[...] = 0
+
+    def advance_nerves(self, dt):
+
+        state = self.state
+        layout = self.layout
+
+        clock = state.nerve_clock
+        head = state.nerve_head
+
+        fire = clock > layout.nerve_period
+
+        if not fire.any():
+
+            # Nothing pops or delivers, only stimulation is injected.
+            state.nerve_output[...] = 0
+
+            state.myelin[self.rows, layout.nerve_offset + head] += state.nerve_stimulation
+
+            state.nerve_stimulation[...] = 0
+
+            clock += dt
+
+            return
+
+        last = layout.nerve_offset + (head + layout.nerve_length - 1) % layout.nerve_length
+
+        output = np.where(fire, np.take_along_axis(state.myelin, last, axis=1), 0)
+
+        state.nerve_output[...] = output
+
+        state.myelin[self.rows, last] = np.where(
+            fire, 0, np.take_along_axis(state.myelin, last, axis=1)
+        )
+
+        head[...] = np.where(fire, last - layout.nerve_offset, head)
+
+        clock[...] = np.where(fire, clock - layout.nerve_period, clock)
+
+        contribution = (
+            output[:, layout.edge_source] * self.edge_weight
+        ) / layout.nerve_fanout[layout.edge_source]
+
+        split = layout.edge_split
+
+        np.add.at(
+            state.stimulation,
+            (slice(None), layout.edge_target[:split]),
+            contribution[:, :split],
+        )
+
+        state.myelin[self.rows, layout.nerve_offset + head] += state.nerve_stimulation
+
+        state.nerve_stimulation[...] = 0
+
+        np.add.at(
+            state.stimulation,
+            (slice(None), layout.edge_target[split:]),
+            contribution[:, split:],
+        )
+
+        clock += dt
+
+
+class Coupling:
+
+    # Closes the loop between an ArrayWorld and one brain per agent. Each tick
+    # the world's sensors stimulate the named input nodes, all brains advance
+    # together and the motor becomes a weighted sum of the named output
+    # nodes' outputs.
+    #
+    # sensors: {"contact_sensor": [(node_id, gain), ...], ...}
+    # motors: [(node_id, gain), ...]
+    def __init__(self, model, world, sensors, motors, dtype=np.float64, seed=None):
+
+        self.world = world
+
+        self.brains = BatchModel(
+            model,
+            batch_size=world.world_count * world.agent_count,
+            dtype=dtype,
+            seed=seed,
+        )
+
+        node_index = self.brains.node_index
+
+        self.sensors = [
+            (sensor, node_index[node_id], gain)
+            for sensor, targets in sensors.items()
+            for node_id, gain in targets
+        ]
+
+        self.motors = [(node_index[node_id], gain) for node_id, gain in motors]
+
+        self.run_time = 0
+
+    def tick(self, dt):
+
+        world = self.world
+        brains = self.brains
+
+        world.update_inputs(dt=dt)
+
+        stimulation = brains.state.node_stimulation
+
+        for sensor, node_num, gain in self.sensors:
+
+            stimulation[:, node_num] += gain * getattr(world, sensor).reshape(-1)
+
+        brains.advance(dt)
+
+        output = brains.state.node_output
+
+        motor = world.motor.reshape(-1)
+
+        motor[...] = 0
+
+        for node_num, gain in self.motors:
+
+            motor += gain * output[:, node_num]
+
+        world.update_state(dt=dt)
+
+        self.run_time += dt
+
+    def run(self, steps, dt):
+
+        for step in range(steps):
+
+            self.tick(dt)
+
+
+default_sensors = {
+    "contact_sensor": [("0", 1)],
+    "position_sensor": [("2", 0.1)],
+    "target_sensor": [("4", 0.1)],
+}
+
+default_motors = [("1", 1), ("3", -1)]
+
+
+def get_default_coupling(world_count=100, agent_count=2, seed=None):
+
+    world = neurons.world.ArrayWorld(agent_count=agent_count, world_count=world_count)
+
+    return Coupling(
+        neurons.model.get_default_model_003(),
+        world,
+        sensors=default_sensors,
+        motors=default_motors,
+        seed=seed,
+    )
+
+
+def main():
+
+    coupling = get_default_coupling(world_count=1000, agent_count=2)
+
+    for second in range(10):
+
+        coupling.run(steps=60, dt=1 / 60)
+
+        log.info(
+            "time: %5.1f. world=%s mean target distance %0.2f",
+            coupling.run_time,
+            coupling.world.render(),
+            coupling.world.target_sensor.mean(),
+        )
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
@@ -0,0 +1,1174 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import dataclasses
+import typing
+import numpy as np
+import neurons.decay
+import neurons.field
+import neurons.model
+import neurons.plasticity
+import neurons.schedule
+from neurons.model import Model, Nerve, Node, FreeEnergy, XY
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+
+@dataclasses.dataclass
+class Layout:
+
+    # Static topology of a Model, compiled to arrays. Stimulation targets
+    # share one index space: nodes are 0..node_count-1, nerves follow.
+    node_ids: typing.List
+    nerve_ids: typing.List
+    nerve_targets: typing.List[typing.List]
+    node_x: np.ndarray
+    node_y: np.ndarray
+    node_axon: np.ndarray
+    nerve_x: np.ndarray
+    nerve_y: np.ndarray
+    nerve_length: np.ndarray
+    nerve_offset: np.ndarray
+    nerve_fanout: np.ndarray
+    # Propagation period of each nerve, float64 like the clocks.
+    nerve_period: np.ndarray
+    edge_source: np.ndarray
+    edge_target: np.ndarray
+    edge_weight: np.ndarray
+    # Edges before edge_split deliver before their target nerve injects its
+    # stimulation this tick, the rest arrive after (see get_layout).
+    edge_split: int
+    free_energy_count: int
+    dtype: np.dtype
+    index_dtype: np.dtype
+
+    @property
+    def node_count(self):
+
+        return len(self.node_ids)
+
+    @property
+    def nerve_count(self):
+
+        return len(self.nerve_ids)
+
+    @property
+    def cell_count(self):
+
+        return int(self.nerve_length.sum())
+
+    @property
+    def edge_count(self):
+
+        return len(self.edge_source)
+
+
+def get_index_dtype(max_value):
+
+    # Smallest signed integer type that can hold index arithmetic up to
+    # max_value, signed so head and offset subtraction cannot wrap.
+    for dtype in (np.int16, np.int32):
+
+        if max_value <= np.iinfo(dtype).max:
+
+            return np.dtype(dtype)
+
+    return np.dtype(np.int64)
+
+
+def get_edges(model):
+
+    # (source nerve, target, weight, slot in the source's weights) in layout
+    # order, and the count of same-tick edges at the front.
+    #
+    # Model.generic_advance_nerves walks the nerves in order, delivering each
+    # nerve's output before injecting its own stimulation. A target nerve
+    # later in the list (or the nerve itself) receives the delivery in the
+    # same tick, an earlier one only after it has already injected, so it
+    # carries over to the next tick. Node targets are read in the next node
+    # pass either way.
+    node_count = len(model.nodes)
+
+    target_index = {id(node): num for num, node in enumerate(model.nodes)}
+
+    target_index.update(
+        (id(nerve), node_count + num) for num, nerve in enumerate(model.nerves)
+    )
+
+    same_edges = []
+    deferred_edges = []
+
+    for source_num, nerve in enumerate(model.nerves):
+
+        for slot, (target, weight) in enumerate(zip(nerve.target, nerve.weights)):
+
+            target_num = target_index[id(target)]
+
+            edge = (source_num, target_num, weight, slot)
+
+            if target_num - node_count >= source_num or target_num < node_count:
+
+                same_edges.append(edge)
+
+            else:
+
+                deferred_edges.append(edge)
+
+    return same_edges + deferred_edges, len(same_edges)
+
+
+def get_layout(model, dtype=np.float64):
+
+    dtype = np.dtype(dtype)
+
+    node_count = len(model.nodes)
+
+    nerve_index = {id(nerve): num for num, nerve in enumerate(model.nerves)}
+
+    lengths = [nerve.length for nerve in model.nerves]
+
+    cell_count = sum(lengths)
+
+    index_dtype = get_index_dtype(
+        max(2 * max(lengths, default=0), cell_count, node_count + len(model.nerves))
+    )
+
+    nerve_length = np.array(lengths, dtype=index_dtype)
+
+    nerve_offset = np.zeros_like(nerve_length)
+
+    np.cumsum(nerve_length[:-1], out=nerve_offset[1:])
+
+    edges, edge_split = get_edges(model)
+
+    return Layout(
+        node_ids=[node.unique_id for node in model.nodes],
+        nerve_ids=[nerve.unique_id for nerve in model.nerves],
+        nerve_targets=[[t.unique_id for t in nerve.target] for nerve in model.nerves],
+        node_x=np.array([node.pos.x for node in model.nodes], dtype=dtype),
+        node_y=np.array([node.pos.y for node in model.nodes], dtype=dtype),
+        node_axon=np.array(
+            [nerve_index[id(node.axon)] for node in model.nodes], dtype=index_dtype
+        ),
+        nerve_x=np.array([nerve.pos.x for nerve in model.nerves], dtype=dtype),
+        nerve_y=np.array([nerve.pos.y for nerve in model.nerves], dtype=dtype),
+        nerve_length=nerve_length,
+        nerve_offset=nerve_offset,
+        nerve_fanout=np.array(
+            [max(1, len(nerve.target)) for nerve in model.nerves], dtype=index_dtype
+        ),
+        nerve_period=np.array(
+            [
+                model.nerve_propogation_time
+                if nerve.propogation_time is None
+                else nerve.propogation_time
+                for nerve in model.nerves
+            ],
+            dtype=np.float64,
+        ),
+        edge_source=np.array([e[0] for e in edges], dtype=index_dtype),
+        edge_target=np.array([e[1] for e in edges], dtype=index_dtype),
+        edge_weight=np.array([e[2] for e in edges], dtype=dtype),
+        edge_split=edge_split,
+        free_energy_count=len(model.free_energies),
+        dtype=dtype,
+        index_dtype=index_dtype,
+    )
+
+
+def get_state_spec(layout):
+
+    node_count = layout.node_count
+    nerve_count = layout.nerve_count
+    dtype = layout.dtype
+
+    return {
+        "node_energy": ((node_count,), dtype),
+        "node_firing": ((node_count,), np.bool_),
+        "node_output": ((node_count,), dtype),
+        "stimulation": ((node_count + nerve_count,), dtype),
+        "nerve_output": ((nerve_count,), dtype),
+        # Clocks stay double so propagation happens on the same ticks
+        # whatever the state precision.
+        "nerve_clock": ((nerve_count,), np.float64),
+        "nerve_head": ((nerve_count,), layout.index_dtype),
+        "myelin": ((layout.cell_count,), dtype),
+        "fe_x": ((layout.free_energy_count,), dtype),
+        "fe_y": ((layout.free_energy_count,), dtype),
+        "fe_mag": ((layout.free_energy_count,), dtype),
+    }
+
+
+class State:
+
+    # Dynamic per-element state. Node and nerve stimulation are views onto
+    # the shared `stimulation` array so nerve deliveries can scatter into
+    # both with a single index.
+    def __init__(self, spec, node_count):
+
+        self.spec = spec
+
+        for name, (shape, dtype) in spec.items():
+
+            setattr(self, name, np.zeros(shape, dtype=dtype))
+
+        self.node_stimulation = self.stimulation[..., :node_count]
+        self.nerve_stimulation = self.stimulation[..., node_count:]
+
+    def items(self):
+
+        for name in self.spec:
+
+            yield name, getattr(self, name)
+
+    @property
+    def nbytes(self):
+
+        return sum(array.nbytes for name, array in self.items())
+
+
+class ArrayModel:
+
+    # Vectorised counterpart of Model. Parameters are read from the source
+    # model so instance overrides carry over. Setting one afterwards rebinds
+    # it into advance, as on Model; FusedStep reads the attributes directly.
+    def __init__(self, model, dtype=np.float64):
+
+        self.layout = get_layout(model, dtype=dtype)
+
+        self.state = State(get_state_spec(self.layout), self.layout.node_count)
+
+        self.free_energy_per_second = model.free_energy_per_second
+        self.distance_decay = model.distance_decay
+        self.distance_scale = model.distance_scale
+        self.neuron_output_per_second = model.neuron_output_per_second
+        self.nerve_propogation_time = model.nerve_propogation_time
+        self.energy_stop_firing_threshold = model.energy_stop_firing_threshold
+        self.energy_start_firing_threshold = model.energy_start_firing_threshold
+        self.axon_inefficiency = model.axon_inefficiency
+
+        # Set by use_field or use_decay_cache to change how free energy is
+        # deposited.
+        self.field = None
+        self.decay_cache = None
+
+        # Set by use_plasticity to let edge weights change as it runs.
+        self.plasticity = None
+
+        self.load(model)
+
+        layout = self.layout
+
+        self.advance = functools.partial(
+            ArrayModel.generic_advance,
+            advance_free_energy=functools.partial(
+                ArrayModel.generic_advance_free_energy,
+                state=self.state,
+                node_x=layout.node_x,
+                node_y=layout.node_y,
+                free_energy_per_second=self.free_energy_per_second,
+                get_decay=functools.partial(
+                    ArrayModel.generic_get_decay,
+                    distance_scale=self.distance_scale,
+                    distance_decay=self.distance_decay,
+                ),
+                rng=neurons.model.rng,
+            ),
+            advance_nodes=functools.partial(
+                ArrayModel.generic_advance_nodes,
+                state=self.state,
+                node_axon=layout.node_axon,
+                energy_start_firing_threshold=self.energy_start_firing_threshold,
+                energy_stop_firing_threshold=self.energy_stop_firing_threshold,
+                neuron_output_per_second=self.neuron_output_per_second,
+                axon_inefficiency=self.axon_inefficiency,
+            ),
+            advance_nerves=functools.partial(
+                ArrayModel.generic_advance_nerves,
+                state=self.state,
+                layout=layout,
+            ),
+        )
+
+    def __setattr__(self, name, value):
+
+        super().__setattr__(name, value)
+
+        if name in neurons.model.parameter_names and "advance" in self.__dict__:
+
+            self.advance = neurons.model.rebind(self.advance, name, value)
+
+    def load(self, model):
+
+        state = self.state
+        layout = self.layout
+
+        for num, node in enumerate(model.nodes):
+
+            state.node_energy[num] = node.energy
+            state.node_firing[num] = node.firing
+            state.node_output[num] = node.output
+            state.node_stimulation[num] = node.stimulation
+
+        for num, nerve in enumerate(model.nerves):
+
+            offset = layout.nerve_offset[num]
+
+            state.nerve_output[num] = nerve.output
+            state.nerve_stimulation[num] = nerve.stimulation
+            state.nerve_clock[num] = nerve.clock
+            state.nerve_head[num] = 0
+            state.myelin[offset : offset + nerve.length] = list(nerve.myelin)
+
+        for num, free_energy in enumerate(model.free_energies):
+
+            if free_energy is None:
+
+                # An empty slot behaves like a spent free energy forever.
+                state.fe_mag[num] = -np.inf
+
+            else:
+
+                state.fe_x[num] = free_energy.pos.x
+                state.fe_y[num] = free_energy.pos.y
+                state.fe_mag[num] = free_energy.mag
+
+    def store(self, model):
+
+        state = self.state
+
+        for node, energy, firing, output, stimulation in zip(
+            model.nodes,
+            state.node_energy.tolist(),
+            state.node_firing.tolist(),
+            state.node_output.tolist(),
+            state.node_stimulation.tolist(),
+        ):
+
+            node.energy = energy
+            node.firing = firing
+            node.output = output
+            node.stimulation = stimulation
+
+        for num, nerve in enumerate(model.nerves):
+
+            nerve.output = float(state.nerve_output[num])
+            nerve.stimulation = float(state.nerve_stimulation[num])
+            nerve.clock = float(state.nerve_clock[num])
+            nerve.myelin.clear()
+            nerve.myelin.extend(self.get_myelin(num).tolist())
+
+        for num, (x, y, mag) in enumerate(
+            zip(state.fe_x.tolist(), state.fe_y.tolist(), state.fe_mag.tolist())
+        ):
+
+            free_energy = model.free_energies[num]
+
+            if mag == -np.inf:
+
+                model.free_energies[num] = None
+
+            elif free_energy is not None and (free_energy.pos.x, free_energy.pos.y) == (x, y):
+
+                free_energy.mag = mag
+
+            else:
+
+                model.free_energies[num] = FreeEnergy(pos=XY(x, y), mag=mag)
+
+        if self.plasticity is not None:
+
+            edges, edge_split = get_edges(model)
+
+            for (source_num, target_num, weight, slot), new_weight in zip(
+                edges, self.layout.edge_weight.tolist()
+            ):
+
+                model.nerves[source_num].weights[slot] = new_weight
+
+        model.mark_all_changed()
+
+    @functools.cached_property
+    def cell_nerve(self):
+
+        layout = self.layout
+
+        return np.repeat(np.arange(layout.nerve_count), layout.nerve_length)
+
+    def get_logical_myelin(self):
+
+        # Every nerve's cells left to right, as Nerve.myelin holds them.
+        layout = self.layout
+        cell_nerve = self.cell_nerve
+
+        cell_offset = layout.nerve_offset[cell_nerve].astype(np.intp)
+
+        logical = cell_offset + (
+            np.arange(layout.cell_count) - cell_offset + self.state.nerve_head[cell_nerve]
+        ) % layout.nerve_length[cell_nerve]
+
+        return self.state.myelin[logical]
+
+    def get_myelin(self, nerve_num):
+
+        offset = self.layout.nerve_offset[nerve_num]
+        length = self.layout.nerve_length[nerve_num]
+
+        cells = self.state.myelin[offset : offset + length]
+
+        return np.roll(cells, -self.state.nerve_head[nerve_num])
+
+    @property
+    def jsonable_state(self):
+
+        state = self.state
+        layout = self.layout
+
+        return {
+            "nodes": [
+                {
+                    "unique_id": unique_id,
+                    "pos": [x, y],
+                    "energy": energy,
+                    "firing": int(firing),
+                    "axon": layout.nerve_ids[axon],
+                    "output": output,
+                    "stimulation": stimulation,
+                }
+                for unique_id, x, y, energy, firing, axon, output, stimulation in zip(
+                    layout.node_ids,
+                    layout.node_x.tolist(),
+                    layout.node_y.tolist(),
+                    state.node_energy.tolist(),
+                    state.node_firing.tolist(),
+                    layout.node_axon.tolist(),
+                    state.node_output.tolist(),
+                    state.node_stimulation.tolist(),
+                )
+            ],
+            "nerves": [
+                {
+                    "unique_id": unique_id,
+                    "is_axon": num in self.axon_nums,
+                    "length": int(layout.nerve_length[num]),
+                    "target": layout.nerve_targets[num],
+                    "myelin": self.get_myelin(num).tolist(),
+                    "output": float(state.nerve_output[num]),
+                    "stimulation": float(state.nerve_stimulation[num]),
+                }
+                for num, unique_id in enumerate(layout.nerve_ids)
+            ],
+        }
+
+    def get_activity(self):
+
+        if not self.layout.node_count:
+
+            return 0, 0
+
+        return (
+            float(self.state.node_energy.mean()),
+            float(self.state.node_firing.mean()),
+        )
+
+    def advance_many(self, steps, dt, record=None, record_every=None):
+
+        return Model.generic_advance_many(
+            self,
+            functools.partial(self.fused.run, dt=dt),
+            steps,
+            dt,
+            record=record,
+            record_every=record_every,
+        )
+
+    def use_field(self, grid_size=128):
+
+        # Swaps the exact pairwise free energy deposit for the FFT grid field,
+        # see neurons.field for its accuracy. The random draws are unchanged.
+        self.field = neurons.field.GridField(
+            self.layout.node_x,
+            self.layout.node_y,
+            functools.partial(
+                ArrayModel.generic_get_decay,
+                distance_scale=self.distance_scale,
+                distance_decay=self.distance_decay,
+            ),
+            grid_size=grid_size,
+        )
+
+        self.advance = functools.partial(
+            self.advance,
+            advance_free_energy=functools.partial(
+                ArrayModel.generic_advance_free_energy_field,
+                state=self.state,
+                field=self.field,
+                free_energy_per_second=self.free_energy_per_second,
+                rng=neurons.model.rng,
+            ),
+        )
+
+    def use_decay_cache(self, resolution=1 / 64, max_bytes=256 * 2**20):
+
+        # Deposits free energy from a neurons.decay.DecayCache. Positions are
+        # checked against the layout every tick, so moving nodes in place
+        # clears the cache.
+        self.decay_cache = neurons.decay.DecayCache(
+            functools.partial(
+                ArrayModel.generic_get_decay,
+                distance_scale=self.distance_scale,
+                distance_decay=self.distance_decay,
+            ),
+            resolution=resolution,
+            max_bytes=max_bytes,
+        )
+
+        self.advance = functools.partial(
+            self.advance,
+            advance_free_energy=functools.partial(
+                ArrayModel.generic_advance_free_energy_cached,
+                state=self.state,
+                node_x=self.layout.node_x,
+                node_y=self.layout.node_y,
+                free_energy_per_second=self.free_energy_per_second,
+                decay_cache=self.decay_cache,
+                rng=neurons.model.rng,
+            ),
+        )
+
+    def use_plasticity(self, rule=None):
+
+        # Applies a neurons.plasticity rule to layout.edge_weight as the model
+        # runs; store writes the weights back to the model. A later call
+        # replaces the rule rather than running both.
+        advance_nerves = self.advance.keywords["advance_nerves"]
+
+        if advance_nerves.func is ArrayModel.generic_advance_nerves_plastic:
+
+            advance_nerves = advance_nerves.keywords["advance_nerves"]
+
+        self.plasticity = neurons.plasticity.Plasticity(self.layout, rule)
+
+        self.advance = functools.partial(
+            self.advance,
+            advance_nerves=functools.partial(
+                ArrayModel.generic_advance_nerves_plastic,
+                state=self.state,
+                advance_nerves=advance_nerves,
+                plasticity=self.plasticity,
+            ),
+        )
+
+    @functools.cached_property
+    def fused(self):
+
+        return FusedStep(self)
+
+    @functools.cached_property
+    def axon_nums(self):
+
+        return set(self.layout.node_axon.tolist())
+
+    def generic_get_decay(distance, distance_scale, distance_decay):
+
+        # Model.generic_get_decay through C pow, which ndarray.__pow__ skips
+        # for small integer exponents.
+        return 1 / np.float_power((distance * distance_scale) + 1, distance_decay)
+
+    def generic_advance_free_energy(
+        dt, state, node_x, node_y, free_energy_per_second, get_decay, rng
+    ):
+
+        # Same random draws, in the same order, as
+        # Model.generic_advance_free_energy.
+        dead_indices = np.flatnonzero(state.fe_mag < 0)
+
+        state.fe_mag -= dt
+
+        free_energy_count = np.random.poisson(free_energy_per_second * dt, 1)[0]
+
+        for free_index in dead_indices[:free_energy_count]:
+
+            x = rng.random()
+            y = rng.random()
+
+            state.fe_x[free_index] = x
+            state.fe_y[free_index] = y
+            state.fe_mag[free_index] = 1
+
+            # XY.distance squares with Python's float pow, ndarray.__pow__
+            # would multiply instead, which rounds differently.
+            distance = np.sqrt(
+                np.float_power(node_x - x, 2) + np.float_power(node_y - y, 2)
+            )
+
+            state.node_energy += get_decay(distance)
+
+    def generic_advance_free_energy_field(dt, state, field, free_energy_per_second, rng):
+
+        # generic_advance_free_energy with the tick's arrivals deposited
+        # together through the field.
+        dead_indices = np.flatnonzero(state.fe_mag < 0)
+
+        state.fe_mag -= dt
+
+        free_energy_count = np.random.poisson(free_energy_per_second * dt, 1)[0]
+
+        new_indices = dead_indices[:free_energy_count]
+
+        if not len(new_indices):
+
+            return
+
+        positions = [(rng.random(), rng.random()) for free_index in new_indices]
+
+        x = np.array([position[0] for position in positions])
+        y = np.array([position[1] for position in positions])
+
+        state.fe_x[new_indices] = x
+        state.fe_y[new_indices] = y
+        state.fe_mag[new_indices] = 1
+
+        state.node_energy += field.deposit(x, y).astype(state.node_energy.dtype)
+
+    def generic_advance_free_energy_cached(
+        dt, state, node_x, node_y, free_energy_per_second, decay_cache, rng
+    ):
+
+        dead_indices = np.flatnonzero(state.fe_mag < 0)
+
+        state.fe_mag -= dt
+
+        free_energy_count = np.random.poisson(free_energy_per_second * dt, 1)[0]
+
+        new_indices = dead_indices[:free_energy_count]
+
+        if not len(new_indices):
+
+            return
+
+        decay_cache.validate(node_x, node_y)
+
+        for free_index in new_indices:
+
+            x = rng.random()
+            y = rng.random()
+
+            state.fe_x[free_index] = x
+            state.fe_y[free_index] = y
+            state.fe_mag[free_index] = 1
+
+            state.node_energy += decay_cache.get_deposit(x, y).astype(
+                state.node_energy.dtype
+            )
+
+    def generic_advance_nodes(
+        dt,
+        state,
+        node_axon,
+        energy_start_firing_threshold,
+        energy_stop_firing_threshold,
+        neuron_output_per_second,
+        axon_inefficiency,
+    ):
+
+        energy = state.node_energy
+        firing = state.node_firing
+
+        np.copyto(
+            firing,
+            np.where(
+                firing,
+                ~(energy < energy_stop_firing_threshold),
+                energy > energy_start_firing_threshold,
+            ),
+        )
+
+        output = np.where(firing, np.minimum(neuron_output_per_second * dt, energy), 0)
+
+        state.node_output[:] = output
+
+        np.add.at(
+            state.nerve_stimulation,
+            node_axon[firing],
+            output[firing] * axon_inefficiency,
+        )
+
+        energy[:] = np.where(
+            firing, energy - output, np.maximum(0, energy + state.node_stimulation)
+        )
+
+        state.node_stimulation[:] = 0
+
+    def generic_advance_nerves(dt, state, layout):
+
+        clock = state.nerve_clock
+        head = state.nerve_head
+
+        fire = clock > layout.nerve_period
+
+        # Myelin is a ring buffer per nerve; popping the rightmost cell and
+        # appending a zero on the left is a single head decrement.
+        last = layout.nerve_offset + (head + layout.nerve_length - 1) % layout.nerve_length
+
+        output = np.where(fire, state.myelin[last], 0)
+
+        state.nerve_output[:] = output
+
+        fired_last = last[fire]
+
+        state.myelin[fired_last] = 0
+
+        head[fire] = fired_last - layout.nerve_offset[fire]
+
+        clock[fire] -= layout.nerve_period[fire]
+
+        contribution = (
+            output[layout.edge_source] * layout.edge_weight
+        ) / layout.nerve_fanout[layout.edge_source]
+
+        split = layout.edge_split
+
+        np.add.at(state.stimulation, layout.edge_target[:split], contribution[:split])
+
+        state.myelin[layout.nerve_offset + head] += state.nerve_stimulation
+
+        state.nerve_stimulation[:] = 0
+
+        np.add.at(state.stimulation, layout.edge_target[split:], contribution[split:])
+
+        clock += dt
+
+    def generic_advance_nerves_plastic(dt, state, advance_nerves, plasticity):
+
+        advance_nerves(dt)
+
+        plasticity.observe(state)
+
+    def generic_advance(dt, advance_free_energy, advance_nodes, advance_nerves):
+
+        advance_free_energy(dt)
+        advance_nodes(dt)
+        advance_nerves(dt)
+
+
+class FusedStep:
+
+    # The three advance passes as one routine over preallocated scratch
+    # buffers, running many ticks per call. Every operation writes through
+    # `out=` (or copyto/put/add.at) so a steady-state tick allocates no
+    # arrays. Indices are kept as intp copies because take/put would cast
+    # compact index arrays on every call.
+    def __init__(self, array_model):
+
+        self.array_model = array_model
+
+        layout = array_model.layout
+        dtype = layout.dtype
+
+        node_count = layout.node_count
+        nerve_count = layout.nerve_count
+        edge_count = layout.edge_count
+
+        self.node_axon = layout.node_axon.astype(np.intp)
+        self.nerve_offset = layout.nerve_offset.astype(np.intp)
+        self.nerve_length = layout.nerve_length.astype(np.intp)
+        self.nerve_length_less_one = self.nerve_length - 1
+
+        edge_target = layout.edge_target.astype(np.intp)
+
+        self.edge_source = layout.edge_source.astype(np.intp)
+        self.edge_fanout = layout.nerve_fanout[layout.edge_source].astype(dtype)
+        self.edge_target_same = edge_target[: layout.edge_split]
+        self.edge_target_deferred = edge_target[layout.edge_split :]
+
+        self.node_bool = np.zeros(node_count, dtype=np.bool_)
+        self.node_bool_2 = np.zeros(node_count, dtype=np.bool_)
+        self.node_float = np.zeros(node_count, dtype=dtype)
+        self.node_float_2 = np.zeros(node_count, dtype=dtype)
+
+        self.nerve_head = np.zeros(nerve_count, dtype=np.intp)
+        self.nerve_fire = np.zeros(nerve_count, dtype=np.bool_)
+        self.nerve_wrap = np.zeros(nerve_count, dtype=np.bool_)
+        self.nerve_index = np.zeros(nerve_count, dtype=np.intp)
+        self.nerve_float = np.zeros(nerve_count, dtype=dtype)
+
+        self.edge_float = np.zeros(edge_count, dtype=dtype)
+        self.edge_float_same = self.edge_float[: layout.edge_split]
+        self.edge_float_deferred = self.edge_float[layout.edge_split :]
+
+        self.fe_dead = np.zeros(layout.free_energy_count, dtype=np.bool_)
+
+        # Clocks live in the wheel during a run. It is kept between runs with
+        # the same dt unless the clocks were changed in between.
+        self.wheel = None
+        self.wheel_clock = np.zeros(nerve_count)
+
+    def get_wheel(self, dt):
+
+        clock = self.array_model.state.nerve_clock
+
+        if self.wheel is not None and self.wheel.dt == dt:
+
+            np.equal(clock, self.wheel_clock, out=self.nerve_fire)
+
+            if self.nerve_fire.all():
+
+                return self.wheel
+
+        self.wheel = neurons.schedule.TimingWheel(
+            self.array_model.layout.nerve_period, clock, dt
+        )
+
+        return self.wheel
+
+    def run(self, steps, dt):
+
+        state = self.array_model.state
+
+        # Heads are worked on as intp and written back once per call, as are
+        # the clocks.
+        np.copyto(self.nerve_head, state.nerve_head)
+
+        wheel = self.get_wheel(dt)
+
+        step_free_energy = self.step_free_energy
+        step_nodes = self.step_nodes
+        step_nerves = self.step_nerves
+
+        plasticity = self.array_model.plasticity
+
+        for step in range(steps):
+
+            step_free_energy(dt)
+            step_nodes(dt)
+            step_nerves(wheel)
+
+            if plasticity is not None:
+
+                plasticity.observe(state)
+
+        np.copyto(state.nerve_head, self.nerve_head)
+
+        wheel.get_clocks(out=state.nerve_clock)
+
+        np.copyto(self.wheel_clock, state.nerve_clock)
+
+    def step_free_energy(self, dt):
+
+        array_model = self.array_model
+        state = array_model.state
+        layout = array_model.layout
+
+        if array_model.field is not None:
+
+            return ArrayModel.generic_advance_free_energy_field(
+                dt,
+                state=state,
+                field=array_model.field,
+                free_energy_per_second=array_model.free_energy_per_second,
+                rng=neurons.model.rng,
+            )
+
+        if array_model.decay_cache is not None:
+
+            return ArrayModel.generic_advance_free_energy_cached(
+                dt,
+                state=state,
+                node_x=layout.node_x,
+                node_y=layout.node_y,
+                free_energy_per_second=array_model.free_energy_per_second,
+                decay_cache=array_model.decay_cache,
+                rng=neurons.model.rng,
+            )
+
+        fe_mag = state.fe_mag
+        fe_dead = self.fe_dead
+        distance = self.node_float
+        delta = self.node_float_2
+
+        np.less(fe_mag, 0, out=fe_dead)
+        np.subtract(fe_mag, dt, out=fe_mag)
+
+        free_energy_count = np.random.poisson(array_model.free_energy_per_second * dt)
+
+        for num in range(free_energy_count):
+
+            free_index = fe_dead.argmax()
+
+            if not fe_dead[free_index]:
+
+                break
+
+            fe_dead[free_index] = False
+
+            x = neurons.model.rng.random()
+            y = neurons.model.rng.random()
+
+            state.fe_x[free_index] = x
+            state.fe_y[free_index] = y
+            fe_mag[free_index] = 1
+
+            np.subtract(layout.node_x, x, out=distance)
+            np.float_power(distance, 2, out=distance)
+            np.subtract(layout.node_y, y, out=delta)
+            np.float_power(delta, 2, out=delta)
+            np.add(distance, delta, out=distance)
+            np.sqrt(distance, out=distance)
+
+            # ArrayModel.generic_get_decay
+            np.multiply(distance, array_model.distance_scale, out=distance)
+            np.add(distance, 1, out=distance)
+            np.float_power(distance, array_model.distance_decay, out=distance)
+            np.divide(1, distance, out=distance)
+
+            np.add(state.node_energy, distance, out=state.node_energy)
+
+    def step_nodes(self, dt):
+
+        array_model = self.array_model
+        state = array_model.state
+
+        energy = state.node_energy
+        firing = state.node_firing
+        output = state.node_output
+        keep_firing = self.node_bool
+        start_firing = self.node_bool_2
+        scratch = self.node_float
+
+        np.less(energy, array_model.energy_stop_firing_threshold, out=keep_firing)
+        np.logical_not(keep_firing, out=keep_firing)
+        np.greater(energy, array_model.energy_start_firing_threshold, out=start_firing)
+        np.copyto(start_firing, keep_firing, where=firing)
+        np.copyto(firing, start_firing)
+
+        np.minimum(energy, array_model.neuron_output_per_second * dt, out=scratch)
+        output.fill(0)
+        np.copyto(output, scratch, where=firing)
+
+        # Silent nodes add a zero to their axon, leaving it unchanged.
+        np.multiply(output, array_model.axon_inefficiency, out=scratch)
+        np.add.at(state.nerve_stimulation, self.node_axon, scratch)
+
+        np.add(energy, state.node_stimulation, out=scratch)
+        np.maximum(scratch, 0, out=scratch)
+        np.subtract(energy, output, out=energy)
+        np.logical_not(firing, out=keep_firing)
+        np.copyto(energy, scratch, where=keep_firing)
+
+        state.node_stimulation.fill(0)
+
+    def step_nerves(self, wheel):
+
+        array_model = self.array_model
+        state = array_model.state
+        layout = array_model.layout
+
+        head = self.nerve_head
+        myelin = state.myelin
+        fire = self.nerve_fire
+        wrap = self.nerve_wrap
+        index = self.nerve_index
+        scratch = self.nerve_float
+        contribution = self.edge_float
+
+        # Nerves only deliver when they fire, which with a small dt is a few
+        # ticks in every propagation period.
+        groups = wheel.pop()
+
+        state.nerve_output.fill(0)
+
+        if groups:
+
+            fire.fill(False)
+
+            for group in groups:
+
+                fire[wheel.members[group]] = True
+
+            # Rightmost cell, (head + length - 1) % length without a division.
+            np.add(head, self.nerve_length_less_one, out=index)
+            np.greater_equal(index, self.nerve_length, out=wrap)
+            np.subtract(index, self.nerve_length, out=index, where=wrap)
+            np.add(index, self.nerve_offset, out=index)
+
+            # mode="raise" would buffer `out` through a temporary.
+            np.take(myelin, index, out=scratch, mode="clip")
+            np.copyto(state.nerve_output, scratch, where=fire)
+
+            # Pop and appendleft(0): zero the rightmost cell of firing nerves
+            # and move their head onto it.
+            np.copyto(scratch, 0, where=fire)
+            np.put(myelin, index, scratch)
+            np.subtract(head, 1, out=head, where=fire)
+            np.less(head, 0, out=wrap)
+            np.add(head, self.nerve_length, out=head, where=wrap)
+
+            np.take(state.nerve_output, self.edge_source, out=contribution, mode="clip")
+            np.multiply(contribution, layout.edge_weight, out=contribution)
+            np.divide(contribution, self.edge_fanout, out=contribution)
+
+            np.add.at(state.stimulation, self.edge_target_same, self.edge_float_same)
+
+        np.add(head, self.nerve_offset, out=index)
+        np.take(myelin, index, out=scratch, mode="clip")
+        np.add(scratch, state.nerve_stimulation, out=scratch)
+        np.put(myelin, index, scratch)
+
+        state.nerve_stimulation.fill(0)
+
+        if groups:
+
+            np.add.at(
+                state.stimulation, self.edge_target_deferred, self.edge_float_deferred
+            )
+
+
+# Which element each array is sized by, for get_memory_report. The shared
+# stimulation array is split between nodes and nerves.
+memory_categories = {
+    "node_energy": "node",
+    "node_firing": "node",
+    "node_output": "node",
+    "node_x": "node",
+    "node_y": "node",
+    "node_axon": "node",
+    "nerve_output": "nerve",
+    "nerve_clock": "nerve",
+    "nerve_head": "nerve",
+    "nerve_x": "nerve",
+    "nerve_y": "nerve",
+    "nerve_length": "nerve",
+    "nerve_offset": "nerve",
+    "nerve_fanout": "nerve",
+    "nerve_period": "nerve",
+    "myelin": "cell",
+    "edge_source": "edge",
+    "edge_target": "edge",
+    "edge_weight": "edge",
+    "fe_x": "free_energy",
+    "fe_y": "free_energy",
+    "fe_mag": "free_energy",
+}
+
+
+def get_memory_report(array_model):
+
+    layout = array_model.layout
+    state = array_model.state
+
+    arrays = dict(state.items())
+
+    arrays.update(
+        (field.name, getattr(layout, field.name))
+        for field in dataclasses.fields(layout)
+        if field.name in memory_categories
+    )
+
+    per_element = collections.Counter()
+
+    for name, array in arrays.items():
+
+        if name == "stimulation":
+
+            per_element["node"] += array.itemsize
+            per_element["nerve"] += array.itemsize
+
+        else:
+
+            per_element[memory_categories[name]] += array.itemsize
+
+    counts = {
+        "node": layout.node_count,
+        "nerve": layout.nerve_count,
+        "cell": layout.cell_count,
+        "edge": layout.edge_count,
+        "free_energy": layout.free_energy_count,
+    }
+
+    return {
+        "dtype": layout.dtype.name,
+        "index_dtype": layout.index_dtype.name,
+        "bytes_per": dict(per_element),
+        "counts": counts,
+        "total_bytes": sum(array.nbytes for array in arrays.values()),
+    }
+
+
+def measure_drift(
+    get_model=neurons.model.get_default_model_003,
+    dtype=np.float32,
+    steps=3000,
+    dt=1 / 60,
+    seed=0,
+):
+
+    # Runs the same seeded network in float64 and in `dtype` side by side and
+    # records how far the compact state wanders from the double one.
+    model = get_model()
+
+    reference = ArrayModel(model)
+    compact = ArrayModel(model, dtype=dtype)
+
+    max_energy_drift = 0
+    max_myelin_drift = 0
+    firing_mismatch_ticks = 0
+
+    for step in range(steps):
+
+        for array_model in (reference, compact):
+
+            neurons.model.rng.seed(seed + step)
+            np.random.seed(seed + step)
+
+            array_model.advance(dt=dt)
+
+        max_energy_drift = max(
+            max_energy_drift,
+            float(
+                np.abs(reference.state.node_energy - compact.state.node_energy).max()
+            ),
+        )
+
+        max_myelin_drift = max(
+            max_myelin_drift,
+            float(np.abs(reference.state.myelin - compact.state.myelin).max()),
+        )
+
+        firing_mismatch_ticks += bool(
+            (reference.state.node_firing != compact.state.node_firing).any()
+        )
+
+    return {
+        "steps": steps,
+        "dt": dt,
+        "dtype": np.dtype(dtype).name,
+        "max_energy_drift": max_energy_drift,
+        "max_myelin_drift": max_myelin_drift,
+        "firing_mismatch_ticks": firing_mismatch_ticks,
+    }
+
+
+def main():
+
+    model = ArrayModel(neurons.model.get_default_model_003())
+
+    for tick in range(1000):
+
+        model.advance(dt=1 / 60)
+
+    log.info("state: %s", model.jsonable_state)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
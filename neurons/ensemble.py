@@ -0,0 +1,281 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import multiprocessing
+import os
+import numpy as np
+import neurons.coupling
+import neurons.model
+import neurons.world
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+
+def get_episodes(count, seed=None, world_size=100):
+
+    episode_rng = random.Random(seed)
+
+    return [
+        {
+            "episode": num,
+            "seed": episode_rng.randrange(2**32),
+            "target_pos": episode_rng.randrange(world_size),
+            "weights": None,
+        }
+        for num in range(count)
+    ]
+
+
+def get_chunks(episodes, chunk_size):
+
+    for start in range(0, len(episodes), chunk_size):
+
+        yield episodes[start : start + chunk_size]
+
+
+def evaluate_chunk(
+    episodes,
+    steps=3000,
+    dt=1 / 60,
+    world_size=100,
+    agent_count=2,
+    get_model=neurons.model.get_default_model_003,
+    sensors=neurons.coupling.default_sensors,
+    motors=neurons.coupling.default_motors,
+    score_window=0.1,
+):
+
+    # One vectorised Coupling, one world per episode. Start positions come
+    # from each episode's seed and each brain's free energy from a stream
+    # spawned from it, so an episode scores the same whatever chunk it is in.
+    world = neurons.world.ArrayWorld(
+        size=world_size,
+        agent_count=agent_count,
+        world_count=len(episodes),
+        target_pos=[episode["target_pos"] for episode in episodes],
+    )
+
+    for num, episode in enumerate(episodes):
+
+        world.pos[num] = np.random.default_rng(episode["seed"]).integers(
+            world_size, size=agent_count
+        )
+
+    coupling = neurons.coupling.Coupling(
+        get_model(),
+        world,
+        sensors=sensors,
+        motors=motors,
+        seed=[
+            brain_seed
+            for episode in episodes
+            for brain_seed in np.random.SeedSequence(episode["seed"]).spawn(
+                agent_count
+            )
+        ],
+    )
+
+    edge_weight = coupling.brains.edge_weight.reshape(len(episodes), agent_count, -1)
+
+    for num, episode in enumerate(episodes):
+
+        if episode.get("weights") is not None:
+
+            edge_weight[num] = episode["weights"]
+
+    score_from = steps - max(1, int(steps * score_window))
+
+    distance = np.zeros(len(episodes))
+    contact_ticks = np.zeros(len(episodes), dtype=np.int64)
+
+    for step in range(steps):
+
+        coupling.tick(dt)
+
+        contact_ticks += world.get_contact().any(axis=1)
+
+        if step >= score_from:
+
+            distance += world.target_sensor.mean(axis=1)
+
+    distance /= steps - score_from
+
+    return [
+        {
+            "episode": episode["episode"],
+            "seed": episode["seed"],
+            "target_pos": episode["target_pos"],
+            "fitness": -float(distance[num]),
+            "mean_target_distance": float(distance[num]),
+            "contact_ticks": int(contact_ticks[num]),
+        }
+        for num, episode in enumerate(episodes)
+    ]
+
+
+def read_results(results_path):
+
+    results_path = pathlib.Path(results_path)
+
+    if not results_path.exists():
+
+        return []
+
+    results = []
+
+    with results_path.open() as results_file:
+
+        for line in results_file:
+
+            try:
+
+                results.append(json.loads(line))
+
+            except json.JSONDecodeError:
+
+                # A run killed mid-write leaves a partial last line.
+                log.info("skipping partial result line in %s", results_path)
+
+    return results
+
+
+def trim_partial_line(results_path, block_size=4096):
+
+    # Cuts a partial last line (from a run killed mid-write) off the file, so
+    # the next append starts on a line of its own.
+    with open(results_path, "rb+") as results_file:
+
+        end = results_file.seek(0, os.SEEK_END)
+
+        pos = end
+
+        while pos > 0:
+
+            start = max(0, pos - block_size)
+
+            results_file.seek(start)
+
+            block = results_file.read(pos - start)
+
+            newline = block.rfind(b"\n")
+
+            if newline >= 0:
+
+                pos = start + newline + 1
+
+                break
+
+            pos = start
+
+        if pos < end:
+
+            log.info("trimming partial result line from %s", results_path)
+
+            results_file.truncate(pos)
+
+
+def run_ensemble(
+    episodes,
+    chunk_size=64,
+    processes=None,
+    results_path=None,
+    **evaluate_kwargs,
+):
+
+    # Yields one result per episode as chunks finish. processes=None uses a
+    # pool over every core, processes=0 evaluates in this process. With a
+    # results_path each result is appended as a JSON line and episodes already
+    # recorded there are skipped, so an interrupted ensemble resumes.
+    done = set()
+
+    if results_path is not None:
+
+        done = {result["episode"] for result in read_results(results_path)}
+
+        log.info("%s episodes already in %s", len(done), results_path)
+
+    pending = [episode for episode in episodes if episode["episode"] not in done]
+
+    chunks = list(get_chunks(pending, chunk_size))
+
+    evaluate = functools.partial(evaluate_chunk, **evaluate_kwargs)
+
+    results_file = None
+    pool = None
+
+    if results_path is not None:
+
+        if pathlib.Path(results_path).exists():
+
+            trim_partial_line(results_path)
+
+        results_file = open(results_path, "a")
+
+    try:
+
+        if processes == 0:
+
+            chunk_results = map(evaluate, chunks)
+
+        else:
+
+            pool = multiprocessing.Pool(processes or os.cpu_count())
+
+            chunk_results = pool.imap_unordered(evaluate, chunks)
+
+        for results in chunk_results:
+
+            # Record the whole chunk before yielding, so a consumer that stops
+            # early never leaves a chunk half recorded.
+            if results_file is not None:
+
+                for result in results:
+
+                    results_file.write(json.dumps(result) + "\n")
+
+                results_file.flush()
+
+            yield from results
+
+        if pool is not None:
+
+            pool.close()
+            pool.join()
+            pool = None
+
+    finally:
+
+        if pool is not None:
+
+            pool.terminate()
+
+        if results_file is not None:
+
+            results_file.close()
+
+
+def main():
+
+    episodes = get_episodes(1024, seed=0)
+
+    results = list(
+        run_ensemble(episodes, results_path=pathlib.Path("gen") / "ensemble.jsonl")
+    )
+
+    best = max(results, key=lambda result: result["fitness"], default=None)
+
+    log.info("%s episodes, best %s", len(results), best)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
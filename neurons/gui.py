@@ -2,11 +2,16 @@ import collections, datetime, functools, itertools
 import json, logging, pathlib, random, re
 import neurons.model
 import neurons.config
+import neurons.lazy
 
 config = neurons.config.load()
 
-import dearpygui.core as core
-import dearpygui.simple as simple
+# Dear PyGui is only imported once a window is drawn, so the module can be
+# imported (for its entry points, or on a machine without a display)
+# cheaply.
+core = neurons.lazy.LazyModule("dearpygui.core", globals(), "core")
+simple = neurons.lazy.LazyModule("dearpygui.simple", globals(), "simple")
+np = neurons.lazy.LazyModule("numpy", globals(), "np")
 
 log = logging.getLogger(__name__)
 log.silent = functools.partial(log.log, 0)
@@ -20,33 +25,61 @@ node_firing_color = config["colors"].getColor("node firing")
 node_charging_color = config["colors"].getColor("node charging")
 
 
-def interpolate_color(start, end, factor):
+def get_nerve_tags(model, segments):
 
-    return [int(s + factor * (e + s)) for s, e in zip(start, end)]
+    # The draw command for each of neurons.render.NerveSegments' segments.
+    target_ids = [node.unique_id for node in model.nodes] + [
+        nerve.unique_id for nerve in model.nerves
+    ]
 
+    return [
+        f"nerve-from-{model.nerves[nerve].unique_id}-to-{target_ids[target]}"
+        f"-segment-{num:03}"
+        for nerve, target, num in zip(
+            segments.nerve.tolist(), segments.target.tolist(), segments.num.tolist()
+        )
+    ]
+
+
+def get_segment_points(segments):
+
+    return zip(
+        segments.x0.tolist(),
+        segments.y0.tolist(),
+        segments.x1.tolist(),
+        segments.y1.tolist(),
+    )
 
-def draw_nerve(nerve, target_pos, window_scale, tag):
 
-    segment_gen = nerve.pos.segmentize(target_pos, nerve.length)
+def draw_nerves(segments, tags):
 
-    for segment_num, (start_pos, target_pos) in enumerate(segment_gen):
+    for (x0, y0, x1, y1), tag in zip(get_segment_points(segments), tags):
 
         core.draw_line(
             drawing="drawing##widget",
-            p1=window_scale(start_pos),
-            p2=window_scale(target_pos),
+            p1=[x0, y0],
+            p2=[x1, y1],
             color=nerve_off_color,
             thickness=1,
-            tag=f"{tag}-segment-{segment_num:03}",
+            tag=tag,
         )
 
 
+def move_nerves(segments, tags):
+
+    for (x0, y0, x1, y1), tag in zip(get_segment_points(segments), tags):
+
+        core.modify_draw_command("drawing##widget", tag, p1=[x0, y0], p2=[x1, y1])
+
+
 def scale(vec, dim):
 
     return [x * y for x, y in zip(vec, dim)]
 
 
-def render(model, window_scale, dim):
+def render(model, window_scale, dim, nerves):
+
+    import neurons.render
 
     # for num, free_energy in enumerate(model.free_energies):
 
@@ -103,11 +136,15 @@ def render(model, window_scale, dim):
 
         if node.firing:
 
-            node_color = interpolate_color(node_off_color, node_firing_color, energy)
+            node_color = neurons.render.interpolate_color(
+                node_off_color, node_firing_color, energy
+            )
 
         else:
 
-            node_color = interpolate_color(node_off_color, node_charging_color, energy)
+            node_color = neurons.render.interpolate_color(
+                node_off_color, node_charging_color, energy
+            )
 
         tag = f"myCircle{node.unique_id}"
 
@@ -117,32 +154,81 @@ def render(model, window_scale, dim):
             fill=node_color,
         )
 
-    for nerve in model.nerves:
+    # Only segments whose colour changed since the last frame are sent.
+    colors = neurons.render.get_nerve_colors(neurons.render.get_myelin(model))[
+        nerves["segments"].cell
+    ]
 
-        for target in nerve.target:
+    if nerves["colors"] is None:
 
-            for segment_num, energy in enumerate(nerve.myelin):
+        changed = range(len(colors))
 
-                nerve_color = interpolate_color(
-                    nerve_off_color, nerve_on_color, energy / 5
-                )
+    else:
+
+        changed = np.flatnonzero((colors != nerves["colors"]).any(axis=1)).tolist()
+
+    for num in changed:
+
+        core.modify_draw_command(
+            "drawing##widget",
+            nerves["tags"][num],
+            color=colors[num].tolist(),
+        )
+
+    nerves["colors"] = colors
 
-                core.modify_draw_command(
-                    "drawing##widget",
-                    f"nerve-from-{nerve.unique_id}-to-{target.unique_id}-segment-{segment_num:03}",
-                    color=nerve_color,
-                )
 
+def gui_main(model, client=None):
 
-def gui_main(model):
+    import neurons.render
 
     dim = (800, 600)
 
     window_scale = functools.partial(scale, dim=dim)
 
+    # Nerve segment geometry is worked out once and only again when the
+    # window is resized; `colors` are those last sent for each segment.
+    segment_cache = neurons.render.NerveSegmentCache()
+
+    segments = segment_cache.get(model, dim)
+
+    nerves = {
+        "segments": segments,
+        "tags": get_nerve_tags(model, segments),
+        "colors": None,
+    }
+
+    # Node and nerve states as of the last log, updated from snapshots so a
+    # log only rebuilds what changed since the one before.
+    logged = {"version": None, "nodes": {}, "nerves": {}}
+
+    def update_logged():
+
+        snapshot = model.get_snapshot(since=logged["version"])
+
+        if snapshot["keyframe"]:
+
+            logged["nodes"].clear()
+            logged["nerves"].clear()
+
+        logged["version"] = snapshot["version"]
+
+        for kind in ["nodes", "nerves"]:
+
+            logged[kind].update((state["unique_id"], state) for state in snapshot[kind])
+
+        return snapshot
+
     def show_state(sender, data):
 
-        print(model.jsonable_state)
+        update_logged()
+
+        print(
+            {
+                "nodes": list(logged["nodes"].values()),
+                "nerves": list(logged["nerves"].values()),
+            }
+        )
 
     def show_free_energies(sender, data):
 
@@ -152,7 +238,7 @@ def gui_main(model):
 
     def show_neurons(sender, data):
 
-        model_state = model.jsonable_state
+        update_logged()
 
         node_dicts = [
             {
@@ -160,14 +246,16 @@ def gui_main(model):
                 "firing": node["firing"],
                 "energy": format(node["energy"], "0.2f"),
             }
-            for node in model_state["nodes"]
+            for node in logged["nodes"].values()
         ]
 
         print("\n".join(str(x) for x in node_dicts))
 
     def increment(sender, data):
 
-        print("increment does not work, put in a 1s alternative")
+        summary = model.advance_many(steps=60, dt=1 / 60)
+
+        print(summary)
 
     # window_size = [int(x) for x in scale(dim, (1.1, 1.1))]
 
@@ -188,6 +276,7 @@ def gui_main(model):
             pmin=[0, 0],
             pmax=list(dim),
             color=[255, 255, 255, 255],
+            tag="border",
         )
 
         for num, free_energy in enumerate(model.free_energies):
@@ -207,16 +296,7 @@ def gui_main(model):
 
             log.info("drawing fe")
 
-        for nerve in model.nerves:
-
-            for target in nerve.target:
-
-                draw_nerve(
-                    nerve,
-                    target.pos,
-                    window_scale,
-                    tag=f"nerve-from-{nerve.unique_id}-to-{target.unique_id}",
-                )
+        draw_nerves(nerves["segments"], nerves["tags"])
 
         for node in model.nodes:
 
@@ -242,13 +322,54 @@ def gui_main(model):
 
     def my_render():
 
-        dt = core.get_delta_time()
+        # A client draws whatever the server last sent instead of advancing.
+        if client is not None:
+
+            client.store(model)
+
+        else:
+
+            dt = core.get_delta_time()
+
+            model.advance(dt=dt)
+
+        render(model, window_scale, dim, nerves)
+
+    def resize(sender, data):
+
+        nonlocal dim, window_scale
+
+        width, height = core.get_main_window_size()
+
+        new_dim = (max(1, width - 20), max(1, height - 20))
 
-        model.advance(dt=dt)
+        if new_dim == dim:
 
-        render(model, window_scale, dim)
+            return
+
+        dim = new_dim
+
+        window_scale = functools.partial(scale, dim=dim)
+
+        core.configure_item("drawing##widget", width=dim[0], height=dim[1])
+
+        core.modify_draw_command("drawing##widget", "border", pmax=list(dim))
+
+        nerves["segments"] = segment_cache.get(model, dim)
+
+        move_nerves(nerves["segments"], nerves["tags"])
+
+        for node in model.nodes:
+
+            core.modify_draw_command(
+                "drawing##widget",
+                f"myCircle{node.unique_id}",
+                center=window_scale(node.pos),
+                radius=min(dim) * 0.05,
+            )
 
     core.set_render_callback(my_render)
+    core.set_resize_callback(resize)
     core.set_vsync(True)
 
     core.start_dearpygui(primary_window="Main Window")
@@ -265,6 +386,17 @@ def main():
     gui_main(model)
 
 
+def client_main(path=pathlib.Path("gen") / "neurons.sock"):
+
+    # Watches a model served by neurons.stream, which must be the same
+    # default network.
+    import neurons.stream
+
+    model = neurons.model.get_default_model_003()
+
+    gui_main(model, client=neurons.stream.ClientThread(path=path))
+
+
 if __name__ == "__main__":
 
     logging.basicConfig(
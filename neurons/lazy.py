@@ -0,0 +1,45 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import importlib
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Stands in for a module that is slow to import (numpy, dearpygui) in a
+# module that only needs it once something runs. The first attribute
+# lookup imports the real module and rebinds the global it was assigned
+# to, so only that first lookup goes through here, e.g.
+#
+#   np = neurons.lazy.LazyModule("numpy", globals(), "np")
+
+
+class LazyModule:
+
+    def __init__(self, name, namespace, alias):
+
+        self.name = name
+        self.namespace = namespace
+        self.alias = alias
+
+    def load(self):
+
+        module = importlib.import_module(self.name)
+
+        log.silent("imported %s", self.name)
+
+        if self.namespace.get(self.alias) is self:
+
+            self.namespace[self.alias] = module
+
+        return module
+
+    def __getattr__(self, attr):
+
+        # Only reached for attributes LazyModule itself lacks.
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+
+        return f"<lazy module {self.name!r}>"
@@ -0,0 +1,407 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import numpy as np
+import neurons.engine
+import neurons.model
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Streaming statistics over a run. A Pipeline is a record callback for
+# advance_many: each call samples the model once and feeds every stage,
+# every `emit_every` samples the stages emit a window of statistics to the
+# sink and reset. Stages keep fixed-size state (at most one value per node
+# or nerve), so memory does not grow with the length of the run.
+#
+# advance_many calls record every `record_every` ticks, so pass
+# record_every=1 for per-tick statistics; a larger value subsamples.
+
+
+def get_sample(model):
+
+    if isinstance(model, neurons.engine.ArrayModel):
+
+        state = model.state
+
+        return {
+            "node_energy": state.node_energy,
+            "node_firing": state.node_firing,
+            "nerve_output": state.nerve_output,
+        }
+
+    return {
+        "node_energy": np.array([node.energy for node in model.nodes], dtype=np.float64),
+        "node_firing": np.array([node.firing for node in model.nodes], dtype=np.bool_),
+        "nerve_output": np.array(
+            [nerve.output for nerve in model.nerves], dtype=np.float64
+        ),
+    }
+
+
+class FiringRate:
+
+    # Spikes (a node starting to fire) per second, and the fraction of
+    # samples each node spent firing.
+    name = "firing_rate"
+
+    def __init__(self):
+
+        self.was_firing = None
+        self.spikes = None
+        self.firing_samples = None
+        self.samples = 0
+        self.elapsed = 0
+
+    def update(self, sample, dt):
+
+        firing = sample["node_firing"]
+
+        if self.was_firing is None:
+
+            self.was_firing = np.zeros(len(firing), dtype=np.bool_)
+            self.spikes = np.zeros(len(firing), dtype=np.int64)
+            self.firing_samples = np.zeros(len(firing), dtype=np.int64)
+
+        self.spikes += firing & ~self.was_firing
+        self.firing_samples += firing
+
+        self.was_firing[...] = firing
+
+        self.samples += 1
+        self.elapsed += dt
+
+    def emit(self):
+
+        if self.spikes is None or not self.elapsed or not len(self.spikes):
+
+            return {"mean": 0, "max": 0, "mean_firing_fraction": 0, "per_node": []}
+
+        rate = self.spikes / self.elapsed
+
+        result = {
+            "mean": float(rate.mean()),
+            "max": float(rate.max()),
+            "mean_firing_fraction": float(self.firing_samples.mean() / self.samples),
+            "per_node": rate.tolist(),
+        }
+
+        self.spikes[:] = 0
+        self.firing_samples[:] = 0
+        self.samples = 0
+        self.elapsed = 0
+
+        return result
+
+
+class InterSpikeInterval:
+
+    # A spike is a node starting to fire. Intervals between a node's spikes
+    # go into a running mean and variance and a fixed-bin histogram.
+    name = "inter_spike_interval"
+
+    def __init__(self, bins=np.linspace(0, 10, 21)):
+
+        self.bins = np.asarray(bins, dtype=np.float64)
+        self.counts = np.zeros(len(self.bins) + 1, dtype=np.int64)
+
+        self.was_firing = None
+        self.last_spike = None
+        self.time = 0
+
+        self.count = 0
+        self.mean = 0
+        self.m2 = 0
+
+    def update(self, sample, dt):
+
+        firing = sample["node_firing"]
+
+        self.time += dt
+
+        if self.was_firing is None:
+
+            self.was_firing = np.zeros(len(firing), dtype=np.bool_)
+            self.last_spike = np.full(len(firing), np.nan)
+
+        spikes = np.flatnonzero(firing & ~self.was_firing)
+
+        self.was_firing[...] = firing
+
+        if not len(spikes):
+
+            return
+
+        intervals = self.time - self.last_spike[spikes]
+
+        self.last_spike[spikes] = self.time
+
+        intervals = intervals[~np.isnan(intervals)]
+
+        if not len(intervals):
+
+            return
+
+        self.counts += np.bincount(
+            np.searchsorted(self.bins, intervals, side="right"),
+            minlength=len(self.counts),
+        )
+
+        # Chan et al.'s parallel update of Welford's running variance.
+        count = len(intervals)
+        mean = intervals.mean()
+        total = self.count + count
+        delta = mean - self.mean
+
+        self.m2 += ((intervals - mean) ** 2).sum() + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    def emit(self):
+
+        result = {
+            "count": self.count,
+            "mean": self.mean if self.count else None,
+            "std": (self.m2 / self.count) ** 0.5 if self.count else None,
+            "bins": self.bins.tolist(),
+            "histogram": self.counts.tolist(),
+        }
+
+        self.counts[:] = 0
+        self.count = 0
+        self.mean = 0
+        self.m2 = 0
+
+        return result
+
+
+class EnergyHistogram:
+
+    name = "energy_histogram"
+
+    def __init__(self, bins=np.linspace(0, 10, 21)):
+
+        self.bins = np.asarray(bins, dtype=np.float64)
+        self.counts = np.zeros(len(self.bins) + 1, dtype=np.int64)
+
+    def update(self, sample, dt):
+
+        self.counts += np.bincount(
+            np.searchsorted(self.bins, sample["node_energy"], side="right"),
+            minlength=len(self.counts),
+        )
+
+    def emit(self):
+
+        total = self.counts.sum()
+
+        result = {
+            "bins": self.bins.tolist(),
+            "histogram": self.counts.tolist(),
+            "fraction": (self.counts / total).tolist() if total else [],
+        }
+
+        self.counts[:] = 0
+
+        return result
+
+
+class NerveThroughput:
+
+    # Energy leaving nerves, per second of the window.
+    name = "nerve_throughput"
+
+    def __init__(self):
+
+        self.total = None
+        self.elapsed = 0
+
+    def update(self, sample, dt):
+
+        output = sample["nerve_output"]
+
+        if self.total is None:
+
+            self.total = np.zeros(len(output), dtype=np.float64)
+
+        self.total += output
+        self.elapsed += dt
+
+    def emit(self):
+
+        if self.total is None or not self.elapsed:
+
+            return {"per_second": 0, "busiest": None}
+
+        per_second = self.total / self.elapsed
+
+        result = {
+            "per_second": float(per_second.sum()),
+            "busiest": int(per_second.argmax()) if len(per_second) else None,
+            "busiest_per_second": float(per_second.max(initial=0)),
+        }
+
+        self.total[:] = 0
+        self.elapsed = 0
+
+        return result
+
+
+class Synchrony:
+
+    # Golomb's chi: variance over time of the population's firing fraction
+    # against the mean over nodes of each node's own firing variance. 1 is
+    # fully synchronous, near 0 independent.
+    name = "synchrony"
+
+    def __init__(self):
+
+        self.samples = 0
+        self.population_sum = 0
+        self.population_square_sum = 0
+        self.node_sum = None
+
+    def update(self, sample, dt):
+
+        firing = sample["node_firing"]
+
+        if self.node_sum is None:
+
+            self.node_sum = np.zeros(len(firing), dtype=np.int64)
+
+        population = firing.mean() if len(firing) else 0
+
+        self.samples += 1
+        self.population_sum += population
+        self.population_square_sum += population * population
+
+        # Firing is 0 or 1, so the sum of squares is the sum.
+        self.node_sum += firing
+
+    def emit(self):
+
+        samples = self.samples
+
+        chi = None
+
+        if samples and len(self.node_sum):
+
+            population_variance = (
+                self.population_square_sum / samples - (self.population_sum / samples) ** 2
+            )
+
+            node_mean = self.node_sum / samples
+
+            node_variance = (node_mean - node_mean * node_mean).mean()
+
+            if node_variance > 0:
+
+                chi = float(max(0, population_variance / node_variance) ** 0.5)
+
+        result = {"samples": samples, "chi": chi}
+
+        self.samples = 0
+        self.population_sum = 0
+        self.population_square_sum = 0
+
+        if self.node_sum is not None:
+
+            self.node_sum[:] = 0
+
+        return result
+
+
+default_stages = [FiringRate, InterSpikeInterval, EnergyHistogram, NerveThroughput, Synchrony]
+
+
+class Pipeline:
+
+    # dt is the simulated time between record calls, i.e. record_every * dt.
+    def __init__(self, dt, stages=None, emit_every=60, sink=None):
+
+        self.dt = dt
+        self.stages = [stage() for stage in default_stages] if stages is None else stages
+        self.emit_every = emit_every
+        self.sink = sink
+
+        self.samples = 0
+        self.tick = 0
+        self.emitted = []
+
+    def __call__(self, model, tick):
+
+        self.update(model, tick)
+
+    def update(self, model, tick=None):
+
+        sample = get_sample(model)
+
+        for stage in self.stages:
+
+            stage.update(sample, self.dt)
+
+        self.samples += 1
+        self.tick = self.samples if tick is None else tick
+
+        if self.samples % self.emit_every == 0:
+
+            self.emit()
+
+    def emit(self):
+
+        record = {"tick": self.tick}
+
+        record.update((stage.name, stage.emit()) for stage in self.stages)
+
+        if self.sink is None:
+
+            self.emitted.append(record)
+
+        else:
+
+            self.sink(record)
+
+        return record
+
+
+def get_jsonl_sink(results_file):
+
+    def sink(record):
+
+        results_file.write(json.dumps(record) + "\n")
+
+        results_file.flush()
+
+    return sink
+
+
+def main():
+
+    array_model = neurons.engine.ArrayModel(neurons.model.get_default_model_003())
+
+    pipeline = Pipeline(dt=1 / 60, emit_every=600)
+
+    array_model.advance_many(steps=6000, dt=1 / 60, record=pipeline, record_every=1)
+
+    for record in pipeline.emitted:
+
+        log.info(
+            "tick %s firing rate %0.3f synchrony %s throughput %0.3f",
+            record["tick"],
+            record["firing_rate"]["mean"],
+            record["synchrony"]["chi"],
+            record["nerve_throughput"]["per_second"],
+        )
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
@@ -1,12 +1,15 @@
-import collections, datetime, functools, itertools
-import json, logging, pathlib, random, re
+import collections, functools, itertools
+import logging, random
 import dataclasses
-import numpy as np
 import math
-import time
 import typing
 from timeit import default_timer as timer
+import neurons.lazy
 
+# numpy (and neurons.decay, which needs it) are only needed once free
+# energy is deposited, so importing the model alone stays cheap.
+np = neurons.lazy.LazyModule("numpy", globals(), "np")
+decay = neurons.lazy.LazyModule("neurons.decay", globals(), "decay")
 
 log = logging.getLogger(__name__)
 log.silent = functools.partial(log.log, 0)
@@ -25,7 +28,7 @@ class Fiber(collections.deque):
         )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class XY:
 
     x: float = dataclasses.field(default_factory=rng.random)
@@ -37,47 +40,65 @@ class XY:
 
     def distance(a, b):
 
-        return math.sqrt(sum((a_elem - b_elem) ** 2 for a_elem, b_elem in zip(a, b)))
+        return math.sqrt((a.x - b.x) ** 2 + (a.y - b.y) ** 2)
 
     def __iter__(self):
 
         yield self.x
         yield self.y
 
-    def get_delta(self, target):
+    def __iadd__(self, other):
 
-        return XY(
-            *(
-                target_element - self_element
-                for self_element, target_element in zip(self, target)
-            )
-        )
+        self.x += other.x
+        self.y += other.y
 
-    def segmentize(self, target, segment_count):
+        return self
+
+    def __isub__(self, other):
+
+        self.x -= other.x
+        self.y -= other.y
+
+        return self
+
+    def __imul__(self, factor):
+
+        self.x *= factor
+        self.y *= factor
+
+        return self
+
+    def set(self, x, y):
 
-        if segment_count == 1:
+        self.x = x
+        self.y = y
 
-            return [(self, target)]
+        return self
 
-        delta = self.get_delta(target)
+    def get_delta(self, target):
+
+        return XY(target.x - self.x, target.y - self.y)
+
+    def segmentize(self, target, segment_count):
+
+        delta_x = target.x - self.x
+        delta_y = target.y - self.y
 
         segment_start = self
-        segment_end = None
 
         for segment_num in range(1, segment_count + 1):
 
             segment_end = XY(
-                *[
-                    self_dimension + (delta_dimension * segment_num / segment_count)
-                    for self_dimension, delta_dimension in zip(self, delta)
-                ]
+                self.x + (delta_x * segment_num / segment_count),
+                self.y + (delta_y * segment_num / segment_count),
             )
 
             yield (segment_start, segment_end)
+
             segment_start = segment_end
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Node:
 
     unique_id: int
@@ -110,7 +131,7 @@ class Node:
         }
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Nerve:
 
     unique_id: int
@@ -126,6 +147,8 @@ class Nerve:
     pos: XY = dataclasses.field(default_factory=XY, repr=True)
     weights: typing.List[float] = dataclasses.field(default_factory=list)
     clock: float = 0
+    # None uses the model's nerve_propogation_time.
+    propogation_time: typing.Optional[float] = None
 
     def __post_init__(self):
 
@@ -155,7 +178,7 @@ class Nerve:
         return f"Nerve(name={self.unique_id}. {self.myelin} targets={[t.unique_id for t in self.target]})"
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FreeEnergy:
 
     pos: XY = dataclasses.field(default_factory=XY, repr=True)
@@ -163,6 +186,84 @@ class FreeEnergy:
     drawn: bool = False
 
 
+@dataclasses.dataclass
+class AdvanceSummary:
+
+    steps: int
+    dt: float
+    wall_time: float = 0
+    samples: int = 0
+    mean_energy: float = 0
+    mean_firing_fraction: float = 0
+    final_energy: float = 0
+    final_firing_fraction: float = 0
+    stopped: bool = False
+
+    @property
+    def sim_time(self):
+
+        return self.steps * self.dt
+
+    @property
+    def sim_seconds_per_wall_second(self):
+
+        return self.sim_time / self.wall_time if self.wall_time else math.inf
+
+
+@dataclasses.dataclass
+class Changes:
+
+    # ids of the nodes and nerves whose jsonable_state may differ from the
+    # last version. advance adds to `pending`, Model.get_snapshot turns it
+    # into the next version. Versions since the last keyframe are kept in
+    # `log`; a keyframe is taken every `keyframe_every` versions and after
+    # any change to the layout (`full`). `topology` counts those changes, for
+    # anything that caches the layout.
+    keyframe_every: int = 600
+    pending: set = dataclasses.field(default_factory=set)
+    full: bool = True
+    version: int = 0
+    keyframe_version: int = 0
+    log: list = dataclasses.field(default_factory=list)
+    index: dict = dataclasses.field(default_factory=dict)
+    topology: int = 0
+
+
+# The constants advance binds into its partials. Setting one on a model
+# rebinds it (see rebind), so the stepping code always runs with the
+# current value.
+parameter_names = [
+    "free_energy_per_second",
+    "distance_decay",
+    "distance_scale",
+    "neuron_output_per_second",
+    "nerve_propogation_time",
+    "energy_stop_firing_threshold",
+    "energy_start_firing_threshold",
+    "axon_inefficiency",
+]
+
+
+def rebind(func, name, value):
+
+    # func with `name` bound to value in it and in every partial among its
+    # keywords. Anything else, such as a DecayCache or GridField built from
+    # the old value, is left as it is.
+    if not isinstance(func, functools.partial):
+
+        return func
+
+    keywords = {
+        key: rebind(keyword, name, value) for key, keyword in func.keywords.items()
+    }
+
+    if name in keywords:
+
+        keywords[name] = value
+
+    return functools.partial(rebind(func.func, name, value), *func.args, **keywords)
+
+
 class Model:
 
     free_energy_per_second = 20
@@ -182,6 +283,10 @@ class Model:
 
         self.unique_id_gen = itertools.count()
 
+        self.changes = Changes()
+
+        self.decay_cache = None
+
         self.advance = functools.partial(
             Model.generic_advance,
             advance_free_energy=functools.partial(
@@ -194,6 +299,7 @@ class Model:
                     distance_scale=Model.distance_scale,
                     distance_decay=Model.distance_decay,
                 ),
+                changed=self.changes.pending,
             ),
             advance_nodes=functools.partial(
                 Model.generic_advance_nodes,
@@ -202,14 +308,24 @@ class Model:
                 energy_stop_firing_threshold=Model.energy_stop_firing_threshold,
                 neuron_output_per_second=Model.neuron_output_per_second,
                 axon_inefficiency=Model.axon_inefficiency,
+                changed=self.changes.pending,
             ),
             advance_nerves=functools.partial(
                 Model.generic_advance_nerves,
                 nerves=self.nerves,
                 nerve_propogation_time=Model.nerve_propogation_time,
+                changed=self.changes.pending,
             ),
         )
 
+    def __setattr__(self, name, value):
+
+        super().__setattr__(name, value)
+
+        if name in parameter_names and "advance" in self.__dict__:
+
+            self.advance = rebind(self.advance, name, value)
+
     def add_node(self, axon_length=10, unique_id=None, pos=None):
 
         new_nerve = self.add_nerve(length=axon_length, is_axon=True, pos=pos)
@@ -231,6 +347,9 @@ class Model:
 
         self.nodes.append(new_node)
 
+        self.changes.full = True
+        self.changes.topology += 1
+
         return new_node
 
     def add_nerve(
@@ -241,6 +360,7 @@ class Model:
         length=10,
         unique_id=None,
         pos=None,
+        propogation_time=None,
     ):
 
         if unique_id is None:
@@ -251,6 +371,7 @@ class Model:
             length=length,
             unique_id=unique_id,
             is_axon=is_axon,
+            propogation_time=propogation_time,
         )
 
         if pos:
@@ -283,6 +404,9 @@ class Model:
 
         self.nerves.append(new_nerve)
 
+        self.changes.full = True
+        self.changes.topology += 1
+
         return new_nerve
 
     def attach(self, source, target, weight=1):
@@ -295,6 +419,9 @@ class Model:
         source.weights.append(weight)
         # target.source = source
 
+        self.changes.full = True
+        self.changes.topology += 1
+
     def generic_get_decay(distance, distance_scale, distance_decay):
 
         dropoff = 1 / pow((distance * distance_scale) + 1, distance_decay)
@@ -302,7 +429,7 @@ class Model:
         return dropoff
 
     def generic_advance_free_energy(
-        dt, nodes, free_energies, free_energy_per_second, get_decay
+        dt, nodes, free_energies, free_energy_per_second, get_decay, changed
     ):
         def get_dead_indices(free_energies, dt):
 
@@ -341,6 +468,82 @@ class Model:
 
                 node.energy += mag * get_decay(distance)
 
+            changed.update(map(id, nodes))
+
+    def use_decay_cache(self, resolution=1 / 64, max_bytes=256 * 2**20):
+
+        # Deposits free energy from a neurons.decay.DecayCache, an
+        # approximation of the exact deposit that skips the per-node pow.
+        self.decay_cache = decay.DecayCache(
+            functools.partial(
+                Model.generic_get_decay,
+                distance_scale=Model.distance_scale,
+                distance_decay=Model.distance_decay,
+            ),
+            resolution=resolution,
+            max_bytes=max_bytes,
+        )
+
+        self.advance = functools.partial(
+            self.advance,
+            advance_free_energy=functools.partial(
+                Model.generic_advance_free_energy_cached,
+                nodes=self.nodes,
+                free_energies=self.free_energies,
+                free_energy_per_second=Model.free_energy_per_second,
+                decay_cache=self.decay_cache,
+                changed=self.changes.pending,
+            ),
+        )
+
+    def generic_advance_free_energy_cached(
+        dt, nodes, free_energies, free_energy_per_second, decay_cache, changed
+    ):
+
+        dead_indices = [
+            num
+            for num, free_energy in enumerate(free_energies)
+            if free_energy is None or free_energy.mag < 0
+        ]
+
+        for free_energy in free_energies:
+
+            if free_energy is not None:
+
+                free_energy.mag -= dt
+
+        free_energy_count = np.random.poisson(free_energy_per_second * dt, 1)[0]
+
+        new_indices = dead_indices[:free_energy_count]
+
+        if not new_indices:
+
+            return
+
+        # Nodes may have been added or moved since the last tick.
+        decay_cache.validate(
+            np.array([node.pos.x for node in nodes], dtype=np.float64),
+            np.array([node.pos.y for node in nodes], dtype=np.float64),
+        )
+
+        energy = np.zeros(len(nodes))
+
+        for free_index in new_indices:
+
+            new_free_energy = FreeEnergy()
+
+            free_energies[free_index] = new_free_energy
+
+            pos = new_free_energy.pos
+
+            energy += new_free_energy.mag * decay_cache.get_deposit(pos.x, pos.y)
+
+        for node, gain in zip(nodes, energy.tolist()):
+
+            node.energy += gain
+
+        changed.update(map(id, nodes))
+
     def generic_advance_nodes(
         dt,
         nodes,
@@ -348,6 +551,7 @@ class Model:
         energy_stop_firing_threshold,
         neuron_output_per_second,
         axon_inefficiency,
+        changed,
     ):
 
         for node in nodes:
@@ -369,6 +573,8 @@ class Model:
 
                 node.firing = False
 
+                changed.add(id(node))
+
             if node.firing:
 
                 node.output = min(neuron_output_per_second * dt, node.energy)
@@ -379,28 +585,48 @@ class Model:
 
                 node.energy -= node.output
 
+                changed.add(id(node))
+
             else:
 
+                if node.stimulation:
+
+                    changed.add(id(node))
+
                 node.energy = max(0, node.energy + node.stimulation)
 
                 node.output = 0
 
             node.stimulation = 0
 
-    def generic_advance_nerves(dt, nerves, nerve_propogation_time):
+    def generic_advance_nerves(dt, nerves, nerve_propogation_time, changed):
 
         for nerve in nerves:
 
-            if nerve.clock > nerve_propogation_time:
+            period = nerve.propogation_time
+
+            if period is None:
+
+                period = nerve_propogation_time
+
+            if nerve.clock > period:
 
                 # Once per second
                 # Nerves pop their rightmost energy as output
                 # Nerves push their stimulation.
+                previous = nerve.output
+
                 nerve.output = nerve.myelin.pop()
 
                 nerve.myelin.appendleft(0)
 
-                nerve.clock -= nerve_propogation_time
+                nerve.clock -= period
+
+                # Shifting an empty nerve leaves it as it was, but one firing
+                # on consecutive ticks may still have emitted last tick.
+                if nerve.output != previous or nerve.output or any(nerve.myelin):
+
+                    changed.add(id(nerve))
 
                 for target, weight in zip(nerve.target, nerve.weights):
 
@@ -408,13 +634,25 @@ class Model:
 
                     target.stimulation += new_stim
 
+                    if new_stim:
+
+                        changed.add(id(target))
+
             else:
 
+                if nerve.output:
+
+                    changed.add(id(nerve))
+
                 nerve.output = 0
 
             # Every tick
             # Stimulate the leftmost cell
             # Reset stimulation
+            if nerve.stimulation:
+
+                changed.add(id(nerve))
+
             nerve.myelin[0] += nerve.stimulation
 
             nerve.stimulation = 0
@@ -429,12 +667,171 @@ class Model:
             "nerves": [nerve.jsonable_state for nerve in self.nerves],
         }
 
+    def mark_changed(self, *objs):
+
+        # advance tracks its own changes, anything else that sets a node or
+        # nerve's state directly should say so here.
+        self.changes.pending.update(map(id, objs))
+
+    def mark_all_changed(self):
+
+        self.changes.full = True
+
+    def commit_changes(self):
+
+        changes = self.changes
+
+        if not changes.pending and not changes.full:
+
+            return changes.version
+
+        changes.version += 1
+
+        if changes.full or changes.version - changes.keyframe_version >= changes.keyframe_every:
+
+            changes.keyframe_version = changes.version
+            changes.log.clear()
+            changes.full = False
+
+            changes.index = {id(node): num for num, node in enumerate(self.nodes)}
+
+            changes.index.update(
+                (id(nerve), len(self.nodes) + num) for num, nerve in enumerate(self.nerves)
+            )
+
+        else:
+
+            changes.log.append((changes.version, frozenset(changes.pending)))
+
+        changes.pending.clear()
+
+        return changes.version
+
+    def get_snapshot(self, since=None):
+
+        # jsonable_state for the nodes and nerves that changed after version
+        # `since`, or all of them (a keyframe) when `since` is None or older
+        # than the last keyframe. Pass the returned version as the next
+        # `since`.
+        changes = self.changes
+
+        version = self.commit_changes()
+
+        if since is None or since < changes.keyframe_version or since > version:
+
+            return {"version": version, "keyframe": True, **self.jsonable_state}
+
+        changed = set()
+
+        for logged_version, ids in reversed(changes.log):
+
+            if logged_version <= since:
+
+                break
+
+            changed.update(ids)
+
+        nums = sorted(changes.index[obj_id] for obj_id in changed)
+
+        node_count = len(self.nodes)
+
+        return {
+            "version": version,
+            "keyframe": False,
+            "nodes": [self.nodes[num].jsonable_state for num in nums if num < node_count],
+            "nerves": [
+                self.nerves[num - node_count].jsonable_state
+                for num in nums
+                if num >= node_count
+            ],
+        }
+
     def generic_advance(dt, advance_free_energy, advance_nodes, advance_nerves):
 
         advance_free_energy(dt)
         advance_nodes(dt)
         advance_nerves(dt)
 
+    def get_activity(self):
+
+        # (mean energy, firing fraction) across all nodes.
+        if not self.nodes:
+
+            return 0, 0
+
+        return (
+            sum(node.energy for node in self.nodes) / len(self.nodes),
+            sum(node.firing for node in self.nodes) / len(self.nodes),
+        )
+
+    def advance_many(self, steps, dt, record=None, record_every=None):
+
+        keywords = self.advance.keywords
+
+        advance_free_energy = keywords["advance_free_energy"]
+        advance_nodes = keywords["advance_nodes"]
+        advance_nerves = keywords["advance_nerves"]
+
+        def run(count):
+
+            for tick in range(count):
+
+                advance_free_energy(dt)
+                advance_nodes(dt)
+                advance_nerves(dt)
+
+        return Model.generic_advance_many(
+            self, run, steps, dt, record=record, record_every=record_every
+        )
+
+    def generic_advance_many(model, run, steps, dt, record, record_every):
+
+        # Runs `steps` fixed-dt ticks through `run(count)`, stopping every
+        # `record_every` ticks to sample activity and call record(model, tick).
+        # A record that returns True ends the run there, leaving `steps` as
+        # the ticks actually run.
+        summary = AdvanceSummary(steps=steps, dt=dt)
+
+        chunk = record_every or steps
+
+        start = timer()
+
+        tick = 0
+
+        while tick < steps:
+
+            count = min(chunk, steps - tick)
+
+            run(count)
+
+            tick += count
+
+            if record_every:
+
+                energy, firing_fraction = model.get_activity()
+
+                summary.samples += 1
+                summary.mean_energy += energy
+                summary.mean_firing_fraction += firing_fraction
+
+                if record is not None and record(model, tick):
+
+                    summary.steps = tick
+                    summary.stopped = True
+
+                    break
+
+        summary.wall_time = timer() - start
+
+        if summary.samples:
+
+            summary.mean_energy /= summary.samples
+            summary.mean_firing_fraction /= summary.samples
+
+        summary.final_energy, summary.final_firing_fraction = model.get_activity()
+
+        return summary
+
 
 def get_default_model():
 
@@ -544,6 +941,37 @@ def get_default_model_003():
     return model
 
 
+def get_random_model(node_count=100, nerve_count=50, connection_count=3, seed=None):
+
+    model_rng = random.Random(seed)
+
+    model = Model()
+
+    def random_pos():
+
+        return XY(model_rng.random(), model_rng.random())
+
+    nodes = [
+        model.add_node(axon_length=model_rng.randint(1, 10), pos=random_pos())
+        for num in range(node_count)
+    ]
+
+    nerves = [
+        model.add_nerve(length=model_rng.randint(1, 10), pos=random_pos())
+        for num in range(nerve_count)
+    ]
+
+    targets = nodes + nerves
+
+    for source in nodes + nerves:
+
+        for target in model_rng.sample(targets, min(connection_count, len(targets))):
+
+            model.attach(source, target, weight=model_rng.uniform(-0.5, 1))
+
+    return model
+
+
 def main():
 
     model = get_default_model_002()
@@ -0,0 +1,597 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import dataclasses
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import neurons.engine
+import neurons.model
+import neurons.shared
+from neurons.engine import ArrayModel, Layout, State
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# A nerve's output at its next fire is the rightmost myelin cell, and only the
+# leftmost cell takes stimulation, so between ticks the next `length - 1`
+# outputs of every nerve are already fixed, `length` if it fires next tick.
+# Partitions exchange those cells for the boundary nerves (those delivering
+# into another partition) and then run without talking until some boundary
+# nerve has used all of them.
+#
+# This spreads the work of a tick over processes, not the memory of the
+# network: the parent builds the whole Model and ArrayModel before
+# splitting it, and the workers write their state back into one shared
+# block the size of the whole network. Peak memory is therefore no lower
+# than a single process run, so a network that does not fit in one
+# process does not fit here either.
+
+
+def get_partition(layout, parts):
+
+    # Contiguous blocks of nodes, each axon with its node, other nerves with
+    # the partition of whatever first delivers into them.
+    node_part = np.arange(layout.node_count) * parts // max(1, layout.node_count)
+
+    nerve_part = np.full(layout.nerve_count, -1, dtype=np.int64)
+
+    nerve_part[layout.node_axon] = node_part
+
+    for source, target in zip(layout.edge_source.tolist(), layout.edge_target.tolist()):
+
+        nerve_num = target - layout.node_count
+
+        if nerve_num >= 0 and nerve_part[nerve_num] < 0 and nerve_part[source] >= 0:
+
+            nerve_part[nerve_num] = nerve_part[source]
+
+    unassigned = np.flatnonzero(nerve_part < 0)
+
+    nerve_part[unassigned] = unassigned % parts
+
+    return node_part, nerve_part
+
+
+@dataclasses.dataclass
+class Part:
+
+    part: int
+    layout: Layout
+    node_nums: np.ndarray
+    nerve_nums: np.ndarray
+    # Edge sources index local nerves first, then boundary slots.
+    edge_fanout: np.ndarray
+    initial: dict
+    params: dict
+
+
+@dataclasses.dataclass
+class Boundary:
+
+    nerve_nums: np.ndarray
+    part: np.ndarray
+    length: np.ndarray
+    offset: np.ndarray
+    period: np.ndarray
+    clock: np.ndarray
+
+
+def get_parts(array_model, parts):
+
+    layout = array_model.layout
+    state = array_model.state
+
+    node_part, nerve_part = get_partition(layout, parts)
+
+    edge_source_part = nerve_part[layout.edge_source]
+
+    edge_target_part = np.where(
+        layout.edge_target < layout.node_count,
+        node_part[np.minimum(layout.edge_target, layout.node_count - 1)],
+        nerve_part[np.maximum(layout.edge_target - layout.node_count, 0)],
+    )
+
+    boundary_nums = np.unique(
+        layout.edge_source[edge_source_part != edge_target_part]
+    )
+
+    boundary_length = layout.nerve_length[boundary_nums].astype(np.int64)
+
+    boundary_offset = np.zeros_like(boundary_length)
+
+    np.cumsum(boundary_length[:-1], out=boundary_offset[1:])
+
+    boundary = Boundary(
+        nerve_nums=boundary_nums,
+        part=nerve_part[boundary_nums],
+        length=boundary_length,
+        offset=boundary_offset,
+        period=layout.nerve_period[boundary_nums],
+        clock=state.nerve_clock[boundary_nums].copy(),
+    )
+
+    boundary_slot = {nerve_num: num for num, nerve_num in enumerate(boundary_nums.tolist())}
+
+    params = {
+        name: getattr(array_model, name)
+        for name in [
+            "free_energy_per_second",
+            "distance_decay",
+            "distance_scale",
+            "neuron_output_per_second",
+            "energy_stop_firing_threshold",
+            "energy_start_firing_threshold",
+            "axon_inefficiency",
+        ]
+    }
+
+    result = []
+
+    for part in range(parts):
+
+        node_nums = np.flatnonzero(node_part == part)
+        nerve_nums = np.flatnonzero(nerve_part == part)
+
+        node_local = {num: local for local, num in enumerate(node_nums.tolist())}
+        nerve_local = {num: local for local, num in enumerate(nerve_nums.tolist())}
+
+        local_node_count = len(node_nums)
+
+        # Edges into this partition, still in global order so every target
+        # sums its deliveries in the same order as the single process model.
+        edge_nums = np.flatnonzero(edge_target_part == part)
+
+        edge_source = []
+        edge_target = []
+
+        for source, target in zip(
+            layout.edge_source[edge_nums].tolist(), layout.edge_target[edge_nums].tolist()
+        ):
+
+            if source in nerve_local:
+
+                edge_source.append(nerve_local[source])
+
+            else:
+
+                edge_source.append(len(nerve_nums) + boundary_slot[source])
+
+            if target < layout.node_count:
+
+                edge_target.append(node_local[target])
+
+            else:
+
+                edge_target.append(local_node_count + nerve_local[target - layout.node_count])
+
+        nerve_length = layout.nerve_length[nerve_nums]
+
+        nerve_offset = np.zeros_like(nerve_length)
+
+        np.cumsum(nerve_length[:-1], out=nerve_offset[1:])
+
+        local_layout = Layout(
+            node_ids=[layout.node_ids[num] for num in node_nums.tolist()],
+            nerve_ids=[layout.nerve_ids[num] for num in nerve_nums.tolist()],
+            nerve_targets=[],
+            node_x=layout.node_x[node_nums],
+            node_y=layout.node_y[node_nums],
+            node_axon=np.array(
+                [nerve_local[num] for num in layout.node_axon[node_nums].tolist()],
+                dtype=layout.index_dtype,
+            ),
+            nerve_x=layout.nerve_x[nerve_nums],
+            nerve_y=layout.nerve_y[nerve_nums],
+            nerve_length=nerve_length,
+            nerve_offset=nerve_offset,
+            nerve_fanout=layout.nerve_fanout[nerve_nums],
+            nerve_period=layout.nerve_period[nerve_nums],
+            edge_source=np.array(edge_source, dtype=np.int64),
+            edge_target=np.array(edge_target, dtype=np.int64),
+            edge_weight=layout.edge_weight[edge_nums],
+            edge_split=int((edge_nums < layout.edge_split).sum()),
+            free_energy_count=layout.free_energy_count,
+            dtype=layout.dtype,
+            index_dtype=layout.index_dtype,
+        )
+
+        cells = np.concatenate(
+            [
+                np.arange(offset, offset + length)
+                for offset, length in zip(
+                    layout.nerve_offset[nerve_nums].tolist(), nerve_length.tolist()
+                )
+            ]
+            or [np.zeros(0, dtype=np.int64)]
+        )
+
+        initial = {
+            "node_energy": state.node_energy[node_nums],
+            "node_firing": state.node_firing[node_nums],
+            "node_output": state.node_output[node_nums],
+            "stimulation": np.concatenate(
+                [
+                    state.node_stimulation[node_nums],
+                    state.nerve_stimulation[nerve_nums],
+                ]
+            ),
+            "nerve_output": state.nerve_output[nerve_nums],
+            "nerve_clock": state.nerve_clock[nerve_nums],
+            "nerve_head": state.nerve_head[nerve_nums],
+            "myelin": state.myelin[cells],
+            "fe_x": state.fe_x,
+            "fe_y": state.fe_y,
+            "fe_mag": state.fe_mag,
+        }
+
+        result.append(
+            Part(
+                part=part,
+                layout=local_layout,
+                node_nums=node_nums,
+                nerve_nums=nerve_nums,
+                edge_fanout=layout.nerve_fanout[layout.edge_source[edge_nums]].astype(
+                    layout.dtype
+                ),
+                initial=initial,
+                params=params,
+            )
+        )
+
+    return result, boundary
+
+
+class PartWorker:
+
+    def __init__(self, part, boundary, exchange, barrier):
+
+        self.part = part
+        self.boundary = boundary
+        self.exchange = exchange
+        self.barrier = barrier
+
+        layout = part.layout
+
+        self.state = State(neurons.engine.get_state_spec(layout), layout.node_count)
+
+        for name, array in part.initial.items():
+
+            getattr(self.state, name)[...] = array
+
+        for name, value in part.params.items():
+
+            setattr(self, name, value)
+
+        boundary_count = len(boundary.nerve_nums)
+
+        self.shadow_clock = boundary.clock.copy()
+        self.consumed = np.zeros(boundary_count, dtype=np.int64)
+        self.available = np.zeros(boundary_count, dtype=np.int64)
+        self.imported = np.zeros(int(boundary.length.sum()), dtype=layout.dtype)
+
+        self.source_output = np.zeros(layout.nerve_count + boundary_count, dtype=layout.dtype)
+
+        # Boundary nerves this partition owns, as local nerve numbers.
+        local = {num: local for local, num in enumerate(part.nerve_nums.tolist())}
+
+        self.exported = [
+            (slot, local[nerve_num])
+            for slot, nerve_num in enumerate(boundary.nerve_nums.tolist())
+            if boundary.part[slot] == part.part
+        ]
+
+        self.syncs = 0
+
+    def sync(self, shadow_fire):
+
+        boundary = self.boundary
+        layout = self.part.layout
+        state = self.state
+
+        self.barrier.wait()
+
+        for slot, nerve_num in self.exported:
+
+            offset = layout.nerve_offset[nerve_num]
+            length = layout.nerve_length[nerve_num]
+
+            cells = np.roll(
+                state.myelin[offset : offset + length], -state.nerve_head[nerve_num]
+            )
+
+            # Rightmost cell first, in the order the nerve will emit them.
+            self.exchange[boundary.offset[slot] : boundary.offset[slot] + length] = cells[::-1]
+
+        self.barrier.wait()
+
+        self.imported[...] = self.exchange
+
+        self.consumed[...] = 0
+
+        # The leftmost cell is only final if the nerve pops before its next
+        # injection.
+        self.available[...] = boundary.length - ~shadow_fire
+
+        self.syncs += 1
+
+    def run(self, steps, dt):
+
+        layout = self.part.layout
+        state = self.state
+
+        get_decay = functools.partial(
+            ArrayModel.generic_get_decay,
+            distance_scale=self.distance_scale,
+            distance_decay=self.distance_decay,
+        )
+
+        for step in range(steps):
+
+            shadow_fire = self.shadow_clock > self.boundary.period
+
+            if (shadow_fire & (self.consumed >= self.available)).any():
+
+                self.sync(shadow_fire)
+
+            ArrayModel.generic_advance_free_energy(
+                dt,
+                state=state,
+                node_x=layout.node_x,
+                node_y=layout.node_y,
+                free_energy_per_second=self.free_energy_per_second,
+                get_decay=get_decay,
+                rng=neurons.model.rng,
+            )
+
+            ArrayModel.generic_advance_nodes(
+                dt,
+                state=state,
+                node_axon=layout.node_axon,
+                energy_start_firing_threshold=self.energy_start_firing_threshold,
+                energy_stop_firing_threshold=self.energy_stop_firing_threshold,
+                neuron_output_per_second=self.neuron_output_per_second,
+                axon_inefficiency=self.axon_inefficiency,
+            )
+
+            self.advance_nerves(dt, shadow_fire)
+
+    def advance_nerves(self, dt, shadow_fire):
+
+        # ArrayModel.generic_advance_nerves with edge sources drawn from local
+        # outputs followed by the imported boundary outputs.
+        layout = self.part.layout
+        state = self.state
+        boundary = self.boundary
+
+        clock = state.nerve_clock
+        head = state.nerve_head
+
+        fire = clock > layout.nerve_period
+
+        last = layout.nerve_offset + (head + layout.nerve_length - 1) % layout.nerve_length
+
+        output = np.where(fire, state.myelin[last], 0)
+
+        state.nerve_output[:] = output
+
+        fired_last = last[fire]
+
+        state.myelin[fired_last] = 0
+
+        head[fire] = fired_last - layout.nerve_offset[fire]
+
+        clock[fire] -= layout.nerve_period[fire]
+
+        imported = self.source_output[layout.nerve_count :]
+
+        imported[...] = 0
+
+        fired_slots = np.flatnonzero(shadow_fire)
+
+        imported[fired_slots] = self.imported[
+            boundary.offset[fired_slots] + self.consumed[fired_slots]
+        ]
+
+        self.consumed[fired_slots] += 1
+
+        self.shadow_clock[fired_slots] -= boundary.period[fired_slots]
+        self.shadow_clock += dt
+
+        self.source_output[: layout.nerve_count] = output
+
+        contribution = (
+            self.source_output[layout.edge_source] * layout.edge_weight
+        ) / self.part.edge_fanout
+
+        split = layout.edge_split
+
+        np.add.at(state.stimulation, layout.edge_target[:split], contribution[:split])
+
+        state.myelin[layout.nerve_offset + head] += state.nerve_stimulation
+
+        state.nerve_stimulation[:] = 0
+
+        np.add.at(state.stimulation, layout.edge_target[split:], contribution[split:])
+
+        clock += dt
+
+    def write_result(self, views, global_layout):
+
+        part = self.part
+        layout = part.layout
+        state = self.state
+
+        node_nums = part.node_nums
+        nerve_nums = part.nerve_nums
+
+        views["node_energy"][node_nums] = state.node_energy
+        views["node_firing"][node_nums] = state.node_firing
+        views["node_output"][node_nums] = state.node_output
+        views["stimulation"][node_nums] = state.node_stimulation
+        views["stimulation"][global_layout.node_count + nerve_nums] = state.nerve_stimulation
+        views["nerve_output"][nerve_nums] = state.nerve_output
+        views["nerve_clock"][nerve_nums] = state.nerve_clock
+        views["nerve_head"][nerve_nums] = state.nerve_head
+
+        for local, nerve_num in enumerate(nerve_nums.tolist()):
+
+            offset = global_layout.nerve_offset[nerve_num]
+            local_offset = layout.nerve_offset[local]
+            length = layout.nerve_length[local]
+
+            views["myelin"][offset : offset + length] = state.myelin[
+                local_offset : local_offset + length
+            ]
+
+        if part.part == 0:
+
+            views["fe_x"][...] = state.fe_x
+            views["fe_y"][...] = state.fe_y
+            views["fe_mag"][...] = state.fe_mag
+
+
+def run_part(
+    part, boundary, global_layout, fields, exchange_name, result_name, barrier, steps, dt, seed
+):
+
+    np.random.seed(seed)
+    neurons.model.rng.seed(seed)
+
+    exchange_shm = neurons.shared.attach_shared_memory(exchange_name)
+    result_shm = neurons.shared.attach_shared_memory(result_name)
+
+    exchange = np.ndarray(
+        shape=(int(boundary.length.sum()),),
+        dtype=global_layout.dtype,
+        buffer=exchange_shm.buf,
+    )
+
+    views = neurons.shared.get_views(result_shm.buf, fields, 0)
+
+    worker = None
+
+    try:
+
+        worker = PartWorker(part, boundary, exchange, barrier)
+
+        worker.run(steps, dt)
+
+        worker.write_result(views, global_layout)
+
+        log.info("part %s finished with %s syncs", part.part, worker.syncs)
+
+    except BaseException:
+
+        # Lets the other parts stop waiting on this one.
+        barrier.abort()
+
+        raise
+
+    finally:
+
+        del worker, exchange, views
+
+        exchange_shm.close()
+        result_shm.close()
+
+
+def run_partitioned(array_model, parts, steps, dt, seed, barrier_timeout=600):
+
+    # Advances array_model by `steps` ticks split over `parts` processes,
+    # seeding each with `seed` so the free energy draws match a single
+    # process run seeded the same way. array_model is already whole, and the
+    # result is gathered into a block as large as its state. A part that
+    # fails, or waits more than barrier_timeout seconds for the others at a
+    # sync, stops every part and raises here.
+    part_list, boundary = get_parts(array_model, parts)
+
+    layout = array_model.layout
+
+    fields, result_size = neurons.shared.get_slot_fields(array_model.state)
+
+    exchange_size = max(1, int(boundary.length.sum()) * layout.dtype.itemsize)
+
+    exchange_shm = shared_memory.SharedMemory(create=True, size=exchange_size)
+    result_shm = shared_memory.SharedMemory(create=True, size=max(1, result_size))
+
+    try:
+
+        barrier = multiprocessing.Barrier(parts, timeout=barrier_timeout)
+
+        processes = [
+            multiprocessing.Process(
+                target=run_part,
+                args=(
+                    part,
+                    boundary,
+                    layout,
+                    fields,
+                    exchange_shm.name,
+                    result_shm.name,
+                    barrier,
+                    steps,
+                    dt,
+                    seed,
+                ),
+            )
+            for part in part_list
+        ]
+
+        for process in processes:
+
+            process.start()
+
+        # A part killed outright cannot abort the barrier itself.
+        while any(process.is_alive() for process in processes):
+
+            for process in processes:
+
+                process.join(timeout=0.1)
+
+            if any(process.exitcode for process in processes):
+
+                barrier.abort()
+
+        failed = [process.exitcode for process in processes if process.exitcode]
+
+        if failed:
+
+            raise RuntimeError(f"partition workers failed with exit codes {failed}")
+
+        views = neurons.shared.get_views(result_shm.buf, fields, 0)
+
+        for name, array in array_model.state.items():
+
+            array[...] = views[name]
+
+        del views
+
+    finally:
+
+        exchange_shm.close()
+        exchange_shm.unlink()
+        result_shm.close()
+        result_shm.unlink()
+
+    return {"parts": parts, "boundary_nerves": len(boundary.nerve_nums)}
+
+
+def main():
+
+    array_model = ArrayModel(neurons.model.get_random_model(2000, 1000, seed=0))
+
+    log.info("%s", run_partitioned(array_model, parts=4, steps=600, dt=1 / 60, seed=0))
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
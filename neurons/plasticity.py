@@ -0,0 +1,180 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import dataclasses
+import timeit
+import types
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Hebbian weight changes on an ArrayModel's edges. Every tick adds each
+# nerve's output and whether each target fired (a node firing, a nerve
+# emitting) to running sums, which is one pass over the nodes and nerves.
+# Every `every` ticks the window's averages are gathered onto the edges and
+# each weight moves by
+#
+#   learning_rate * pre * (post - depression * (1 - post))
+#
+# where pre is the source's mean output magnitude and post the fraction of
+# the window its target was firing: a source whose energy arrives while the
+# target fires is strengthened, one whose energy arrives while it is silent
+# weakened. Weights are then clipped to [min_weight, max_weight].
+#
+# The edge update is a handful of whole-array operations on scratch
+# buffers, so its cost is linear in the edge count with no Python per edge.
+# Layout.edge_weight is updated in place, which both advance paths read
+# every tick.
+
+
+@dataclasses.dataclass
+class HebbianRule:
+
+    learning_rate: float = 0.01
+    depression: float = 0.5
+    min_weight: float = -1
+    max_weight: float = 1
+    every: int = 60
+
+
+class Plasticity:
+
+    def __init__(self, layout, rule=None):
+
+        self.layout = layout
+        self.rule = HebbianRule() if rule is None else rule
+
+        if self.rule.every < 1:
+
+            raise ValueError(f"every must be at least 1, got {self.rule.every}")
+
+        dtype = layout.dtype
+
+        node_count = layout.node_count
+        nerve_count = layout.nerve_count
+        edge_count = layout.edge_count
+
+        self.edge_source = layout.edge_source.astype(np.intp)
+        self.edge_target = layout.edge_target.astype(np.intp)
+
+        self.pre_sum = np.zeros(nerve_count, dtype=dtype)
+
+        # Targets index nodes first, then nerves, as edge_target does.
+        self.post_sum = np.zeros(node_count + nerve_count, dtype=dtype)
+        self.post_node_sum = self.post_sum[:node_count]
+        self.post_nerve_sum = self.post_sum[node_count:]
+
+        self.nerve_float = np.zeros(nerve_count, dtype=dtype)
+        self.nerve_bool = np.zeros(nerve_count, dtype=np.bool_)
+
+        self.edge_pre = np.zeros(edge_count, dtype=dtype)
+        self.edge_post = np.zeros(edge_count, dtype=dtype)
+
+        self.ticks = 0
+        self.updates = 0
+
+    def observe(self, state):
+
+        np.abs(state.nerve_output, out=self.nerve_float)
+
+        np.add(self.pre_sum, self.nerve_float, out=self.pre_sum)
+
+        np.add(self.post_node_sum, state.node_firing, out=self.post_node_sum)
+
+        np.not_equal(state.nerve_output, 0, out=self.nerve_bool)
+
+        np.add(self.post_nerve_sum, self.nerve_bool, out=self.post_nerve_sum)
+
+        self.ticks += 1
+
+        if self.ticks >= self.rule.every:
+
+            self.apply()
+
+    def apply(self):
+
+        if not self.ticks:
+
+            return
+
+        rule = self.rule
+        weight = self.layout.edge_weight
+
+        edge_pre = self.edge_pre
+        edge_post = self.edge_post
+
+        np.take(self.pre_sum, self.edge_source, out=edge_pre, mode="clip")
+        np.take(self.post_sum, self.edge_target, out=edge_post, mode="clip")
+
+        # post - depression * (1 - post) == post * (1 + depression) - depression,
+        # with both sums still over the window's ticks.
+        ticks = self.ticks
+
+        np.multiply(edge_post, (1 + rule.depression) / ticks, out=edge_post)
+        np.subtract(edge_post, rule.depression, out=edge_post)
+
+        np.multiply(edge_pre, rule.learning_rate / ticks, out=edge_pre)
+        np.multiply(edge_pre, edge_post, out=edge_pre)
+
+        np.add(weight, edge_pre, out=weight)
+        np.clip(weight, rule.min_weight, rule.max_weight, out=weight)
+
+        self.pre_sum[:] = 0
+        self.post_sum[:] = 0
+
+        self.ticks = 0
+        self.updates += 1
+
+
+def measure_update(
+    edge_count=2_000_000, node_count=200_000, nerve_count=100_000, repeat=5
+):
+
+    # Seconds per weight update on a synthetic layout of this size.
+    random_state = np.random.default_rng(0)
+
+    layout = types.SimpleNamespace(
+        dtype=np.dtype(np.float64),
+        node_count=node_count,
+        nerve_count=nerve_count,
+        edge_count=edge_count,
+        edge_source=random_state.integers(0, nerve_count, edge_count),
+        edge_target=random_state.integers(0, node_count + nerve_count, edge_count),
+        edge_weight=random_state.uniform(-0.5, 1, edge_count),
+    )
+
+    plasticity = Plasticity(layout, HebbianRule(every=1))
+
+    plasticity.pre_sum[:] = random_state.random(nerve_count)
+    plasticity.post_sum[:] = random_state.random(node_count + nerve_count)
+
+    def update():
+
+        plasticity.ticks = 1
+
+        plasticity.apply()
+
+    return min(timeit.repeat(update, number=1, repeat=repeat))
+
+
+def main():
+
+    for edge_count in [10**5, 10**6, 10**7]:
+
+        seconds = measure_update(edge_count=edge_count)
+
+        log.info("%s edges: %0.2f ms per update", edge_count, seconds * 1000)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
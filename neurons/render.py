@@ -0,0 +1,581 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import dataclasses
+import multiprocessing
+import os
+import shutil
+import struct
+import subprocess
+import zlib
+import numpy as np
+import neurons.config
+import neurons.engine
+import neurons.model
+import neurons.trace
+
+config = neurons.config.load()
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Offscreen drawing of the same picture gui draws, into an RGB array: free
+# energies, nerve segments coloured by their myelin, then nodes coloured by
+# energy. Everything but the free energy circles is fixed by the layout, so
+# a Renderer works out once which pixels belong to which segment and node
+# and each frame is a few fancy-indexed writes.
+
+nerve_off_color = config["colors"].getColor("nerve off")
+nerve_on_color = config["colors"].getColor("nerve on")
+node_off_color = config["colors"].getColor("node off")
+node_firing_color = config["colors"].getColor("node firing")
+node_charging_color = config["colors"].getColor("node charging")
+
+background_color = [0, 0, 0]
+border_color = [255, 255, 255]
+node_outline_color = [0, 255, 255]
+free_energy_color = [255, 0, 0]
+
+
+def interpolate_color(start, end, factor):
+
+    return [int(s + factor * (e + s)) for s, e in zip(start, end)]
+
+
+def get_colors(start, end, factor):
+
+    # interpolate_color over an array of factors, clipped to what a pixel
+    # can hold.
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+
+    colors = np.trunc(start + np.asarray(factor)[:, None] * (end + start))
+
+    return np.clip(colors, 0, 255).astype(np.uint8)
+
+
+def get_line_pixels(x0, y0, x1, y1):
+
+    # Pixels along each segment, one sample per pixel step along its longer
+    # axis, and the segment each pixel came from.
+    steps = np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))).astype(np.intp) + 1
+
+    segment = np.repeat(np.arange(len(steps)), steps)
+
+    offsets = np.cumsum(steps) - steps
+
+    fraction = (np.arange(len(segment)) - offsets[segment]) / np.maximum(
+        steps[segment] - 1, 1
+    )
+
+    x = np.round(x0[segment] + (x1 - x0)[segment] * fraction).astype(np.intp)
+    y = np.round(y0[segment] + (y1 - y0)[segment] * fraction).astype(np.intp)
+
+    return x, y, segment
+
+
+def get_disc_offsets(radius):
+
+    # Offsets inside a disc, split into fill and a one pixel outline.
+    span = int(np.ceil(radius))
+
+    dy, dx = np.mgrid[-span : span + 1, -span : span + 1]
+
+    distance = np.sqrt(dx * dx + dy * dy)
+
+    inside = distance <= radius
+    outline = inside & (distance > radius - 1)
+
+    return (dx[inside & ~outline], dy[inside & ~outline]), (dx[outline], dy[outline])
+
+
+def get_nerve_colors(myelin):
+
+    return get_colors(nerve_off_color, nerve_on_color, np.asarray(myelin) / 5)
+
+
+def get_myelin(model):
+
+    # Every nerve's myelin in logical order, as one array.
+    if isinstance(model, neurons.engine.ArrayModel):
+
+        return model.get_logical_myelin()
+
+    return np.fromiter(
+        itertools.chain.from_iterable(nerve.myelin for nerve in model.nerves),
+        dtype=np.float64,
+    )
+
+
+@dataclasses.dataclass
+class NerveSegments:
+
+    # One line per myelin cell per nerve target, in window coordinates, as
+    # gui draws them: segment i runs from (x0[i], y0[i]) to (x1[i], y1[i])
+    # and is coloured by logical myelin cell cell[i]. Segments are ordered
+    # by nerve, then target, then cell (num along the line).
+    size: tuple
+    x0: np.ndarray
+    y0: np.ndarray
+    x1: np.ndarray
+    y1: np.ndarray
+    cell: np.ndarray
+    nerve: np.ndarray
+    target: np.ndarray
+    num: np.ndarray
+
+    def __len__(self):
+
+        return len(self.cell)
+
+
+def get_nerve_segments(geometry, size):
+
+    # The segments XY.segmentize would give for every nerve and target,
+    # computed for all of them at once.
+    width, height = size
+
+    node_x = np.asarray(geometry["node_x"], dtype=np.float64) * width
+    node_y = np.asarray(geometry["node_y"], dtype=np.float64) * height
+
+    nerve_x = np.asarray(geometry["nerve_x"], dtype=np.float64) * width
+    nerve_y = np.asarray(geometry["nerve_y"], dtype=np.float64) * height
+
+    nerve_length = np.asarray(geometry["nerve_length"], dtype=np.intp)
+
+    # Nerve targets index nodes first, then nerves.
+    target_x = np.concatenate([node_x, nerve_x])
+    target_y = np.concatenate([node_y, nerve_y])
+
+    cell_offset = np.cumsum(nerve_length) - nerve_length
+
+    target_count = np.array(
+        [len(targets) for targets in geometry["nerve_targets"]], dtype=np.intp
+    )
+
+    pair_nerve = np.repeat(np.arange(len(nerve_length)), target_count)
+
+    pair_target = np.fromiter(
+        itertools.chain.from_iterable(geometry["nerve_targets"]),
+        dtype=np.intp,
+        count=int(target_count.sum()),
+    )
+
+    pair_length = nerve_length[pair_nerve]
+
+    segment_pair = np.repeat(np.arange(len(pair_nerve)), pair_length)
+
+    num = np.arange(len(segment_pair)) - (np.cumsum(pair_length) - pair_length)[
+        segment_pair
+    ]
+
+    nerve = pair_nerve[segment_pair]
+    target = pair_target[segment_pair]
+
+    length = nerve_length[nerve]
+
+    delta_x = target_x[target] - nerve_x[nerve]
+    delta_y = target_y[target] - nerve_y[nerve]
+
+    return NerveSegments(
+        size=tuple(size),
+        x0=nerve_x[nerve] + delta_x * num / length,
+        y0=nerve_y[nerve] + delta_y * num / length,
+        x1=nerve_x[nerve] + delta_x * (num + 1) / length,
+        y1=nerve_y[nerve] + delta_y * (num + 1) / length,
+        cell=cell_offset[nerve] + num,
+        nerve=nerve,
+        target=target,
+        num=num,
+    )
+
+
+class NerveSegmentCache:
+
+    # The NerveSegments for a model at a window size, rebuilt only when
+    # nodes, nerves or connections are added (Changes.topology; an
+    # ArrayModel's layout never changes) or the size changes. Positions are
+    # taken to be fixed once placed.
+    def __init__(self):
+
+        self.model = None
+        self.topology = None
+        self.geometry = None
+        self.segments = None
+
+    def get(self, model, size):
+
+        topology = (
+            None
+            if isinstance(model, neurons.engine.ArrayModel)
+            else model.changes.topology
+        )
+
+        if model is not self.model or topology != self.topology:
+
+            self.model = model
+            self.topology = topology
+            self.geometry = neurons.trace.get_geometry(model)
+            self.segments = None
+
+        if self.segments is None or self.segments.size != tuple(size):
+
+            self.segments = get_nerve_segments(self.geometry, size)
+
+        return self.segments
+
+
+class Renderer:
+
+    def __init__(self, geometry, size=(800, 600)):
+
+        self.geometry = geometry
+        self.size = size
+
+        width, height = size
+
+        self.energy_start_firing_threshold = geometry["energy_start_firing_threshold"]
+
+        node_x = np.asarray(geometry["node_x"], dtype=np.float64) * width
+        node_y = np.asarray(geometry["node_y"], dtype=np.float64) * height
+
+        segments = get_nerve_segments(geometry, size)
+
+        x, y, segment = get_line_pixels(
+            segments.x0, segments.y0, segments.x1, segments.y1
+        )
+
+        self.nerve_pixel, keep = self.get_pixel_index(x, y)
+        self.nerve_cell = segments.cell[segment[keep]]
+
+        fill, outline = get_disc_offsets(min(size) * 0.05)
+
+        node_count = len(node_x)
+
+        center_x = np.round(node_x).astype(np.intp)
+        center_y = np.round(node_y).astype(np.intp)
+
+        self.node_pixel, keep = self.get_pixel_index(
+            (center_x[:, None] + fill[0]).ravel(), (center_y[:, None] + fill[1]).ravel()
+        )
+        self.node_pixel_node = np.repeat(np.arange(node_count), len(fill[0]))[keep]
+
+        self.outline_pixel, keep = self.get_pixel_index(
+            (center_x[:, None] + outline[0]).ravel(),
+            (center_y[:, None] + outline[1]).ravel(),
+        )
+
+        self.base = np.empty((height, width, 3), dtype=np.uint8)
+
+        self.base[...] = background_color
+
+        self.base[[0, -1], :] = border_color
+        self.base[:, [0, -1]] = border_color
+
+    def get_pixel_index(self, x, y):
+
+        width, height = self.size
+
+        keep = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+
+        return y[keep] * width + x[keep], keep
+
+    def draw_free_energies(self, image, frame):
+
+        width, height = self.size
+
+        for x, y, mag in zip(frame["fe_x"], frame["fe_y"], frame["fe_mag"]):
+
+            if not mag > 0:
+
+                continue
+
+            radius = 20 * mag
+
+            x = x * width
+            y = y * height
+
+            low_x = max(0, int(np.floor(x - radius)))
+            low_y = max(0, int(np.floor(y - radius)))
+            high_x = min(width, int(np.ceil(x + radius)) + 1)
+            high_y = min(height, int(np.ceil(y + radius)) + 1)
+
+            if low_x >= high_x or low_y >= high_y:
+
+                continue
+
+            dy, dx = np.ogrid[low_y - y : high_y - y, low_x - x : high_x - x]
+
+            image[low_y:high_y, low_x:high_x][dx * dx + dy * dy <= radius * radius] = (
+                free_energy_color
+            )
+
+    def draw(self, frame, out=None):
+
+        image = self.base.copy() if out is None else out
+
+        if out is not None:
+
+            image[...] = self.base
+
+        self.draw_free_energies(image, frame)
+
+        pixels = image.reshape(-1, 3)
+
+        pixels[self.nerve_pixel] = get_nerve_colors(frame["myelin"])[self.nerve_cell]
+
+        energy = np.asarray(frame["node_energy"]) / self.energy_start_firing_threshold
+
+        node_colors = np.where(
+            np.asarray(frame["node_firing"])[:, None],
+            get_colors(node_off_color, node_firing_color, energy),
+            get_colors(node_off_color, node_charging_color, energy),
+        )
+
+        pixels[self.node_pixel] = node_colors[self.node_pixel_node]
+        pixels[self.outline_pixel] = node_outline_color
+
+        return image
+
+
+def get_png(image):
+
+    height, width, channels = image.shape
+
+    def chunk(kind, data):
+
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    # Filter type 0 (none) on every row.
+    rows = np.zeros((height, 1 + width * channels), dtype=np.uint8)
+
+    rows[:, 1:] = image.reshape(height, -1)
+
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+            chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)),
+            chunk(b"IEND", b""),
+        ]
+    )
+
+
+def write_png(path, image):
+
+    pathlib.Path(path).write_bytes(get_png(image))
+
+
+def get_ffmpeg(output_path, size, fps=60):
+
+    ffmpeg = shutil.which("ffmpeg")
+
+    if ffmpeg is None:
+
+        raise RuntimeError("ffmpeg not found on PATH, render to a directory of PNGs instead")
+
+    return subprocess.Popen(
+        [
+            ffmpeg,
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgb24",
+            "-s",
+            f"{size[0]}x{size[1]}",
+            "-r",
+            str(fps),
+            "-i",
+            "-",
+            "-pix_fmt",
+            "yuv420p",
+            str(output_path),
+        ],
+        stdin=subprocess.PIPE,
+    )
+
+
+# Each pool worker opens the trace and builds its Renderer once.
+worker = {}
+
+
+def init_worker(trace_path, size):
+
+    trace_reader = neurons.trace.TraceReader(trace_path)
+
+    worker["trace_reader"] = trace_reader
+    worker["renderer"] = Renderer(trace_reader.geometry, size=size)
+
+
+def render_chunk(frame_nums, frame_dir=None):
+
+    trace_reader = worker["trace_reader"]
+    renderer = worker["renderer"]
+
+    width, height = renderer.size
+
+    image = np.empty((height, width, 3), dtype=np.uint8)
+
+    results = []
+
+    for frame_num, trace_num in frame_nums:
+
+        renderer.draw(trace_reader.get_frame(trace_num), out=image)
+
+        if frame_dir is None:
+
+            results.append(image.tobytes())
+
+        else:
+
+            write_png(pathlib.Path(frame_dir) / f"frame-{frame_num:06}.png", image)
+
+            results.append(frame_num)
+
+    return results
+
+
+def render_trace(
+    trace_path,
+    output_path,
+    size=(800, 600),
+    start=0,
+    stop=None,
+    step=1,
+    fps=60,
+    chunk_size=16,
+    processes=None,
+):
+
+    # Renders every `step`th recorded tick. An output path with a suffix is
+    # a video encoded by ffmpeg, fed frames in order; without one it is a
+    # directory of numbered PNGs written by the workers themselves.
+    # processes=0 renders in this process.
+    trace_nums = range(len(neurons.trace.TraceReader(trace_path)))[start:stop:step]
+
+    frame_nums = list(enumerate(trace_nums))
+
+    chunks = [
+        frame_nums[num : num + chunk_size] for num in range(0, len(frame_nums), chunk_size)
+    ]
+
+    output_path = pathlib.Path(output_path)
+
+    frame_dir = None
+    ffmpeg = None
+
+    if output_path.suffix:
+
+        ffmpeg = get_ffmpeg(output_path, size, fps=fps)
+
+    else:
+
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        frame_dir = output_path
+
+    render = functools.partial(render_chunk, frame_dir=frame_dir)
+
+    pool = None
+
+    try:
+
+        if processes == 0:
+
+            init_worker(trace_path, size)
+
+            chunk_results = map(render, chunks)
+
+        else:
+
+            pool = multiprocessing.Pool(
+                processes or os.cpu_count(),
+                initializer=init_worker,
+                initargs=(trace_path, size),
+            )
+
+            chunk_results = pool.imap(render, chunks)
+
+        frames = 0
+
+        for results in chunk_results:
+
+            if ffmpeg is not None:
+
+                for frame in results:
+
+                    ffmpeg.stdin.write(frame)
+
+            frames += len(results)
+
+        if pool is not None:
+
+            pool.close()
+            pool.join()
+            pool = None
+
+    finally:
+
+        if pool is not None:
+
+            pool.terminate()
+
+        if ffmpeg is not None:
+
+            ffmpeg.stdin.close()
+
+            ffmpeg.wait()
+
+    if ffmpeg is not None and ffmpeg.returncode:
+
+        raise RuntimeError(f"ffmpeg exited with {ffmpeg.returncode}")
+
+    log.info("rendered %s frames to %s", frames, output_path)
+
+    return frames
+
+
+def main():
+
+    model = neurons.model.get_default_model_003()
+
+    for node in model.nodes:
+
+        node.energy = rng.uniform(0, model.energy_start_firing_threshold)
+
+    array_model = neurons.engine.ArrayModel(model)
+
+    trace_path = pathlib.Path("gen") / "trace"
+
+    with neurons.trace.TraceWriter(trace_path, array_model, dt=1 / 60) as trace_writer:
+
+        array_model.advance_many(steps=600, dt=1 / 60, record=trace_writer, record_every=1)
+
+    output_path = pathlib.Path("gen") / "frames"
+
+    if shutil.which("ffmpeg") is not None:
+
+        output_path = pathlib.Path("gen") / "simple-network-example.mp4"
+
+    render_trace(trace_path, output_path)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
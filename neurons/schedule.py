@@ -0,0 +1,134 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+
+class TimingWheel:
+
+    # Buckets nerves by the tick they next fire on, so a tick only touches
+    # the nerves due then instead of comparing every clock. Nerves sharing a
+    # period and clock fire together for good and are scheduled as one group.
+    #
+    # Fire ticks are found by stepping a group's clock exactly as
+    # Model.generic_advance_nerves does (fire once clock > period, subtract
+    # the period, add dt every tick), so they land on the same tick as the
+    # per-tick comparison would. That needs a fixed dt.
+    def __init__(self, periods, clocks, dt, size=256):
+
+        if not dt > 0:
+
+            raise ValueError(f"TimingWheel needs a positive dt, not {dt}")
+
+        self.dt = dt
+        self.size = size
+        self.tick = 0
+
+        keys, nerve_group = np.unique(
+            np.stack([periods, clocks], axis=1), axis=0, return_inverse=True
+        )
+
+        self.nerve_group = nerve_group.reshape(-1).astype(np.intp)
+
+        group_count = len(keys)
+
+        order = np.argsort(self.nerve_group, kind="stable")
+
+        self.members = np.split(
+            order, np.cumsum(np.bincount(self.nerve_group, minlength=group_count))[:-1]
+        )
+
+        self.group_period = keys[:, 0].copy()
+
+        # Each group's clock at the start of base_tick, and the clock it will
+        # have at the start of fire_tick.
+        self.base_clock = keys[:, 1].copy()
+        self.base_tick = np.zeros(group_count, dtype=np.int64)
+        self.fire_clock = np.zeros(group_count)
+        self.fire_tick = np.zeros(group_count, dtype=np.int64)
+
+        self.buckets = [[] for num in range(size)]
+
+        self.schedule(np.arange(group_count))
+
+    @property
+    def group_count(self):
+
+        return len(self.members)
+
+    def schedule(self, groups):
+
+        period = self.group_period[groups]
+        clock = self.base_clock[groups].copy()
+        wait = np.zeros(len(groups), dtype=np.int64)
+
+        waiting = ~(clock > period)
+
+        while waiting.any():
+
+            np.add(clock, self.dt, out=clock, where=waiting)
+
+            wait += waiting
+
+            waiting &= ~(clock > period)
+
+        fire_tick = self.base_tick[groups] + wait
+
+        self.fire_clock[groups] = clock
+        self.fire_tick[groups] = fire_tick
+
+        for group, tick in zip(groups.tolist(), fire_tick.tolist()):
+
+            self.buckets[tick % self.size].append(group)
+
+    def pop(self):
+
+        # Groups firing this tick, then moves on to the next tick.
+        tick = self.tick
+
+        self.tick += 1
+
+        bucket = self.buckets[tick % self.size]
+
+        if not bucket:
+
+            return []
+
+        groups = np.array(bucket, dtype=np.intp)
+
+        due = self.fire_tick[groups] == tick
+
+        if not due.any():
+
+            return []
+
+        bucket[:] = groups[~due].tolist()
+
+        fired = groups[due]
+
+        self.base_clock[fired] = (
+            self.fire_clock[fired] - self.group_period[fired]
+        ) + self.dt
+        self.base_tick[fired] = self.tick
+
+        self.schedule(fired)
+
+        return fired.tolist()
+
+    def get_clocks(self, out=None):
+
+        # Every nerve's clock at the start of the current tick.
+        clock = self.base_clock.copy()
+
+        elapsed = self.tick - self.base_tick
+
+        for step in range(int(elapsed.max(initial=0))):
+
+            np.add(clock, self.dt, out=clock, where=elapsed > step)
+
+        return np.take(clock, self.nerve_group, out=out, mode="clip")
+
@@ -0,0 +1,305 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import sys, time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import neurons.engine
+import neurons.model
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Block layout: an 8 byte header length, a JSON header, then a control block
+# of int64 [sequence, slot sequence...], then `slots` copies of the state.
+alignment = 64
+
+
+def align(offset):
+
+    return -(-offset // alignment) * alignment
+
+
+def get_slot_fields(state):
+
+    fields = []
+    offset = 0
+
+    for name, array in state.items():
+
+        fields.append([name, list(array.shape), array.dtype.str, offset])
+
+        offset = align(offset + array.nbytes)
+
+    return fields, offset
+
+
+def get_views(buf, fields, base):
+
+    return {
+        name: np.ndarray(
+            shape=tuple(shape), dtype=np.dtype(dtype), buffer=buf, offset=base + offset
+        )
+        for name, shape, dtype, offset in fields
+    }
+
+
+def attach_shared_memory(name):
+
+    if sys.version_info >= (3, 13):
+
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    # Before Python 3.13 attaching registers the block with this process'
+    # resource tracker, which would unlink it when the observer exits.
+    register = resource_tracker.register
+
+    resource_tracker.register = lambda name, rtype: None
+
+    try:
+
+        return shared_memory.SharedMemory(name=name)
+
+    finally:
+
+        resource_tracker.register = register
+
+
+class SharedState:
+
+    # Publishes an ArrayModel's state into shared memory. Publishing writes
+    # the next slot round-robin and then bumps the sequence counter, so
+    # readers holding views onto the previous slot stay consistent until the
+    # writer wraps round to it again.
+    def __init__(self, model, name=None, slots=2):
+
+        self.model = model
+        self.slots = slots
+        self.ticks = 0
+
+        layout = model.layout
+
+        fields, slot_size = get_slot_fields(model.state)
+
+        header = {
+            "slots": slots,
+            "slot_size": slot_size,
+            "fields": fields,
+            "node_ids": layout.node_ids,
+            "nerve_ids": layout.nerve_ids,
+            "nerve_offset": layout.nerve_offset.tolist(),
+            "nerve_length": layout.nerve_length.tolist(),
+        }
+
+        header_bytes = json.dumps(header).encode("utf-8")
+
+        control_offset = align(8 + len(header_bytes))
+        slots_offset = align(control_offset + 8 * (1 + slots))
+
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=slots_offset + slots * slot_size
+        )
+
+        buf = self.shm.buf
+
+        buf[:8] = np.int64(len(header_bytes)).tobytes()
+        buf[8 : 8 + len(header_bytes)] = header_bytes
+
+        self.control = np.ndarray(
+            shape=(1 + slots,), dtype=np.int64, buffer=buf, offset=control_offset
+        )
+
+        self.control[:] = 0
+
+        self.slot_views = [
+            get_views(buf, fields, slots_offset + num * slot_size)
+            for num in range(slots)
+        ]
+
+        self.publish()
+
+    @property
+    def name(self):
+
+        return self.shm.name
+
+    @property
+    def sequence(self):
+
+        return int(self.control[0])
+
+    def publish(self):
+
+        sequence = self.sequence + 1
+
+        slot = sequence % self.slots
+
+        self.control[1 + slot] = -1
+
+        views = self.slot_views[slot]
+
+        for name, array in self.model.state.items():
+
+            views[name][...] = array
+
+        self.control[1 + slot] = sequence
+        self.control[0] = sequence
+
+    def advance(self, dt, publish_every=1):
+
+        self.model.advance(dt)
+
+        self.ticks += 1
+
+        if self.ticks % publish_every == 0:
+
+            self.publish()
+
+    def close(self):
+
+        self.slot_views = []
+        self.control = None
+
+        self.shm.close()
+
+    def unlink(self):
+
+        self.shm.unlink()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+        self.unlink()
+
+
+class Snapshot:
+
+    def __init__(self, reader, sequence, arrays):
+
+        self.reader = reader
+        self.sequence = sequence
+        self.arrays = arrays
+
+    def __getitem__(self, name):
+
+        return self.arrays[name]
+
+    @property
+    def valid(self):
+
+        # True while the slot has not been reused, check after reading.
+        slot = self.sequence % self.reader.slots
+
+        return int(self.reader.control[1 + slot]) == self.sequence
+
+
+class SharedStateReader:
+
+    def __init__(self, name):
+
+        self.shm = attach_shared_memory(name)
+
+        buf = self.shm.buf
+
+        header_length = int(np.frombuffer(buf[:8], dtype=np.int64)[0])
+
+        self.header = json.loads(bytes(buf[8 : 8 + header_length]))
+
+        self.slots = self.header["slots"]
+
+        control_offset = align(8 + header_length)
+        slots_offset = align(control_offset + 8 * (1 + self.slots))
+
+        self.control = np.ndarray(
+            shape=(1 + self.slots,),
+            dtype=np.int64,
+            buffer=buf,
+            offset=control_offset,
+        )
+
+        self.slot_views = [
+            get_views(
+                buf,
+                self.header["fields"],
+                slots_offset + num * self.header["slot_size"],
+            )
+            for num in range(self.slots)
+        ]
+
+    @property
+    def sequence(self):
+
+        return int(self.control[0])
+
+    def snapshot(self):
+
+        # Zero-copy views onto the latest slot. Check `valid` once done with
+        # them, a False means the writer lapped the reader.
+        while True:
+
+            sequence = self.sequence
+
+            slot = sequence % self.slots
+
+            if int(self.control[1 + slot]) == sequence:
+
+                return Snapshot(self, sequence, self.slot_views[slot])
+
+            time.sleep(0)
+
+    def read(self):
+
+        while True:
+
+            snapshot = self.snapshot()
+
+            arrays = {name: array.copy() for name, array in snapshot.arrays.items()}
+
+            if snapshot.valid:
+
+                return snapshot.sequence, arrays
+
+    def close(self):
+
+        self.slot_views = []
+        self.control = None
+
+        self.shm.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+def main():
+
+    model = neurons.engine.ArrayModel(neurons.model.get_default_model_003())
+
+    with SharedState(model) as shared:
+
+        log.info("publishing to %s", shared.name)
+
+        while True:
+
+            shared.advance(dt=1 / 60)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
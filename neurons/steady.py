@@ -0,0 +1,285 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import dataclasses
+import hashlib
+import typing
+import numpy as np
+import neurons.engine
+import neurons.model
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Detects fixed points and limit cycles by hashing a quantised copy of the
+# state every sample and looking for a hash seen before. The state hashed is
+# what drives future ticks: node firing and energy, the nerve stimulation
+# waiting to be injected, myelin in logical order and nerve clocks. Free
+# energy positions are left out, they only matter when they are drawn.
+#
+# With free energy arriving at random no cycle is ever exact, a detection
+# only says the network came back to within `resolution` of an earlier
+# state. With free_energy_per_second = 0 the model is deterministic and a
+# confirmed cycle repeats forever, so the rest of a run can be skipped.
+
+
+@dataclasses.dataclass
+class Cycle:
+
+    # Tick the cycle was first seen on and its length in samples (ticks when
+    # sampled every tick). A period of 1 is a fixed point.
+    start: int
+    period: int
+    confirmed_at: int
+    # Nerve clocks always cycle, a network whose activity stays put through
+    # the whole period is a fixed point with period the clocks' cycle.
+    fixed_point: bool = False
+
+    @property
+    def kind(self):
+
+        return "fixed_point" if self.fixed_point or self.period == 1 else "limit_cycle"
+
+
+def get_state_arrays(model):
+
+    if isinstance(model, neurons.engine.ArrayModel):
+
+        state = model.state
+
+        # Weights that are still learning are part of the state too.
+        weights = [] if model.plasticity is None else [model.layout.edge_weight]
+
+        return [
+            state.node_firing,
+            state.node_energy,
+            state.stimulation,
+            model.get_logical_myelin(),
+            *weights,
+            state.nerve_clock,
+        ]
+
+    return [
+        np.array([node.firing for node in model.nodes], dtype=np.bool_),
+        np.array([node.energy for node in model.nodes], dtype=np.float64),
+        np.array(
+            [node.stimulation for node in model.nodes]
+            + [nerve.stimulation for nerve in model.nerves],
+            dtype=np.float64,
+        ),
+        np.array(
+            [cell for nerve in model.nerves for cell in nerve.myelin], dtype=np.float64
+        ),
+        np.array([nerve.clock for nerve in model.nerves], dtype=np.float64),
+    ]
+
+
+def get_digest(arrays, resolution):
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    for array in arrays:
+
+        if array.dtype == np.bool_:
+
+            digest.update(array.tobytes())
+
+        else:
+
+            # Adding 0 folds -0 into 0 before hashing.
+            digest.update((np.round(array / resolution) + 0).tobytes())
+
+    return digest.digest()
+
+
+def get_state_key(model, resolution=1e-6):
+
+    return get_digest(get_state_arrays(model), resolution)
+
+
+class CycleDetector:
+
+    # A record callback for advance_many. Once a repeat has come round
+    # `confirm` whole periods in a row the cycle is confirmed, and with
+    # stop=True the callback returns True to end the run.
+    def __init__(self, resolution=1e-6, confirm=2, max_period=10000, stop=True):
+
+        self.resolution = resolution
+        self.confirm = confirm
+        self.max_period = max_period
+        self.stop = stop
+
+        self.history = collections.deque(maxlen=max_period)
+        self.last_seen = collections.OrderedDict()
+
+        self.samples = 0
+        self.period = None
+        self.start = None
+        self.streak = 0
+        self.cycle = None
+
+        self.activity_key = None
+        self.activity_streak = 0
+
+    def __call__(self, model, tick):
+
+        return self.update(model, tick) and self.stop
+
+    def update(self, model, tick):
+
+        if self.cycle is not None:
+
+            return True
+
+        arrays = get_state_arrays(model)
+
+        key = get_digest(arrays, self.resolution)
+
+        # Everything but the clocks, to tell fixed points from cycles.
+        activity_key = get_digest(arrays[:-1], self.resolution)
+
+        if activity_key == self.activity_key:
+
+            self.activity_streak += 1
+
+        else:
+
+            self.activity_key = activity_key
+            self.activity_streak = 0
+
+        period = self.period
+
+        if period is not None and len(self.history) >= period and self.history[-period] == key:
+
+            self.streak += 1
+
+        else:
+
+            self.period = None
+            self.streak = 0
+
+            last = self.last_seen.get(key)
+
+            # Periods count samples, whatever the record interval.
+            if last is not None and self.samples - last[1] <= self.max_period:
+
+                self.period = self.samples - last[1]
+                self.start = last[0]
+                self.streak = 1
+
+        self.history.append(key)
+
+        self.last_seen[key] = (tick, self.samples)
+        self.last_seen.move_to_end(key)
+
+        self.samples += 1
+
+        while len(self.last_seen) > self.max_period:
+
+            self.last_seen.popitem(last=False)
+
+        if self.period is not None and self.streak >= self.confirm * self.period:
+
+            self.cycle = Cycle(
+                start=self.start,
+                period=self.period,
+                confirmed_at=tick,
+                fixed_point=self.activity_streak >= self.period,
+            )
+
+            log.info("%s of period %s from tick %s", self.cycle.kind, self.period, self.start)
+
+            return True
+
+        return False
+
+
+def is_deterministic(model):
+
+    # The rate advance deposits free energy at, which setting
+    # free_energy_per_second on either engine rebinds (and ArrayModel's
+    # fused path reads from the same attribute).
+    keywords = model.advance.keywords["advance_free_energy"].keywords
+
+    return not keywords["free_energy_per_second"]
+
+
+@dataclasses.dataclass
+class SteadyResult:
+
+    summary: neurons.model.AdvanceSummary
+    cycle: typing.Optional[Cycle]
+    # Ticks not run because a deterministic cycle made them a repeat, and
+    # the ticks run after them to finish the last partial period.
+    skipped: int = 0
+    tail: int = 0
+
+    @property
+    def ticks(self):
+
+        return self.summary.steps + self.skipped + self.tail
+
+
+def run_until_steady(
+    model, steps, dt, resolution=1e-6, confirm=2, max_period=10000, fast_forward=False
+):
+
+    # Runs up to `steps` ticks, stopping once a cycle is confirmed. With
+    # fast_forward, a deterministic model is left where it would be after all
+    # `steps`: whole periods are skipped and only the remainder is run.
+    if fast_forward and not is_deterministic(model):
+
+        raise ValueError("fast_forward needs a model with free_energy_per_second = 0")
+
+    detector = CycleDetector(resolution=resolution, confirm=confirm, max_period=max_period)
+
+    summary = model.advance_many(steps, dt, record=detector, record_every=1)
+
+    cycle = detector.cycle
+
+    result = SteadyResult(summary=summary, cycle=cycle)
+
+    if cycle is None or not fast_forward:
+
+        return result
+
+    remaining = steps - summary.steps
+
+    result.tail = remaining % cycle.period
+    result.skipped = remaining - result.tail
+
+    model.advance_many(result.tail, dt)
+
+    return result
+
+
+def main():
+
+    model = neurons.model.get_default_model_003()
+
+    model.free_energy_per_second = 0
+
+    for node in model.nodes[:3]:
+
+        node.energy = 10
+
+    array_model = neurons.engine.ArrayModel(model)
+
+    result = run_until_steady(array_model, steps=60 * 600, dt=1 / 60, fast_forward=True)
+
+    log.info(
+        "cycle %s after %s ticks, %s skipped", result.cycle, result.summary.steps, result.skipped
+    )
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
@@ -0,0 +1,617 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import asyncio
+import struct
+import threading
+import numpy as np
+import neurons.engine
+import neurons.model
+import neurons.trace
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Streams model state to local subscribers over a Unix socket or localhost
+# TCP. Every message is a little-endian u32 length then the payload. The
+# first payload is a JSON hello with the trace geometry and fields, every
+# later one a frame:
+#
+#   u8 kind (0 keyframe, 1 delta), i64 tick, u32 sequence
+#   then per field, in hello order:
+#     u32 count, then count u32 indices and count values, or
+#     u32 full_count, then every value of the field
+#
+# A subscriber's first frame is a keyframe, after that a frame holds only
+# the values that differ from the last frame that subscriber was sent. Each
+# subscriber is sent the newest published state whenever its socket has
+# drained, so a slow one skips the states published meanwhile (the gap shows
+# in the sequence) and never holds up the simulation.
+
+stream_version = 1
+
+keyframe_kind = 0
+delta_kind = 1
+
+full_count = 0xFFFFFFFF
+
+frame_header = struct.Struct("<BqI")
+length_header = struct.Struct("<I")
+
+
+def get_fields(geometry):
+
+    fields = neurons.trace.get_fields(geometry)
+
+    del fields["tick"]
+
+    return fields
+
+
+def encode_frame(kind, tick, sequence, fields, frame, baseline=None):
+
+    parts = [frame_header.pack(kind, tick, sequence)]
+
+    for name, (dtype, size) in fields.items():
+
+        values = np.asarray(frame[name], dtype=dtype)
+
+        changed = None
+
+        if baseline is not None:
+
+            changed = np.flatnonzero(values != baseline[name])
+
+        # Indices cost 4 bytes each, past a point the whole field is smaller.
+        if changed is None or len(changed) * (4 + values.itemsize) >= values.nbytes:
+
+            parts.append(length_header.pack(full_count))
+            parts.append(values.tobytes())
+
+        else:
+
+            parts.append(length_header.pack(len(changed)))
+            parts.append(changed.astype("<u4").tobytes())
+            parts.append(values[changed].tobytes())
+
+    payload = b"".join(parts)
+
+    return length_header.pack(len(payload)) + payload
+
+
+def get_snapshot(model):
+
+    return {
+        name: np.array(values, copy=True)
+        for name, values in neurons.trace.get_frame(model).items()
+    }
+
+
+class Subscriber:
+
+    def __init__(self, writer):
+
+        self.writer = writer
+        self.ready = asyncio.Event()
+
+        self.baseline = None
+        self.sequence = None
+
+        self.task = asyncio.current_task()
+        self.pending = False
+
+        self.sent = 0
+        self.skipped = 0
+        self.bytes = 0
+
+
+class StateServer:
+
+    # Also a record callback for advance_many, publishing every call. The
+    # model must be advanced on the server's event loop, see serve_model.
+    def __init__(self, model, path=None, host="127.0.0.1", port=0, high_water=2**16):
+
+        self.model = model
+        self.path = path
+        self.host = host
+        self.port = port
+        self.high_water = high_water
+
+        self.geometry = neurons.trace.get_geometry(model)
+        self.fields = get_fields(self.geometry)
+
+        hello = json.dumps(
+            {"version": stream_version, "fields": self.fields, "geometry": self.geometry}
+        ).encode()
+
+        self.hello = length_header.pack(len(hello)) + hello
+
+        self.subscribers = []
+        self.server = None
+        self.closed = False
+
+        self.snapshot = None
+        self.tick = 0
+        self.sequence = 0
+
+    async def start(self):
+
+        if self.path is not None:
+
+            self.server = await asyncio.start_unix_server(self.handle, path=str(self.path))
+
+        else:
+
+            self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+            self.port = self.server.sockets[0].getsockname()[1]
+
+        log.info("serving state on %s", self.path or f"{self.host}:{self.port}")
+
+        return self
+
+    async def close(self):
+
+        self.closed = True
+
+        # A subscriber stuck behind a client that stopped reading would
+        # never drain, so connections are dropped rather than flushed.
+        subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+
+            subscriber.writer.transport.abort()
+
+            subscriber.ready.set()
+
+        await asyncio.gather(*(subscriber.task for subscriber in subscribers))
+
+        if self.server is not None:
+
+            self.server.close()
+
+            await self.server.wait_closed()
+
+    async def __aenter__(self):
+
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+
+        await self.close()
+
+    def __call__(self, model, tick):
+
+        self.publish(model, tick)
+
+    def publish(self, model=None, tick=None):
+
+        self.sequence += 1
+        self.tick = self.sequence if tick is None else tick
+
+        # Nothing to copy for when nobody is listening, a subscriber that
+        # joins later starts from the state of the next publish.
+        if not self.subscribers:
+
+            self.snapshot = None
+
+            return
+
+        self.snapshot = get_snapshot(self.model if model is None else model)
+
+        for subscriber in self.subscribers:
+
+            # The state it was waiting for is replaced before it was sent.
+            if subscriber.pending:
+
+                subscriber.skipped += 1
+
+            subscriber.pending = True
+
+            subscriber.ready.set()
+
+    async def handle(self, reader, writer):
+
+        writer.transport.set_write_buffer_limits(high=self.high_water)
+
+        subscriber = Subscriber(writer)
+
+        self.subscribers.append(subscriber)
+
+        log.info("subscriber %s connected", len(self.subscribers))
+
+        try:
+
+            writer.write(self.hello)
+
+            await writer.drain()
+
+            while not self.closed:
+
+                await subscriber.ready.wait()
+
+                subscriber.ready.clear()
+
+                await self.send(subscriber)
+
+        except ConnectionError:
+
+            pass
+
+        finally:
+
+            self.subscribers.remove(subscriber)
+
+            writer.close()
+
+            log.info(
+                "subscriber left after %s frames, %s states skipped",
+                subscriber.sent,
+                subscriber.skipped,
+            )
+
+    async def send(self, subscriber):
+
+        snapshot = self.snapshot
+
+        if snapshot is None or not subscriber.pending:
+
+            return
+
+        subscriber.pending = False
+
+        kind = keyframe_kind if subscriber.baseline is None else delta_kind
+
+        data = encode_frame(
+            kind, self.tick, self.sequence, self.fields, snapshot, subscriber.baseline
+        )
+
+        # Snapshots are replaced, never changed, so keeping a reference is
+        # enough for the next delta.
+        subscriber.baseline = snapshot
+        subscriber.sequence = self.sequence
+
+        subscriber.sent += 1
+        subscriber.bytes += len(data)
+
+        subscriber.writer.write(data)
+
+        # Waits only while the client is behind. Publishes carry on, and the
+        # next send skips to the newest state.
+        await subscriber.writer.drain()
+
+    @property
+    def stats(self):
+
+        return [
+            {"sent": subscriber.sent, "skipped": subscriber.skipped, "bytes": subscriber.bytes}
+            for subscriber in self.subscribers
+        ]
+
+
+async def serve_model(server, steps, dt, steps_per_publish=1, ticks_per_second=None):
+
+    # Advances the server's model on the event loop, publishing every
+    # steps_per_publish ticks and letting subscribers send in between.
+    # ticks_per_second paces the run, None runs flat out. steps=None runs
+    # until cancelled.
+    model = server.model
+
+    loop = asyncio.get_running_loop()
+
+    start = loop.time()
+
+    tick = 0
+
+    while steps is None or tick < steps:
+
+        batch = steps_per_publish if steps is None else min(steps_per_publish, steps - tick)
+
+        model.advance_many(batch, dt)
+
+        tick += batch
+
+        server.publish(model, tick)
+
+        if ticks_per_second is None:
+
+            await asyncio.sleep(0)
+
+        else:
+
+            await asyncio.sleep(max(0, start + tick / ticks_per_second - loop.time()))
+
+    return tick
+
+
+class StateClient:
+
+    def __init__(self):
+
+        self.reader = None
+        self.writer = None
+
+        self.header = None
+        self.fields = None
+        self.geometry = None
+
+        self.frame = None
+        self.tick = None
+        self.sequence = None
+
+        self.frames = 0
+        self.skipped = 0
+
+    async def connect(self, path=None, host="127.0.0.1", port=None):
+
+        if path is not None:
+
+            self.reader, self.writer = await asyncio.open_unix_connection(str(path))
+
+        else:
+
+            self.reader, self.writer = await asyncio.open_connection(host, port)
+
+        self.set_header(json.loads(await self.read_message()))
+
+        return self
+
+    async def close(self):
+
+        if self.writer is not None:
+
+            self.writer.close()
+
+            await self.writer.wait_closed()
+
+    async def read_message(self):
+
+        (length,) = length_header.unpack(await self.reader.readexactly(length_header.size))
+
+        return await self.reader.readexactly(length)
+
+    def set_header(self, header):
+
+        if header["version"] != stream_version:
+
+            raise ValueError(f"unsupported stream version {header['version']}")
+
+        self.header = header
+        self.fields = header["fields"]
+        self.geometry = header["geometry"]
+
+        self.frame = {
+            name: np.zeros(size, dtype=dtype) for name, (dtype, size) in self.fields.items()
+        }
+
+    def apply(self, payload):
+
+        kind, tick, sequence = frame_header.unpack_from(payload)
+
+        pos = frame_header.size
+
+        for name, (dtype, size) in self.fields.items():
+
+            (count,) = length_header.unpack_from(payload, pos)
+
+            pos += length_header.size
+
+            dtype = np.dtype(dtype)
+
+            if count == full_count:
+
+                self.frame[name][:] = np.frombuffer(payload, dtype=dtype, count=size, offset=pos)
+
+                pos += size * dtype.itemsize
+
+            else:
+
+                indices = np.frombuffer(payload, dtype="<u4", count=count, offset=pos)
+
+                pos += count * 4
+
+                self.frame[name][indices] = np.frombuffer(
+                    payload, dtype=dtype, count=count, offset=pos
+                )
+
+                pos += count * dtype.itemsize
+
+        if self.sequence is not None and kind == delta_kind:
+
+            self.skipped += sequence - self.sequence - 1
+
+        self.tick = tick
+        self.sequence = sequence
+        self.frames += 1
+
+        return self.frame
+
+    async def read_frame(self):
+
+        # The updated frame, or None once the server has gone.
+        try:
+
+            return self.apply(await self.read_message())
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+
+            return None
+
+    def __aiter__(self):
+
+        return self
+
+    async def __anext__(self):
+
+        frame = await self.read_frame()
+
+        if frame is None:
+
+            raise StopAsyncIteration
+
+        return frame
+
+
+def store_frame(frame, geometry, model):
+
+    # Writes a received frame into a Model built with the same layout, for
+    # code that draws a Model such as gui.render.
+    if [node.unique_id for node in model.nodes] != geometry["node_ids"] or [
+        nerve.unique_id for nerve in model.nerves
+    ] != geometry["nerve_ids"]:
+
+        raise ValueError("model layout does not match the stream")
+
+    for node, energy, firing in zip(
+        model.nodes, frame["node_energy"].tolist(), frame["node_firing"].tolist()
+    ):
+
+        node.energy = energy
+        node.firing = firing
+
+    model.mark_changed(*model.nodes)
+
+    myelin = frame["myelin"].tolist()
+
+    offset = 0
+
+    for nerve in model.nerves:
+
+        nerve.myelin.extend(myelin[offset : offset + nerve.length])
+
+        offset += nerve.length
+
+    model.mark_changed(*model.nerves)
+
+    for num, (x, y, mag) in enumerate(
+        zip(frame["fe_x"].tolist(), frame["fe_y"].tolist(), frame["fe_mag"].tolist())
+    ):
+
+        free_energy = model.free_energies[num]
+
+        if free_energy is None:
+
+            if mag < 0:
+
+                continue
+
+            free_energy = model.free_energies[num] = neurons.model.FreeEnergy()
+
+        free_energy.pos = neurons.model.XY(x, y)
+        free_energy.mag = mag
+
+
+class ClientThread:
+
+    # A StateClient on its own event loop thread, for callers that are not
+    # async themselves. Only the newest frame is kept.
+    def __init__(self, path=None, host="127.0.0.1", port=None):
+
+        self.client = StateClient()
+
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+
+        self.frame = None
+        self.error = None
+
+        self.thread = threading.Thread(
+            target=asyncio.run, args=(self.run(path, host, port),), daemon=True
+        )
+
+        self.thread.start()
+
+        self.connected.wait()
+
+        if self.error is not None:
+
+            raise self.error
+
+    async def run(self, path, host, port):
+
+        try:
+
+            await self.client.connect(path=path, host=host, port=port)
+
+        except OSError as error:
+
+            self.error = error
+
+            return
+
+        finally:
+
+            self.connected.set()
+
+        async for frame in self.client:
+
+            with self.lock:
+
+                self.frame = {name: values.copy() for name, values in frame.items()}
+
+                self.frame["tick"] = self.client.tick
+
+    @property
+    def geometry(self):
+
+        return self.client.geometry
+
+    def get_frame(self):
+
+        with self.lock:
+
+            return self.frame
+
+    def store(self, model):
+
+        # False until the first frame has arrived.
+        frame = self.get_frame()
+
+        if frame is None:
+
+            return False
+
+        store_frame(frame, self.geometry, model)
+
+        return True
+
+
+async def serve_main(path, steps=None, dt=1 / 60):
+
+    model = neurons.model.get_default_model_003()
+
+    for node in model.nodes:
+
+        node.energy = rng.uniform(0, model.energy_start_firing_threshold)
+
+    array_model = neurons.engine.ArrayModel(model)
+
+    async with StateServer(array_model, path=path) as server:
+
+        await serve_model(server, steps, dt, ticks_per_second=1 / dt)
+
+
+def main():
+
+    path = pathlib.Path("gen") / "neurons.sock"
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if path.exists():
+
+        path.unlink()
+
+    asyncio.run(serve_main(path))
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
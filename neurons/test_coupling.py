@@ -0,0 +1,77 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.coupling as coupling
+
+
+class TestCoupling(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_batch_matches_array_model(self):
+
+        reference = model.get_random_model(50, 20, seed=1)
+
+        # Without free energy both engines are deterministic.
+        reference.free_energy_per_second = 0
+
+        for node in reference.nodes:
+
+            node.energy = rng.uniform(0, 10)
+
+        array_model = engine.ArrayModel(reference)
+
+        batch = coupling.BatchModel(reference, batch_size=3)
+
+        for step in range(1000):
+
+            array_model.advance(dt=0.05)
+            batch.advance(dt=0.05)
+
+        for batch_num in range(3):
+
+            for name, array in array_model.state.items():
+
+                np.testing.assert_array_equal(
+                    getattr(batch.state, name)[batch_num], array, err_msg=name
+                )
+
+    def test_many_free_energy_slots(self):
+
+        # More dead slots than an int16 running count can hold.
+        reference = model.get_default_model_003()
+
+        reference.free_energies.extend([None] * 40000)
+
+        batch = coupling.BatchModel(reference, batch_size=2, seed=0)
+
+        batch.free_energy_per_second = 600
+
+        batch.advance_free_energy(dt=1 / 60)
+
+        self.assertLess((batch.state.fe_mag == 1).sum(), 100)
+
+    def test_coupled_run(self):
+
+        coupled = coupling.get_default_coupling(world_count=50, agent_count=2, seed=0)
+
+        coupled.run(steps=600, dt=1 / 60)
+
+        self.assertEqual(coupled.brains.state.node_energy.shape, (100, 6))
+        self.assertTrue(coupled.brains.state.node_firing.any())
+        self.assertTrue((coupled.world.vel != 0).any())
+        self.assertTrue(
+            ((coupled.world.pos >= 0) & (coupled.world.pos < coupled.world.size)).all()
+        )
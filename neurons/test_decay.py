@@ -0,0 +1,136 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.decay as decay
+
+get_decay = functools.partial(
+    engine.ArrayModel.generic_get_decay, distance_scale=10, distance_decay=2
+)
+
+
+class TestDecay(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_deposit_close_to_exact(self):
+
+        random_state = np.random.default_rng(0)
+
+        node_x = random_state.random(500)
+        node_y = random_state.random(500)
+
+        cache = decay.DecayCache(get_decay)
+
+        cache.validate(node_x, node_y)
+
+        for x, y in random_state.random((20, 2)):
+
+            exact = get_decay(np.sqrt((node_x - x) ** 2 + (node_y - y) ** 2))
+
+            error = np.abs(cache.get_deposit(x, y) - exact)
+
+            self.assertLess((error / exact).mean(), 5e-3)
+
+        # On a corner the deposit is that corner's vector.
+        self.assertTrue(
+            np.allclose(
+                cache.get_deposit(0.5, 0.25),
+                get_decay(np.sqrt((node_x - 0.5) ** 2 + (node_y - 0.25) ** 2)),
+            )
+        )
+
+    def test_budget(self):
+
+        node_x = np.zeros(100)
+
+        cache = decay.DecayCache(get_decay, max_bytes=10 * 800)
+
+        cache.validate(node_x, node_x)
+
+        for num in range(50):
+
+            cache.get_vector(num, 0)
+
+        self.assertEqual(len(cache.cells), 10)
+        self.assertEqual(cache.nbytes, 10 * 800)
+
+        # Most recently used survive.
+        self.assertIn((49, 0), cache.cells)
+        self.assertNotIn((0, 0), cache.cells)
+
+        cache.get_vector(49, 0)
+
+        self.assertEqual(cache.hits, 1)
+
+    def test_invalidated_when_nodes_change(self):
+
+        reference = model.get_random_model(50, 20, seed=1)
+
+        self.assertIsNone(reference.decay_cache)
+
+        reference.use_decay_cache()
+
+        np.random.seed(1)
+
+        for step in range(60):
+
+            reference.advance(dt=1 / 60)
+
+        self.assertGreater(len(reference.decay_cache.cells), 0)
+        self.assertEqual(reference.decay_cache.invalidations, 0)
+
+        reference.nodes[0].pos.x += 0.1
+
+        for step in range(60):
+
+            reference.advance(dt=1 / 60)
+
+        self.assertEqual(reference.decay_cache.invalidations, 1)
+
+        reference.add_node(pos=model.XY(0.5, 0.5))
+
+        for step in range(60):
+
+            reference.advance(dt=1 / 60)
+
+        self.assertEqual(reference.decay_cache.invalidations, 2)
+        self.assertEqual(len(reference.decay_cache.node_x), 51)
+
+    def test_array_model(self):
+
+        energies = []
+
+        for fused in (False, True):
+
+            array_model = engine.ArrayModel(model.get_random_model(200, 100, seed=1))
+
+            array_model.use_decay_cache()
+
+            model.rng.seed(1)
+            np.random.seed(1)
+
+            if fused:
+
+                array_model.fused.run(steps=300, dt=1 / 60)
+
+            else:
+
+                for step in range(300):
+
+                    array_model.advance(dt=1 / 60)
+
+            energies.append(array_model.state.node_energy)
+
+        self.assertTrue(np.array_equal(*energies))
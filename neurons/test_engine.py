@@ -0,0 +1,220 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import tracemalloc
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+
+
+def run_seeded(advance, seed, steps, dt):
+
+    model.rng.seed(seed)
+    np.random.seed(seed)
+
+    for step in range(steps):
+
+        advance(dt=dt)
+
+
+class TestEngine(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_matches_reference(self):
+
+        for get_model in [model.get_default_model_002, model.get_default_model_003]:
+
+            reference = get_model()
+
+            array_model = engine.ArrayModel(reference)
+
+            run_seeded(reference.advance, seed=1, steps=2000, dt=0.05)
+            run_seeded(array_model.advance, seed=1, steps=2000, dt=0.05)
+
+            self.assertEqual(reference.jsonable_state, array_model.jsonable_state)
+
+    def test_store(self):
+
+        reference = model.get_default_model_003()
+
+        array_model = engine.ArrayModel(reference)
+
+        run_seeded(array_model.advance, seed=2, steps=500, dt=0.05)
+
+        array_model.store(reference)
+
+        self.assertEqual(reference.jsonable_state, array_model.jsonable_state)
+
+    def test_compact_memory(self):
+
+        reference = model.get_default_model_003()
+
+        double = engine.get_memory_report(engine.ArrayModel(reference))
+        single = engine.get_memory_report(
+            engine.ArrayModel(reference, dtype=np.float32)
+        )
+
+        self.assertEqual(single["bytes_per"]["cell"], 4)
+        self.assertLess(single["bytes_per"]["node"], double["bytes_per"]["node"])
+        self.assertLess(single["total_bytes"], double["total_bytes"])
+
+    def test_float32_drift(self):
+
+        drift = engine.measure_drift(dtype=np.float32, steps=3000)
+
+        log.info("drift: %s", drift)
+
+        self.assertEqual(drift["firing_mismatch_ticks"], 0)
+        self.assertLess(drift["max_energy_drift"], 1e-3)
+
+    def test_fused_matches_reference(self):
+
+        for get_model in [
+            model.get_default_model_002,
+            functools.partial(model.get_random_model, 200, 100, seed=3),
+        ]:
+
+            reference = get_model()
+
+            array_model = engine.ArrayModel(reference)
+
+            run_seeded(reference.advance, seed=1, steps=1000, dt=0.05)
+
+            model.rng.seed(1)
+            np.random.seed(1)
+
+            array_model.fused.run(steps=1000, dt=0.05)
+
+            self.assertEqual(reference.jsonable_state, array_model.jsonable_state)
+
+    def test_parameters_set_after_construction(self):
+
+        # Both ArrayModel paths, and the reference, run with parameters set
+        # on the instance after it was built.
+        parameters = {
+            "free_energy_per_second": 60,
+            "energy_start_firing_threshold": 3,
+            "neuron_output_per_second": 8,
+            "distance_scale": 5,
+        }
+
+        reference = model.get_random_model(200, 100, seed=3)
+
+        stepped = engine.ArrayModel(reference)
+        fused = engine.ArrayModel(reference)
+
+        for each_model in [reference, stepped, fused]:
+
+            for name, value in parameters.items():
+
+                setattr(each_model, name, value)
+
+        run_seeded(reference.advance, seed=1, steps=500, dt=0.05)
+        run_seeded(stepped.advance, seed=1, steps=500, dt=0.05)
+
+        model.rng.seed(1)
+        np.random.seed(1)
+
+        fused.advance_many(500, 0.05)
+
+        self.assertEqual(reference.jsonable_state, stepped.jsonable_state)
+        self.assertEqual(reference.jsonable_state, fused.jsonable_state)
+
+        default = model.get_random_model(200, 100, seed=3)
+
+        run_seeded(default.advance, seed=1, steps=500, dt=0.05)
+
+        self.assertNotEqual(default.jsonable_state, reference.jsonable_state)
+
+    def test_varied_propogation_times(self):
+
+        def get_model():
+
+            varied = model.get_random_model(200, 100, seed=4)
+
+            periods = random.Random(4)
+
+            for nerve in varied.nerves:
+
+                nerve.propogation_time = periods.choice([None, 0.25, 0.7, 1.5, 3])
+
+            return varied
+
+        reference = get_model()
+
+        run_seeded(reference.advance, seed=2, steps=600, dt=1 / 60)
+
+        for advance in ("advance", "fused"):
+
+            array_model = engine.ArrayModel(get_model())
+
+            if advance == "advance":
+
+                run_seeded(array_model.advance, seed=2, steps=600, dt=1 / 60)
+
+            else:
+
+                model.rng.seed(2)
+                np.random.seed(2)
+
+                for chunk in range(6):
+
+                    array_model.fused.run(steps=100, dt=1 / 60)
+
+            self.assertEqual(reference.jsonable_state, array_model.jsonable_state)
+
+            self.assertEqual(
+                [nerve.clock for nerve in reference.nerves],
+                array_model.state.nerve_clock.tolist(),
+            )
+
+    def test_fused_steady_state_allocation(self):
+
+        array_model = engine.ArrayModel(
+            model.get_random_model(5000, 2500, seed=1)
+        )
+
+        array_model.fused.run(steps=10, dt=1 / 60)
+
+        tracemalloc.start()
+
+        array_model.fused.run(steps=200, dt=1 / 60)
+
+        size, peak = tracemalloc.get_traced_memory()
+
+        tracemalloc.stop()
+
+        log.info("state %s bytes, tick peak %s bytes", array_model.state.nbytes, peak)
+
+        self.assertLess(peak, array_model.state.nbytes / 20)
+
+    def test_advance_many(self):
+
+        reference = model.get_default_model_002()
+
+        array_model = engine.ArrayModel(reference)
+
+        summaries = []
+
+        for advance_many in (reference.advance_many, array_model.advance_many):
+
+            model.rng.seed(5)
+            np.random.seed(5)
+
+            summaries.append(advance_many(1000, dt=0.05, record_every=10))
+
+        self.assertEqual(reference.jsonable_state, array_model.jsonable_state)
+        self.assertAlmostEqual(summaries[0].mean_energy, summaries[1].mean_energy)
+        self.assertEqual(
+            summaries[0].mean_firing_fraction, summaries[1].mean_firing_fraction
+        )
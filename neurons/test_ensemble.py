@@ -0,0 +1,136 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import tempfile
+import unittest
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.ensemble as ensemble
+
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_pool_matches_in_process(self):
+
+        episodes = ensemble.get_episodes(12, seed=1)
+
+        in_process = ensemble.run_ensemble(
+            episodes, chunk_size=4, processes=0, steps=200
+        )
+
+        pooled = ensemble.run_ensemble(episodes, chunk_size=4, processes=2, steps=200)
+
+        def by_episode(results):
+
+            return sorted(results, key=lambda result: result["episode"])
+
+        self.assertEqual(by_episode(in_process), by_episode(pooled))
+
+    def test_chunking_does_not_change_scores(self):
+
+        episodes = ensemble.get_episodes(6, seed=3)
+
+        results = [
+            sorted(
+                ensemble.run_ensemble(
+                    episodes, chunk_size=chunk_size, processes=0, steps=200
+                ),
+                key=lambda result: result["episode"],
+            )
+            for chunk_size in [1, 4, 6]
+        ]
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+    def test_resume(self):
+
+        episodes = ensemble.get_episodes(10, seed=2)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            results_path = pathlib.Path(tmp_dir) / "results.jsonl"
+
+            # Interrupted during the second chunk.
+            first = list(
+                itertools.islice(
+                    ensemble.run_ensemble(
+                        episodes,
+                        chunk_size=4,
+                        processes=0,
+                        results_path=results_path,
+                        steps=100,
+                    ),
+                    5,
+                )
+            )
+
+            rest = list(
+                ensemble.run_ensemble(
+                    episodes,
+                    chunk_size=4,
+                    processes=0,
+                    results_path=results_path,
+                    steps=100,
+                )
+            )
+
+            self.assertEqual(len(first), 5)
+            self.assertEqual(len(rest), 2)
+
+            recorded = ensemble.read_results(results_path)
+
+            self.assertEqual(
+                sorted(result["episode"] for result in recorded), list(range(10))
+            )
+
+    def test_resume_after_partial_line(self):
+
+        episodes = ensemble.get_episodes(6, seed=4)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            results_path = pathlib.Path(tmp_dir) / "results.jsonl"
+
+            first = list(
+                ensemble.run_ensemble(
+                    episodes[:3],
+                    chunk_size=3,
+                    processes=0,
+                    results_path=results_path,
+                    steps=50,
+                )
+            )
+
+            # Killed part way through writing the third record.
+            lines = results_path.read_text().splitlines(keepends=True)
+
+            results_path.write_text("".join(lines[:2]) + lines[2][:20])
+
+            rest = list(
+                ensemble.run_ensemble(
+                    episodes,
+                    chunk_size=2,
+                    processes=0,
+                    results_path=results_path,
+                    steps=50,
+                )
+            )
+
+            self.assertEqual(len(first), 3)
+            self.assertEqual(len(rest), 4)
+
+            recorded = ensemble.read_results(results_path)
+
+            self.assertEqual(
+                sorted(result["episode"] for result in recorded), list(range(6))
+            )
+            self.assertTrue(results_path.read_text().endswith("\n"))
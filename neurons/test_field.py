@@ -0,0 +1,64 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.field as field
+
+
+class TestField(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_error_shrinks_with_resolution(self):
+
+        errors = field.measure_field_error(grid_sizes=(32, 128), node_count=500)
+
+        log.info("field error: %s", errors)
+
+        self.assertLess(errors[128]["mean_relative_error"], 1e-3)
+        self.assertLess(
+            errors[128]["mean_relative_error"], errors[32]["mean_relative_error"] / 4
+        )
+
+    def test_array_model_field(self):
+
+        energies = []
+
+        for grid_size in (None, 256, 256):
+
+            array_model = engine.ArrayModel(model.get_random_model(200, 100, seed=1))
+
+            if grid_size:
+
+                array_model.use_field(grid_size)
+
+            model.rng.seed(1)
+            np.random.seed(1)
+
+            if len(energies) < 2:
+
+                for step in range(300):
+
+                    array_model.advance(dt=1 / 60)
+
+            else:
+
+                array_model.fused.run(steps=300, dt=1 / 60)
+
+            energies.append(array_model.state.node_energy.copy())
+
+        exact, advanced, fused = energies
+
+        self.assertTrue(np.array_equal(advanced, fused))
+        self.assertLess(np.abs(advanced - exact).mean(), 1e-2)
@@ -0,0 +1,94 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import io
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.metrics as metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_matches_full_trace(self):
+
+        dt = 1 / 60
+
+        array_model = engine.ArrayModel(model.get_random_model(100, 50, seed=2))
+
+        trace = []
+
+        pipeline = metrics.Pipeline(dt=dt, emit_every=1200)
+
+        def record(recorded_model, tick):
+
+            trace.append(recorded_model.state.node_firing.copy())
+
+            pipeline(recorded_model, tick)
+
+        model.rng.seed(1)
+        np.random.seed(1)
+
+        array_model.advance_many(1200, dt, record=record, record_every=1)
+
+        [emitted] = pipeline.emitted
+
+        firing = np.array(trace)
+
+        previous = np.vstack([np.zeros((1, firing.shape[1]), dtype=bool), firing[:-1]])
+
+        spikes = firing & ~previous
+
+        self.assertEqual(emitted["tick"], 1200)
+        self.assertAlmostEqual(
+            emitted["firing_rate"]["mean"], spikes.sum(axis=0).mean() / (1200 * dt)
+        )
+
+        intervals = [
+            np.diff(np.flatnonzero(spikes[:, num])) * dt for num in range(firing.shape[1])
+        ]
+
+        intervals = np.concatenate(intervals)
+
+        self.assertGreater(len(intervals), 0)
+        self.assertEqual(emitted["inter_spike_interval"]["count"], len(intervals))
+        self.assertAlmostEqual(emitted["inter_spike_interval"]["mean"], intervals.mean())
+        self.assertAlmostEqual(emitted["inter_spike_interval"]["std"], intervals.std())
+
+        population = firing.mean(axis=1)
+
+        chi = (population.var() / firing.var(axis=0).mean()) ** 0.5
+
+        self.assertAlmostEqual(emitted["synchrony"]["chi"], chi)
+
+        self.assertEqual(
+            sum(emitted["energy_histogram"]["histogram"]), 1200 * firing.shape[1]
+        )
+
+    def test_reference_model_and_sink(self):
+
+        reference = model.get_default_model_003()
+
+        results_file = io.StringIO()
+
+        pipeline = metrics.Pipeline(
+            dt=1 / 60, emit_every=60, sink=metrics.get_jsonl_sink(results_file)
+        )
+
+        reference.advance_many(240, 1 / 60, record=pipeline, record_every=1)
+
+        records = [json.loads(line) for line in results_file.getvalue().splitlines()]
+
+        self.assertEqual([record["tick"] for record in records], [60, 120, 180, 240])
+        self.assertEqual(pipeline.emitted, [])
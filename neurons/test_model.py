@@ -1,12 +1,16 @@
 import collections, datetime, functools, itertools
 import json, logging, pathlib, random, re
+import subprocess
+import sys
 import unittest
+import numpy as np
 
 log = logging.getLogger(__name__)
 log.silent = functools.partial(log.log, 0)
 
 rng = random.Random()
 import neurons.config
+import neurons.lazy
 import neurons.model as model
 from neurons.model import XY
 
@@ -30,3 +34,230 @@ class TestModel(unittest.TestCase):
         segments = list(a.segmentize(b, segment_count=10))
 
         log.info("segments:\n%s", "\n".join(str(x) for x in segments))
+
+    def test_segmentize_endpoints(self):
+
+        a = XY(0, 0)
+
+        b = XY(1, 2)
+
+        self.assertEqual(list(a.segmentize(b, segment_count=1)), [(a, XY(1, 2))])
+
+        segments = list(a.segmentize(b, segment_count=4))
+
+        self.assertEqual(len(segments), 4)
+        self.assertEqual(segments[1], (XY(0.25, 0.5), XY(0.5, 1.0)))
+        self.assertEqual(segments[-1][1], b)
+
+    def test_xy_in_place(self):
+
+        a = XY(1, 2)
+
+        b = a
+
+        a += XY(1, 1)
+        a *= 2
+        a -= XY(0, 1)
+
+        self.assertIs(a, b)
+        self.assertEqual(a, XY(4, 5))
+        self.assertEqual(XY.distance(XY(0, 0), XY(3, 4)), 5)
+
+    def test_slots(self):
+
+        test_model = model.get_default_model_003()
+
+        for obj in [test_model.nodes[0], test_model.nerves[0], XY(), model.FreeEnergy()]:
+
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+        self.assertEqual(
+            test_model.nodes[0].jsonable_state,
+            {
+                "unique_id": "0",
+                "pos": [0.25, 0.2],
+                "energy": 0,
+                "firing": 0,
+                "axon": 0,
+                "output": 0,
+                "stimulation": 0,
+            },
+        )
+
+    def test_advance_many(self):
+
+        stepped = model.get_default_model_003()
+        batched = model.get_default_model_003()
+
+        model.rng.seed(4)
+        np.random.seed(4)
+
+        for step in range(300):
+
+            stepped.advance(dt=0.05)
+
+        recorded = []
+
+        model.rng.seed(4)
+        np.random.seed(4)
+
+        summary = batched.advance_many(
+            300,
+            dt=0.05,
+            record=lambda m, tick: recorded.append(tick),
+            record_every=100,
+        )
+
+        self.assertEqual(stepped.jsonable_state, batched.jsonable_state)
+        self.assertEqual(recorded, [100, 200, 300])
+        self.assertEqual(summary.samples, 3)
+        self.assertAlmostEqual(summary.sim_time, 15)
+        self.assertEqual(
+            (summary.final_energy, summary.final_firing_fraction),
+            batched.get_activity(),
+        )
+
+    def test_snapshots_follow_state(self):
+
+        for use_decay_cache in [False, True]:
+
+            followed = model.get_random_model(200, 100, seed=5)
+
+            followed.changes.keyframe_every = 5
+
+            if use_decay_cache:
+
+                followed.use_decay_cache()
+
+            mirrors = {poll_every: [None, {}] for poll_every in [1, 7, 50]}
+
+            model.rng.seed(5)
+            np.random.seed(5)
+
+            for tick in range(1, 301):
+
+                followed.advance(dt=1 / 60)
+
+                for poll_every, mirror in mirrors.items():
+
+                    if tick % poll_every:
+
+                        continue
+
+                    snapshot = followed.get_snapshot(since=mirror[0])
+
+                    if snapshot["keyframe"]:
+
+                        mirror[1].clear()
+
+                    mirror[0] = snapshot["version"]
+
+                    for kind in ["nodes", "nerves"]:
+
+                        mirror[1].update(
+                            ((kind, state["unique_id"]), state) for state in snapshot[kind]
+                        )
+
+                    expected = {
+                        (kind, state["unique_id"]): state
+                        for kind, states in followed.jsonable_state.items()
+                        for state in states
+                    }
+
+                    self.assertEqual(mirror[1], expected)
+
+    def test_quiet_snapshot_is_empty(self):
+
+        quiet = model.get_default_model_003()
+
+        quiet.advance = functools.partial(quiet.advance, advance_free_energy=lambda dt: None)
+
+        snapshot = quiet.get_snapshot()
+
+        self.assertTrue(snapshot["keyframe"])
+        self.assertEqual(len(snapshot["nodes"]), 6)
+
+        quiet.advance_many(120, 1 / 60)
+
+        snapshot = quiet.get_snapshot(since=snapshot["version"])
+
+        self.assertEqual((snapshot["nodes"], snapshot["nerves"]), ([], []))
+
+        quiet.nodes[2].energy = 10
+
+        quiet.mark_changed(quiet.nodes[2])
+
+        version = quiet.get_snapshot(since=snapshot["version"])["version"]
+
+        quiet.advance(dt=1 / 60)
+
+        snapshot = quiet.get_snapshot(since=version)
+
+        self.assertFalse(snapshot["keyframe"])
+        self.assertEqual([state["unique_id"] for state in snapshot["nodes"]], ["2"])
+        self.assertEqual(snapshot["nodes"][0], quiet.nodes[2].jsonable_state)
+
+    def test_fast_nerve_emptying_is_a_change(self):
+
+        # A nerve faster than the tick pops every tick; popping 0 off empty
+        # myelin after emitting still changes its output.
+        quiet = model.get_default_model_003()
+
+        quiet.advance = functools.partial(quiet.advance, advance_free_energy=lambda dt: None)
+
+        nerve = quiet.nerves[0]
+
+        nerve.propogation_time = 0.001
+        nerve.clock = 1
+        nerve.myelin = model.Fiber([0] * (nerve.length - 1) + [2])
+
+        quiet.mark_changed(nerve)
+
+        quiet.advance(dt=1 / 60)
+
+        self.assertEqual(nerve.output, 2)
+
+        version = quiet.get_snapshot()["version"]
+
+        quiet.advance(dt=1 / 60)
+
+        self.assertEqual(nerve.output, 0)
+
+        nerves = {
+            state["unique_id"]: state for state in quiet.get_snapshot(since=version)["nerves"]
+        }
+
+        self.assertEqual(nerves[nerve.unique_id], nerve.jsonable_state)
+
+    def test_imports_are_lazy(self):
+
+        for module, unwanted in [
+            ("neurons.config", ["pkg_resources"]),
+            ("neurons.model", ["numpy", "neurons.decay"]),
+            ("neurons.gui", ["dearpygui", "numpy"]),
+        ]:
+
+            imported = subprocess.run(
+                [sys.executable, "-c", f"import sys, {module}; print(*sys.modules)"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+
+            for name in unwanted:
+
+                self.assertNotIn(name, imported, module)
+
+    def test_lazy_numpy_is_replaced(self):
+
+        namespace = {}
+
+        namespace["np"] = neurons.lazy.LazyModule("numpy", namespace, "np")
+
+        self.assertEqual(namespace["np"].float64, np.float64)
+        self.assertIs(namespace["np"], np)
+
+    def test_config_is_loaded_once(self):
+
+        self.assertIs(neurons.config.load(), config)
+        self.assertEqual(len(config["colors"].getColor("nerve off")), 3)
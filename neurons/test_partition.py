@@ -0,0 +1,99 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import os
+import time
+import unittest
+import unittest.mock
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.partition as partition
+
+
+class TestPartition(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_matches_single_process(self):
+
+        for get_model in [
+            model.get_default_model_003,
+            functools.partial(model.get_random_model, 200, 100, seed=1),
+        ]:
+
+            reference = get_model()
+
+            model.rng.seed(5)
+            np.random.seed(5)
+
+            for step in range(600):
+
+                reference.advance(dt=1 / 60)
+
+            array_model = engine.ArrayModel(get_model())
+
+            result = partition.run_partitioned(
+                array_model, parts=3, steps=600, dt=1 / 60, seed=5
+            )
+
+            self.assertGreater(result["boundary_nerves"], 0)
+
+            self.assertEqual(array_model.jsonable_state, reference.jsonable_state)
+
+    def test_failed_part_stops_the_others(self):
+
+        # Workers are forked, so they inherit the patched sync. Part 1 fails
+        # at its first sync, by raising or by dying without cleaning up,
+        # while the others wait for it.
+        def raise_error(worker, shadow_fire):
+
+            raise RuntimeError("part failed")
+
+        def exit_now(worker, shadow_fire):
+
+            os._exit(3)
+
+        sync = partition.PartWorker.sync
+
+        for fail in [raise_error, exit_now]:
+
+            def failing_sync(worker, shadow_fire):
+
+                if worker.part.part == 1:
+
+                    fail(worker, shadow_fire)
+
+                return sync(worker, shadow_fire)
+
+            array_model = engine.ArrayModel(model.get_random_model(200, 100, seed=1))
+
+            start = time.monotonic()
+
+            with unittest.mock.patch.object(partition.PartWorker, "sync", failing_sync):
+
+                with self.assertRaises(RuntimeError):
+
+                    partition.run_partitioned(
+                        array_model, parts=3, steps=600, dt=1 / 60, seed=5
+                    )
+
+            self.assertLess(time.monotonic() - start, 30)
+
+    def test_partition(self):
+
+        layout = engine.ArrayModel(model.get_random_model(200, 100, seed=1)).layout
+
+        node_part, nerve_part = partition.get_partition(layout, 4)
+
+        self.assertEqual(sorted(set(node_part.tolist())), [0, 1, 2, 3])
+        self.assertTrue((nerve_part[layout.node_axon] == node_part).all())
+        self.assertTrue((nerve_part >= 0).all())
@@ -0,0 +1,162 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.plasticity as plasticity
+
+
+class TestPlasticity(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_second_rule_replaces_first(self):
+
+        rule = plasticity.HebbianRule(learning_rate=0.05, every=5)
+
+        weights = []
+
+        for rules in [[rule], [plasticity.HebbianRule(learning_rate=0.5), rule]]:
+
+            reference = model.get_random_model(60, 30, seed=1)
+
+            for num, node in enumerate(reference.nodes):
+
+                node.energy = num % 10
+
+            array_model = engine.ArrayModel(reference)
+
+            for each_rule in rules:
+
+                array_model.use_plasticity(each_rule)
+
+            model.rng.seed(1)
+            np.random.seed(1)
+
+            initial = array_model.layout.edge_weight.copy()
+
+            for step in range(300):
+
+                array_model.advance(dt=1 / 60)
+
+            weights.append(array_model.layout.edge_weight.copy())
+
+        self.assertFalse((weights[0] == initial).all())
+        np.testing.assert_array_equal(weights[0], weights[1])
+
+    def test_matches_per_edge_rule(self):
+
+        rule = plasticity.HebbianRule(learning_rate=0.05, depression=0.3, every=7)
+
+        reference = model.get_random_model(60, 30, seed=1)
+
+        for num, node in enumerate(reference.nodes):
+
+            node.energy = num % 10
+
+        array_model = engine.ArrayModel(reference)
+
+        layout = array_model.layout
+
+        weights = layout.edge_weight.copy()
+
+        initial = layout.edge_weight.copy()
+
+        array_model.use_plasticity(rule)
+
+        ticks = []
+
+        def record(recorded_model, tick):
+
+            state = recorded_model.state
+
+            ticks.append((state.nerve_output.copy(), state.node_firing.copy()))
+
+        model.rng.seed(1)
+        np.random.seed(1)
+
+        array_model.advance_many(70, 1 / 60, record=record, record_every=1)
+
+        node_count = layout.node_count
+
+        for window in range(10):
+
+            outputs, firings = zip(*ticks[window * 7 : window * 7 + 7])
+
+            for edge in range(layout.edge_count):
+
+                source = layout.edge_source[edge]
+                target = layout.edge_target[edge]
+
+                pre = sum(abs(output[source]) for output in outputs) / 7
+
+                if target < node_count:
+
+                    post = sum(firing[target] for firing in firings) / 7
+
+                else:
+
+                    post = sum(output[target - node_count] != 0 for output in outputs) / 7
+
+                weights[edge] += rule.learning_rate * pre * (
+                    post - rule.depression * (1 - post)
+                )
+
+                weights[edge] = min(max(weights[edge], rule.min_weight), rule.max_weight)
+
+        self.assertEqual(array_model.plasticity.updates, 10)
+
+        np.testing.assert_allclose(layout.edge_weight, weights, rtol=1e-12, atol=1e-15)
+
+        self.assertFalse(np.array_equal(layout.edge_weight, initial))
+
+    def test_fused_matches_advance(self):
+
+        reference = model.get_random_model(100, 50, seed=2)
+
+        for num, node in enumerate(reference.nodes):
+
+            node.energy = num % 10
+
+        rule = plasticity.HebbianRule(learning_rate=0.2, every=5)
+
+        stepped = engine.ArrayModel(reference)
+        fused = engine.ArrayModel(reference)
+
+        for array_model in [stepped, fused]:
+
+            array_model.use_plasticity(rule)
+
+        model.rng.seed(2)
+        np.random.seed(2)
+
+        for tick in range(300):
+
+            stepped.advance(dt=1 / 60)
+
+        model.rng.seed(2)
+        np.random.seed(2)
+
+        fused.advance_many(300, 1 / 60)
+
+        np.testing.assert_array_equal(stepped.layout.edge_weight, fused.layout.edge_weight)
+        np.testing.assert_array_equal(stepped.state.node_energy, fused.state.node_energy)
+
+        self.assertLessEqual(fused.layout.edge_weight.max(), rule.max_weight)
+        self.assertGreaterEqual(fused.layout.edge_weight.min(), rule.min_weight)
+
+        fused.store(reference)
+
+        np.testing.assert_array_equal(
+            engine.get_layout(reference).edge_weight, fused.layout.edge_weight
+        )
@@ -0,0 +1,221 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import struct
+import tempfile
+import unittest
+import zlib
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.render as render
+import neurons.trace as trace
+
+
+def read_png(data):
+
+    width, height = struct.unpack(">II", data[16:24])
+
+    pos = 8
+    idat = b""
+
+    while pos < len(data):
+
+        (length,) = struct.unpack(">I", data[pos : pos + 4])
+
+        if data[pos + 4 : pos + 8] == b"IDAT":
+
+            idat += data[pos + 8 : pos + 8 + length]
+
+        pos += 12 + length
+
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, -1)
+
+    return rows[:, 1:].reshape(height, width, 3)
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_colors_match_gui(self):
+
+        factors = np.linspace(-0.5, 1.5, 41)
+
+        for start, end in [
+            (render.node_off_color, render.node_firing_color),
+            (render.nerve_off_color, render.nerve_on_color),
+        ]:
+
+            expected = np.clip(
+                [render.interpolate_color(start, end, factor) for factor in factors], 0, 255
+            )
+
+            np.testing.assert_array_equal(render.get_colors(start, end, factors), expected)
+
+    def test_draw(self):
+
+        reference = model.get_default_model_003()
+
+        for node in reference.nodes:
+
+            node.energy = 2.5
+
+        reference.nodes[0].firing = True
+
+        for nerve in reference.nerves:
+
+            nerve.myelin = [0] * nerve.length
+
+        for num in range(len(reference.free_energies)):
+
+            reference.free_energies[num] = None
+
+        array_model = engine.ArrayModel(reference)
+
+        size = (800, 600)
+
+        renderer = render.Renderer(trace.get_geometry(array_model), size=size)
+
+        image = renderer.draw(trace.get_frame(array_model))
+
+        self.assertEqual(image.shape, (600, 800, 3))
+
+        self.assertEqual(
+            renderer.draw(trace.get_frame(reference)).tobytes(), image.tobytes()
+        )
+
+        energy = 2.5 / reference.energy_start_firing_threshold
+
+        for num, node in enumerate(reference.nodes):
+
+            color = render.node_firing_color if node.firing else render.node_charging_color
+
+            x = int(round(node.pos.x * size[0]))
+            y = int(round(node.pos.y * size[1]))
+
+            self.assertEqual(
+                image[y, x].tolist(),
+                render.interpolate_color(render.node_off_color, color, energy),
+            )
+
+        # Halfway along a nerve's first segment, clear of the nodes.
+        nerve = reference.nerves[0]
+        target = nerve.target[0]
+
+        segments = list(nerve.pos.segmentize(target.pos, nerve.length))
+
+        start, end = segments[len(segments) // 2]
+
+        x = int(round((start.x + end.x) / 2 * size[0]))
+        y = int(round((start.y + end.y) / 2 * size[1]))
+
+        self.assertEqual(image[y, x].tolist(), render.nerve_off_color)
+
+    def test_render_trace(self):
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            temp_dir = pathlib.Path(temp_dir)
+
+            array_model = engine.ArrayModel(model.get_default_model_003())
+
+            with trace.TraceWriter(temp_dir / "trace", array_model) as trace_writer:
+
+                array_model.advance_many(40, 1 / 60, record=trace_writer, record_every=1)
+
+            size = (160, 120)
+
+            frames = render.render_trace(
+                temp_dir / "trace", temp_dir / "frames", size=size, step=4, processes=2
+            )
+
+            self.assertEqual(frames, 10)
+
+            trace_reader = trace.TraceReader(temp_dir / "trace")
+
+            renderer = render.Renderer(trace_reader.geometry, size=size)
+
+            for frame_num in range(frames):
+
+                image = read_png(
+                    (temp_dir / "frames" / f"frame-{frame_num:06}.png").read_bytes()
+                )
+
+                np.testing.assert_array_equal(
+                    image, renderer.draw(trace_reader[frame_num * 4])
+                )
+
+    def test_nerve_segments_match_segmentize(self):
+
+        reference = model.get_random_model(50, 25, seed=0)
+
+        size = (800, 600)
+
+        segments = render.get_nerve_segments(trace.get_geometry(reference), size)
+
+        expected = [
+            (start, end)
+            for nerve in reference.nerves
+            for target in nerve.target
+            for start, end in nerve.pos.segmentize(target.pos, nerve.length)
+        ]
+
+        self.assertEqual(len(segments), len(expected))
+
+        np.testing.assert_allclose(
+            segments.x0, [start.x * size[0] for start, end in expected]
+        )
+        np.testing.assert_allclose(
+            segments.y0, [start.y * size[1] for start, end in expected]
+        )
+        np.testing.assert_allclose(
+            segments.x1, [end.x * size[0] for start, end in expected]
+        )
+        np.testing.assert_allclose(
+            segments.y1, [end.y * size[1] for start, end in expected]
+        )
+
+        cell_offset = np.cumsum([nerve.length for nerve in reference.nerves])
+
+        for nerve, num, cell in zip(segments.nerve, segments.num, segments.cell):
+
+            self.assertEqual(
+                cell, cell_offset[nerve] - reference.nerves[nerve].length + num
+            )
+
+    def test_nerve_segment_cache(self):
+
+        reference = model.get_default_model_003()
+
+        cache = render.NerveSegmentCache()
+
+        segments = cache.get(reference, (800, 600))
+
+        self.assertIs(cache.get(reference, (800, 600)), segments)
+
+        resized = cache.get(reference, (400, 300))
+
+        self.assertIsNot(resized, segments)
+        np.testing.assert_allclose(resized.x0, segments.x0 / 2)
+
+        reference.attach(reference.nodes[0], reference.nodes[1])
+
+        attached = cache.get(reference, (400, 300))
+
+        self.assertEqual(len(attached), len(resized) + reference.nodes[0].axon.length)
+
+        array_model = engine.ArrayModel(model.get_default_model_003())
+
+        segments = cache.get(array_model, (400, 300))
+
+        self.assertIs(cache.get(array_model, (400, 300)), segments)
+        self.assertEqual(len(segments), len(resized))
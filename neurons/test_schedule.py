@@ -0,0 +1,55 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.schedule as schedule
+
+
+class TestSchedule(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_matches_clock_comparison(self):
+
+        dt = 1 / 60
+
+        periods = np.array([1, 1, 0.25, 0.01, 7.3, 1])
+        clock = np.array([0, 0, 0.1, 0, 2, 0.5])
+
+        wheel = schedule.TimingWheel(periods, clock, dt, size=16)
+
+        self.assertEqual(wheel.group_count, 5)
+
+        for tick in range(2000):
+
+            fire = clock > periods
+
+            fired = sorted(
+                nerve_num
+                for group in wheel.pop()
+                for nerve_num in wheel.members[group].tolist()
+            )
+
+            self.assertEqual(fired, np.flatnonzero(fire).tolist())
+
+            clock[fire] -= periods[fire]
+            clock += dt
+
+            if tick % 300 == 0:
+
+                self.assertEqual(wheel.get_clocks().tolist(), clock.tolist())
+
+    def test_positive_dt(self):
+
+        with self.assertRaises(ValueError):
+
+            schedule.TimingWheel(np.ones(3), np.zeros(3), 0)
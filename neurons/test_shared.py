@@ -0,0 +1,63 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.shared as shared
+
+
+class TestShared(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_publish_and_read(self):
+
+        array_model = engine.ArrayModel(model.get_default_model_003())
+
+        with shared.SharedState(array_model) as writer:
+
+            with shared.SharedStateReader(writer.name) as reader:
+
+                for step in range(100):
+
+                    writer.advance(dt=0.05)
+
+                sequence, arrays = reader.read()
+
+                self.assertEqual(sequence, writer.sequence)
+
+                for name, array in array_model.state.items():
+
+                    np.testing.assert_array_equal(arrays[name], array)
+
+                self.assertEqual(
+                    reader.header["node_ids"], array_model.layout.node_ids
+                )
+
+    def test_snapshot_invalidated_by_lapping(self):
+
+        array_model = engine.ArrayModel(model.get_default_model_003())
+
+        with shared.SharedState(array_model, slots=2) as writer:
+
+            with shared.SharedStateReader(writer.name) as reader:
+
+                snapshot = reader.snapshot()
+
+                writer.publish()
+
+                self.assertTrue(snapshot.valid)
+
+                writer.publish()
+
+                self.assertFalse(snapshot.valid)
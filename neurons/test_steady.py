@@ -0,0 +1,105 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.steady as steady
+
+
+def get_deterministic_model():
+
+    reference = model.get_default_model_003()
+
+    reference.free_energy_per_second = 0
+
+    for node in reference.nodes[:3]:
+
+        node.energy = 10
+
+    return engine.ArrayModel(reference)
+
+
+class TestSteady(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_fixed_point(self):
+
+        # Nothing in the network and no free energy: only the clocks move.
+        reference = model.get_default_model_003()
+
+        array_model = engine.ArrayModel(reference)
+
+        array_model.free_energy_per_second = 0
+
+        result = steady.run_until_steady(array_model, steps=1000, dt=1 / 60)
+
+        self.assertEqual(result.cycle.kind, "fixed_point")
+        self.assertEqual(result.cycle.period, 60)
+        self.assertTrue(result.summary.stopped)
+        self.assertLess(result.summary.steps, 200)
+
+    def test_fast_forward_matches_full_run(self):
+
+        steps = 60 * 200
+        dt = 1 / 60
+
+        full = get_deterministic_model()
+
+        full.advance_many(steps, dt)
+
+        fast = get_deterministic_model()
+
+        result = steady.run_until_steady(fast, steps, dt, fast_forward=True)
+
+        self.assertEqual(result.cycle.period, 60)
+        self.assertEqual(result.ticks, steps)
+        self.assertGreater(result.skipped, steps / 2)
+
+        self.assertEqual(
+            steady.get_state_key(full, resolution=1e-6),
+            steady.get_state_key(fast, resolution=1e-6),
+        )
+
+    def test_is_deterministic_follows_the_stepping_rate(self):
+
+        reference = model.get_default_model_003()
+
+        array_model = engine.ArrayModel(reference)
+
+        self.assertFalse(steady.is_deterministic(reference))
+        self.assertFalse(steady.is_deterministic(array_model))
+
+        for each_model in [reference, array_model]:
+
+            each_model.free_energy_per_second = 0
+
+            self.assertTrue(steady.is_deterministic(each_model))
+
+            # A quiet network with no free energy stays at zero energy.
+            for step in range(120):
+
+                each_model.advance(dt=1 / 60)
+
+            self.assertEqual(
+                [node["energy"] for node in each_model.jsonable_state["nodes"]],
+                [0] * len(reference.nodes),
+            )
+
+    def test_fast_forward_needs_determinism(self):
+
+        array_model = engine.ArrayModel(model.get_default_model_003())
+
+        with self.assertRaises(ValueError):
+
+            steady.run_until_steady(array_model, steps=1000, dt=1 / 60, fast_forward=True)
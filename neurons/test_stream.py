@@ -0,0 +1,149 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import asyncio
+import tempfile
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.stream as stream
+import neurons.trace as trace
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_deltas_rebuild_state(self):
+
+        array_model = engine.ArrayModel(model.get_random_model(200, 100, seed=1))
+
+        fields = stream.get_fields(trace.get_geometry(array_model))
+
+        client = stream.StateClient()
+
+        client.set_header({"version": stream.stream_version, "fields": fields, "geometry": {}})
+
+        baseline = None
+
+        for sequence in range(1, 20):
+
+            array_model.advance_many(3, 0.05)
+
+            snapshot = stream.get_snapshot(array_model)
+
+            kind = stream.keyframe_kind if baseline is None else stream.delta_kind
+
+            data = stream.encode_frame(kind, sequence * 3, sequence, fields, snapshot, baseline)
+
+            if baseline is not None:
+
+                keyframe = stream.encode_frame(kind, sequence * 3, sequence, fields, snapshot)
+
+                self.assertLess(len(data), len(keyframe))
+
+            frame = client.apply(data[4:])
+
+            for name in fields:
+
+                np.testing.assert_array_equal(frame[name], snapshot[name])
+
+            baseline = snapshot
+
+        self.assertEqual(client.tick, 57)
+
+    def test_slow_subscriber_is_skipped(self):
+
+        async def run(path):
+
+            array_model = engine.ArrayModel(model.get_random_model(500, 250, seed=2))
+
+            async with stream.StateServer(array_model, path=path, high_water=1024) as server:
+
+                fast = await stream.StateClient().connect(path=path)
+
+                # Connected but never reading.
+                slow_reader, slow_writer = await asyncio.open_unix_connection(str(path))
+
+                while len(server.subscribers) < 2:
+
+                    await asyncio.sleep(0.01)
+
+                async def follow():
+
+                    async for frame in fast:
+
+                        if fast.sequence == 400:
+
+                            break
+
+                following = asyncio.create_task(follow())
+
+                ticks = await stream.serve_model(server, 400, 0.05)
+
+                await asyncio.wait_for(following, 10)
+
+                fast_stats, slow_stats = server.stats
+
+                expected = trace.get_frame(array_model)
+
+                for name in fast.fields:
+
+                    np.testing.assert_array_equal(fast.frame[name], expected[name])
+
+                await fast.close()
+
+                slow_writer.close()
+
+            return ticks, fast_stats, slow_stats
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            ticks, fast_stats, slow_stats = asyncio.run(
+                run(pathlib.Path(temp_dir) / "neurons.sock")
+            )
+
+        self.assertEqual(ticks, 400)
+        self.assertLess(slow_stats["sent"], fast_stats["sent"])
+        self.assertGreater(slow_stats["skipped"], 0)
+
+    def test_store_frame(self):
+
+        reference = model.get_default_model_003()
+
+        array_model = engine.ArrayModel(reference)
+
+        model.rng.seed(1)
+        np.random.seed(1)
+
+        array_model.advance_many(200, 0.05)
+
+        follower = model.get_default_model_003()
+
+        geometry = trace.get_geometry(array_model)
+
+        stream.store_frame(stream.get_snapshot(array_model), geometry, follower)
+
+        array_model.store(reference)
+
+        for node, expected in zip(follower.nodes, reference.nodes):
+
+            self.assertEqual((node.energy, node.firing), (expected.energy, expected.firing))
+
+        for nerve, expected in zip(follower.nerves, reference.nerves):
+
+            self.assertEqual(list(nerve.myelin), list(expected.myelin))
+
+        self.assertEqual(
+            [fe.mag for fe in follower.free_energies if fe is not None and fe.mag >= 0],
+            [fe.mag for fe in reference.free_energies if fe is not None and fe.mag >= 0],
+        )
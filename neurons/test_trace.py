@@ -0,0 +1,143 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import tempfile
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.trace as trace
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_engines_write_the_same_trace(self):
+
+        readers = []
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            reference = model.get_default_model_003()
+
+            for num, recorded in enumerate([reference, engine.ArrayModel(reference)]):
+
+                path = pathlib.Path(temp_dir) / f"trace-{num}"
+
+                model.rng.seed(1)
+                np.random.seed(1)
+
+                with trace.TraceWriter(path, recorded, dt=0.05) as trace_writer:
+
+                    recorded.advance_many(300, 0.05, record=trace_writer, record_every=1)
+
+                readers.append(trace.TraceReader(path))
+
+            reference_reader, array_reader = readers
+
+            self.assertEqual(len(reference_reader), 300)
+            self.assertEqual(reference_reader.geometry, array_reader.geometry)
+
+            for name in reference_reader.fields:
+
+                np.testing.assert_array_equal(
+                    reference_reader.arrays[name], array_reader.arrays[name]
+                )
+
+            frame = array_reader[299]
+
+            self.assertEqual(frame["tick"], 300)
+
+            np.testing.assert_array_equal(
+                frame["myelin"],
+                [cell for nerve in reference.nerves for cell in nerve.myelin],
+            )
+
+    def test_partial_row_is_skipped(self):
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            path = pathlib.Path(temp_dir)
+
+            array_model = engine.ArrayModel(model.get_default_model_002())
+
+            trace_writer = trace.TraceWriter(path, array_model)
+
+            for tick in range(3):
+
+                trace_writer.write(array_model, tick)
+
+            trace_writer.close()
+
+            with open(path / "node_energy.bin", "ab") as energy_file:
+
+                energy_file.write(b"\x00" * 4)
+
+            self.assertEqual(len(trace.TraceReader(path)), 3)
+
+    def test_levels_match_rows(self):
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+
+            path = pathlib.Path(temp_dir)
+
+            array_model = engine.ArrayModel(model.get_random_model(50, 25, seed=3))
+
+            model.rng.seed(3)
+            np.random.seed(3)
+
+            with trace.TraceWriter(path, array_model, levels=(10, 100, 1000)) as trace_writer:
+
+                array_model.advance_many(2345, 1 / 60, record=trace_writer, record_every=1)
+
+            trace_reader = trace.TraceReader(path)
+
+            energy = np.asarray(trace_reader.arrays["node_energy"])
+            firing = np.asarray(trace_reader.arrays["node_firing"])
+
+            for factor, rows in trace_reader.levels.items():
+
+                self.assertEqual(len(rows), -(-2345 // factor))
+
+                windows = [slice(num, num + factor) for num in range(0, 2345, factor)]
+
+                np.testing.assert_array_equal(
+                    rows["count"], [len(range(2345)[w]) for w in windows]
+                )
+                np.testing.assert_array_equal(
+                    rows["tick"], [min(w.stop, 2345) for w in windows]
+                )
+                np.testing.assert_array_equal(
+                    rows["energy_min"], [energy[w].min(axis=0) for w in windows]
+                )
+                np.testing.assert_array_equal(
+                    rows["energy_max"], [energy[w].max(axis=0) for w in windows]
+                )
+                np.testing.assert_allclose(
+                    rows["energy_mean"], [energy[w].mean(axis=0) for w in windows]
+                )
+                np.testing.assert_allclose(
+                    rows["firing_fraction"], [firing[w].mean(axis=0) for w in windows]
+                )
+
+            self.assertEqual(trace_reader.get_summary(resolution=2)["factor"], 1000)
+            self.assertEqual(trace_reader.get_summary(resolution=20)["factor"], 100)
+            self.assertEqual(trace_reader.get_summary(resolution=1000)["factor"], 1)
+
+            summary = trace_reader.get_summary(start=150, stop=1150, resolution=50)
+
+            self.assertEqual(summary["factor"], 10)
+            self.assertEqual(list(summary["tick"][[0, -1]]), [160, 1150])
+
+            with self.assertRaises(ValueError):
+
+                trace.TraceWriter(path / "bad", array_model, levels=(10, 25))
@@ -0,0 +1,100 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import unittest
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+import neurons.model as model
+import neurons.engine as engine
+import neurons.verify as verify
+
+
+def get_unscaled_engine(reference):
+
+    # Drops the division of a nerve's output by its number of targets.
+    array_model = engine.ArrayModel(reference)
+
+    array_model.layout.nerve_fanout[:] = 1
+
+    return array_model
+
+
+def get_no_hysteresis_engine(reference):
+
+    # Stops firing at the same threshold it starts at.
+    reference.energy_stop_firing_threshold = reference.energy_start_firing_threshold
+
+    return engine.ArrayModel(reference)
+
+
+class TestVerify(unittest.TestCase):
+    def setUp(self):
+
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        )
+
+    def test_array_model_matches(self):
+
+        for phases in [True, False]:
+
+            for seed, result in verify.verify_many(
+                seeds=range(3), node_count=40, nerve_count=20, steps=200, phases=phases
+            ):
+
+                self.assertTrue(result.ok, (seed, result.divergence))
+                self.assertEqual(result.ticks, 200)
+
+    def test_finds_fanout_change(self):
+
+        get_model = functools.partial(verify.get_random_network, 40, 20, 1)
+
+        result = verify.verify(get_model, get_unscaled_engine, steps=200)
+
+        divergence = result.divergence
+
+        self.assertEqual(divergence.phase, "advance_nerves")
+        self.assertEqual(result.ticks, divergence.tick - 1)
+
+        reference = get_model()
+
+        # Only a target of a nerve with more than one target can differ first.
+        self.assertIn(divergence.field, ["node_stimulation", "nerve_stimulation", "myelin"])
+        self.assertNotEqual(divergence.reference, divergence.alternative)
+
+        sources = [
+            nerve
+            for nerve in reference.nerves
+            if len(nerve.target) > 1
+            and any(
+                divergence.element.startswith(f"{kind} {target.unique_id}")
+                for target in nerve.target
+                for kind in ["node", "nerve"]
+            )
+        ]
+
+        self.assertTrue(sources)
+
+    def test_finds_hysteresis_change(self):
+
+        get_model = functools.partial(verify.get_random_network, 40, 20, 2)
+
+        result = verify.verify(get_model, get_no_hysteresis_engine, steps=600)
+
+        self.assertEqual(result.divergence.phase, "advance_nodes")
+        self.assertEqual(result.divergence.field, "node_energy")
+
+    def test_tolerance(self):
+
+        get_model = functools.partial(verify.get_random_network, 40, 20, 3)
+
+        get_float32 = functools.partial(engine.ArrayModel, dtype=np.float32)
+
+        self.assertFalse(verify.verify(get_model, get_float32, steps=50).ok)
+        self.assertTrue(
+            verify.verify(get_model, get_float32, steps=50, rtol=1e-5, atol=1e-5).ok
+        )
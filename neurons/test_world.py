@@ -1,6 +1,7 @@
 import collections, datetime, functools, itertools
 import json, logging, pathlib, random, re
 import unittest
+import numpy as np
 
 log = logging.getLogger(__name__)
 log.silent = functools.partial(log.log, 0)
@@ -18,9 +19,29 @@ class TestWorld(unittest.TestCase):
 
         log.info("world:\n%s", world.render())
 
-        model = neurons.world.DummyModel(world=world)
+        model = neurons.world.DummyModel(world=world, headless=True, render_every=100)
 
-        model.run(max_time=None)
+        stats = model.run(max_time=60)
+
+        self.assertGreater(stats["sim_time"], 60)
+        self.assertGreater(stats["sim_seconds_per_wall_second"], 1)
+
+    def test_fixed_dt(self):
+
+        world = neurons.world.World()
+
+        model = neurons.world.DummyModel(
+            world=world, headless=True, dt=0.05, render_every=None
+        )
+
+        stats = model.run(max_time=None, max_ticks=1000)
+
+        self.assertEqual(stats["ticks"], 1000)
+        self.assertAlmostEqual(stats["sim_time"], 50)
+
+        for agent in world.agents:
+
+            self.assertTrue(0 <= agent.pos < world.size)
 
     def setUp(self):
 
@@ -28,3 +49,52 @@ class TestWorld(unittest.TestCase):
             level=logging.DEBUG,
             format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
         )
+
+    def test_array_world_matches(self):
+
+        world = neurons.world.World()
+
+        array_world = neurons.world.ArrayWorld.from_world(world)
+
+        for step in range(2000):
+
+            dt = rng.uniform(0.1, 0.2)
+
+            for num, agent in enumerate(world.agents):
+
+                agent.motor.output = rng.choice([-1, 0, 1]) * dt
+
+                array_world.motor[0, num] = agent.motor.output
+
+            world.update(dt=dt)
+            array_world.update(dt=dt)
+
+        self.assertEqual(world.render(), array_world.render())
+
+        for num, agent in enumerate(world.agents):
+
+            self.assertEqual(agent.pos, array_world.pos[0, num])
+            self.assertEqual(agent.vel, array_world.vel[0, num])
+            self.assertEqual(
+                agent.contact_sensor.output, array_world.contact_sensor[0, num]
+            )
+            self.assertEqual(
+                agent.target_sensor.output, array_world.target_sensor[0, num]
+            )
+
+    def test_array_world_contact(self):
+
+        array_world = neurons.world.ArrayWorld(
+            size=1000, agent_count=300, world_count=4
+        )
+
+        array_world.pos += np.random.uniform(0, 1, array_world.pos.shape)
+
+        distance = np.abs(array_world.pos[:, :, None] - array_world.pos[:, None, :])
+
+        np.einsum("wii->wi", distance)[...] = np.inf
+
+        np.testing.assert_array_equal(
+            array_world.get_contact(),
+            (distance < neurons.world.Agent.contact_radius).any(axis=2),
+        )
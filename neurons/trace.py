@@ -0,0 +1,457 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import numpy as np
+import neurons.engine
+import neurons.model
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# A trace is a directory: header.json holds the static geometry, then each
+# field is a raw file with one fixed-size row appended per recorded tick, so
+# recording is an append and reading memory-maps the rows.
+#
+# Alongside the rows the writer keeps a pyramid of summaries, one file per
+# level. A level-f row covers f recorded rows and holds each node's energy
+# min, max and mean and the fraction of those rows it was firing. Each level
+# is built from the completed rows of the one below, so recording costs one
+# extra pass over the nodes per row whatever the number of levels.
+
+trace_version = 2
+
+default_levels = (10, 100, 1000)
+
+
+def get_geometry(model):
+
+    # Static layout for drawing. Nerve targets index nodes first, then
+    # nerves, as Layout.edge_target does, but cover every target rather than
+    # only those with a weight.
+    if isinstance(model, neurons.engine.ArrayModel):
+
+        layout = model.layout
+
+        target_index = {
+            unique_id: num
+            for num, unique_id in enumerate(layout.node_ids + layout.nerve_ids)
+        }
+
+        return {
+            "node_ids": layout.node_ids,
+            "node_x": layout.node_x.tolist(),
+            "node_y": layout.node_y.tolist(),
+            "nerve_ids": layout.nerve_ids,
+            "nerve_x": layout.nerve_x.tolist(),
+            "nerve_y": layout.nerve_y.tolist(),
+            "nerve_length": layout.nerve_length.tolist(),
+            "nerve_targets": [
+                [target_index[unique_id] for unique_id in targets]
+                for targets in layout.nerve_targets
+            ],
+            "free_energy_count": layout.free_energy_count,
+            "energy_start_firing_threshold": model.energy_start_firing_threshold,
+        }
+
+    target_index = {id(node): num for num, node in enumerate(model.nodes)}
+
+    target_index.update(
+        (id(nerve), len(model.nodes) + num) for num, nerve in enumerate(model.nerves)
+    )
+
+    return {
+        "node_ids": [node.unique_id for node in model.nodes],
+        "node_x": [node.pos.x for node in model.nodes],
+        "node_y": [node.pos.y for node in model.nodes],
+        "nerve_ids": [nerve.unique_id for nerve in model.nerves],
+        "nerve_x": [nerve.pos.x for nerve in model.nerves],
+        "nerve_y": [nerve.pos.y for nerve in model.nerves],
+        "nerve_length": [nerve.length for nerve in model.nerves],
+        "nerve_targets": [
+            [target_index[id(target)] for target in nerve.target]
+            for nerve in model.nerves
+        ],
+        "free_energy_count": len(model.free_energies),
+        "energy_start_firing_threshold": model.energy_start_firing_threshold,
+    }
+
+
+def get_frame(model):
+
+    # The state drawn each frame. Spent or empty free energy slots have a
+    # negative magnitude.
+    if isinstance(model, neurons.engine.ArrayModel):
+
+        state = model.state
+
+        return {
+            "node_energy": state.node_energy,
+            "node_firing": state.node_firing,
+            "myelin": model.get_logical_myelin(),
+            "fe_x": state.fe_x,
+            "fe_y": state.fe_y,
+            "fe_mag": state.fe_mag,
+        }
+
+    free_energies = [
+        free_energy if free_energy is not None else neurons.model.FreeEnergy(
+            pos=neurons.model.XY(0, 0), mag=-np.inf
+        )
+        for free_energy in model.free_energies
+    ]
+
+    return {
+        "node_energy": np.array([node.energy for node in model.nodes], dtype=np.float64),
+        "node_firing": np.array([node.firing for node in model.nodes], dtype=np.bool_),
+        "myelin": np.array(
+            [cell for nerve in model.nerves for cell in nerve.myelin], dtype=np.float64
+        ),
+        "fe_x": np.array([fe.pos.x for fe in free_energies], dtype=np.float64),
+        "fe_y": np.array([fe.pos.y for fe in free_energies], dtype=np.float64),
+        "fe_mag": np.array([fe.mag for fe in free_energies], dtype=np.float64),
+    }
+
+
+def get_fields(geometry):
+
+    node_count = len(geometry["node_ids"])
+    cell_count = sum(geometry["nerve_length"])
+    free_energy_count = geometry["free_energy_count"]
+
+    return {
+        "tick": ("<i8", 1),
+        "node_energy": ("<f8", node_count),
+        "node_firing": ("|b1", node_count),
+        "myelin": ("<f8", cell_count),
+        "fe_x": ("<f8", free_energy_count),
+        "fe_y": ("<f8", free_energy_count),
+        "fe_mag": ("<f8", free_energy_count),
+    }
+
+
+def get_level_dtype(node_count):
+
+    # tick is the last tick in the window, count the rows it covers (short
+    # only for the last window of a closed trace).
+    return np.dtype(
+        [
+            ("tick", "<i8"),
+            ("count", "<i8"),
+            ("energy_min", "<f8", (node_count,)),
+            ("energy_max", "<f8", (node_count,)),
+            ("energy_mean", "<f8", (node_count,)),
+            ("firing_fraction", "<f8", (node_count,)),
+        ]
+    )
+
+
+class LevelWriter:
+
+    def __init__(self, path, factor, node_count, parent=None):
+
+        self.factor = factor
+        self.parent = parent
+
+        self.file = open(path / f"level-{factor}.bin", "wb")
+
+        self.row = np.zeros(1, dtype=get_level_dtype(node_count))
+
+        self.energy_min = np.empty(node_count)
+        self.energy_max = np.empty(node_count)
+        self.energy_sum = np.zeros(node_count)
+        self.firing_sum = np.zeros(node_count)
+
+        self.count = 0
+        self.tick = None
+
+    def add(self, tick, count, energy_min, energy_max, energy_sum, firing_sum):
+
+        if self.count:
+
+            np.minimum(self.energy_min, energy_min, out=self.energy_min)
+            np.maximum(self.energy_max, energy_max, out=self.energy_max)
+
+            self.energy_sum += energy_sum
+            self.firing_sum += firing_sum
+
+        else:
+
+            self.energy_min[:] = energy_min
+            self.energy_max[:] = energy_max
+            self.energy_sum[:] = energy_sum
+            self.firing_sum[:] = firing_sum
+
+        self.count += count
+        self.tick = tick
+
+        if self.count >= self.factor:
+
+            self.flush()
+
+    def flush(self):
+
+        if not self.count:
+
+            return
+
+        row = self.row[0]
+
+        row["tick"] = self.tick
+        row["count"] = self.count
+        row["energy_min"] = self.energy_min
+        row["energy_max"] = self.energy_max
+        row["energy_mean"] = self.energy_sum / self.count
+        row["firing_fraction"] = self.firing_sum / self.count
+
+        self.file.write(self.row.tobytes())
+
+        if self.parent is not None:
+
+            self.parent.add(
+                self.tick,
+                self.count,
+                self.energy_min,
+                self.energy_max,
+                self.energy_sum,
+                self.firing_sum,
+            )
+
+        self.count = 0
+
+    def close(self):
+
+        self.flush()
+
+        self.file.close()
+
+
+class TraceWriter:
+
+    # Also a record callback for advance_many, writing a row per call.
+    # levels are the pyramid's window sizes in rows, each a multiple of the
+    # one before.
+    def __init__(self, path, model, dt=None, levels=default_levels):
+
+        levels = list(levels)
+
+        if any(factor < 2 for factor in levels) or any(
+            high % low for low, high in zip(levels, levels[1:])
+        ):
+
+            raise ValueError(f"levels must each be a multiple of the one before: {levels}")
+
+        self.path = pathlib.Path(path)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.geometry = get_geometry(model)
+
+        self.fields = get_fields(self.geometry)
+
+        header = {
+            "version": trace_version,
+            "dt": dt,
+            "fields": self.fields,
+            "levels": levels,
+            "geometry": self.geometry,
+        }
+
+        (self.path / "header.json").write_text(json.dumps(header))
+
+        self.files = {
+            name: open(self.path / f"{name}.bin", "wb") for name in self.fields
+        }
+
+        node_count = len(self.geometry["node_ids"])
+
+        self.levels = []
+
+        parent = None
+
+        for factor in reversed(levels):
+
+            parent = LevelWriter(self.path, factor, node_count, parent=parent)
+
+            self.levels.insert(0, parent)
+
+        self.ticks = 0
+
+    def __call__(self, model, tick):
+
+        self.write(model, tick)
+
+    def write(self, model, tick):
+
+        frame = get_frame(model)
+
+        frame["tick"] = tick
+
+        for name, (dtype, size) in self.fields.items():
+
+            self.files[name].write(np.asarray(frame[name], dtype=dtype).tobytes())
+
+        if self.levels:
+
+            energy = np.asarray(frame["node_energy"], dtype=np.float64)
+
+            self.levels[0].add(tick, 1, energy, energy, energy, frame["node_firing"])
+
+        self.ticks += 1
+
+    def close(self):
+
+        for trace_file in self.files.values():
+
+            trace_file.close()
+
+        # Finishing the lowest level carries its partial window up before
+        # the next one closes.
+        for level in self.levels:
+
+            level.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+
+class TraceReader:
+
+    def __init__(self, path):
+
+        self.path = pathlib.Path(path)
+
+        self.header = json.loads((self.path / "header.json").read_text())
+
+        self.geometry = self.header["geometry"]
+        self.fields = self.header["fields"]
+
+        # Rows a writer is still appending are left out until complete.
+        self.ticks = min(
+            (self.path / f"{name}.bin").stat().st_size
+            // max(1, np.dtype(dtype).itemsize * size)
+            for name, (dtype, size) in self.fields.items()
+        )
+
+        self.arrays = {
+            name: np.memmap(
+                self.path / f"{name}.bin",
+                dtype=np.dtype(dtype),
+                mode="r",
+                shape=(self.ticks, size),
+            )
+            if self.ticks and size
+            else np.zeros((self.ticks, size), dtype=np.dtype(dtype))
+            for name, (dtype, size) in self.fields.items()
+        }
+
+        level_dtype = get_level_dtype(len(self.geometry["node_ids"]))
+
+        self.levels = {}
+
+        for factor in self.header.get("levels", []):
+
+            level_path = self.path / f"level-{factor}.bin"
+
+            rows = level_path.stat().st_size // level_dtype.itemsize
+
+            self.levels[factor] = (
+                np.memmap(level_path, dtype=level_dtype, mode="r", shape=(rows,))
+                if rows
+                else np.zeros(0, dtype=level_dtype)
+            )
+
+    def __len__(self):
+
+        return self.ticks
+
+    def __getitem__(self, num):
+
+        return self.get_frame(num)
+
+    def get_frame(self, num):
+
+        frame = {name: array[num] for name, array in self.arrays.items()}
+
+        frame["tick"] = int(frame["tick"][0])
+
+        return frame
+
+    def get_summary(self, start=0, stop=None, resolution=1000):
+
+        # Energy min/max/mean and firing fraction per node over rows
+        # [start, stop), from the coarsest level that still gives at least
+        # `resolution` windows, or the rows themselves when none does.
+        # Windows are aligned to the level, so the first and last may reach
+        # past start and stop.
+        stop = self.ticks if stop is None else min(stop, self.ticks)
+
+        span = max(0, stop - start)
+
+        factor = max(
+            (factor for factor in self.levels if span // factor >= resolution), default=1
+        )
+
+        if factor == 1:
+
+            energy = np.asarray(self.arrays["node_energy"][start:stop])
+
+            return {
+                "factor": 1,
+                "tick": self.arrays["tick"][start:stop, 0].copy(),
+                "count": np.ones(len(energy), dtype=np.int64),
+                "energy_min": energy,
+                "energy_max": energy,
+                "energy_mean": energy,
+                "firing_fraction": self.arrays["node_firing"][start:stop].astype(np.float64),
+            }
+
+        rows = self.levels[factor][start // factor : -(-stop // factor)]
+
+        summary = {name: np.asarray(rows[name]) for name in rows.dtype.names}
+
+        summary["factor"] = factor
+
+        return summary
+
+
+def main():
+
+    model = neurons.model.get_random_model(200, 100, seed=0)
+
+    array_model = neurons.engine.ArrayModel(model)
+
+    trace_path = pathlib.Path("gen") / "trace"
+
+    with TraceWriter(trace_path, array_model, dt=1 / 60) as trace_writer:
+
+        array_model.advance_many(60 * 600, 1 / 60, record=trace_writer, record_every=1)
+
+    trace_reader = TraceReader(trace_path)
+
+    summary = trace_reader.get_summary(resolution=30)
+
+    for tick, energy, firing in zip(
+        summary["tick"],
+        summary["energy_mean"].mean(axis=1),
+        summary["firing_fraction"].mean(axis=1),
+    ):
+
+        log.info("tick %6s mean energy %0.3f firing %0.3f", tick, energy, firing)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
@@ -0,0 +1,347 @@
+import collections, datetime, functools, itertools
+import json, logging, pathlib, random, re
+import dataclasses
+import typing
+import numpy as np
+import neurons.engine
+import neurons.model
+
+log = logging.getLogger(__name__)
+log.silent = functools.partial(log.log, 0)
+
+rng = random.Random()
+
+# Runs the reference Model and an alternative engine side by side from the
+# same seeded network and compares their state after every phase of every
+# tick. An engine whose advance is a partial over the three phases, as
+# Model and ArrayModel are, is stepped phase by phase: the random state is
+# saved before each reference phase and restored for the alternative, so
+# both see the same draws. Any other engine (or phases=False, which also
+# exercises ArrayModel's fused path) is compared once per tick through
+# advance_many(1, dt).
+
+phase_names = ["advance_free_energy", "advance_nodes", "advance_nerves"]
+
+
+def get_comparable(model):
+
+    # The state of either engine as flat arrays with the same meaning, myelin
+    # in logical order and empty free energy slots as mag -inf at (0, 0).
+    if isinstance(model, neurons.engine.ArrayModel):
+
+        state = model.state
+
+        return {
+            "node_energy": state.node_energy,
+            "node_firing": state.node_firing,
+            "node_output": state.node_output,
+            "node_stimulation": state.node_stimulation,
+            "nerve_output": state.nerve_output,
+            "nerve_stimulation": state.nerve_stimulation,
+            "nerve_clock": state.nerve_clock,
+            "myelin": model.get_logical_myelin(),
+            "fe_x": state.fe_x,
+            "fe_y": state.fe_y,
+            "fe_mag": state.fe_mag,
+        }
+
+    free_energies = [
+        (0, 0, -np.inf) if free_energy is None else (*free_energy.pos, free_energy.mag)
+        for free_energy in model.free_energies
+    ]
+
+    def get_array(objs, name, dtype=np.float64):
+
+        return np.array([getattr(obj, name) for obj in objs], dtype=dtype)
+
+    return {
+        "node_energy": get_array(model.nodes, "energy"),
+        "node_firing": get_array(model.nodes, "firing", dtype=np.bool_),
+        "node_output": get_array(model.nodes, "output"),
+        "node_stimulation": get_array(model.nodes, "stimulation"),
+        "nerve_output": get_array(model.nerves, "output"),
+        "nerve_stimulation": get_array(model.nerves, "stimulation"),
+        "nerve_clock": get_array(model.nerves, "clock"),
+        "myelin": np.array(
+            [cell for nerve in model.nerves for cell in nerve.myelin], dtype=np.float64
+        ),
+        "fe_x": np.array([x for x, y, mag in free_energies], dtype=np.float64),
+        "fe_y": np.array([y for x, y, mag in free_energies], dtype=np.float64),
+        "fe_mag": np.array([mag for x, y, mag in free_energies], dtype=np.float64),
+    }
+
+
+def get_element(model, field, index):
+
+    # A readable name for element `index` of `field`.
+    if field.startswith("node_"):
+
+        return f"node {model.nodes[index].unique_id}"
+
+    if field.startswith("nerve_"):
+
+        return f"nerve {model.nerves[index].unique_id}"
+
+    if field == "myelin":
+
+        for nerve in model.nerves:
+
+            if index < nerve.length:
+
+                return f"nerve {nerve.unique_id} cell {index}"
+
+            index -= nerve.length
+
+    return f"free energy {index}"
+
+
+@dataclasses.dataclass
+class Divergence:
+
+    tick: int
+    # None when the engines were compared once per tick.
+    phase: typing.Optional[str]
+    field: str
+    index: int
+    element: str
+    reference: typing.Any
+    alternative: typing.Any
+    # Elements of the field out of tolerance and the largest difference.
+    count: int = 1
+    max_error: float = 0
+
+
+@dataclasses.dataclass
+class VerifyResult:
+
+    ticks: int
+    divergence: typing.Optional[Divergence] = None
+
+    @property
+    def ok(self):
+
+        return self.divergence is None
+
+
+def compare(reference, alternative, rtol=0, atol=0):
+
+    # The first field and element (in field order) out of tolerance, or None.
+    expected = get_comparable(reference)
+    actual = get_comparable(alternative)
+
+    for field, reference_values in expected.items():
+
+        values = actual[field]
+
+        if values.shape != reference_values.shape:
+
+            return field, -1, reference_values.shape, values.shape, 1, np.inf
+
+        if reference_values.dtype == np.bool_:
+
+            wrong = reference_values != values
+
+        else:
+
+            # Equal infinities (spent free energies) are close, NaN never is.
+            with np.errstate(invalid="ignore"):
+
+                wrong = ~np.isclose(values, reference_values, rtol=rtol, atol=atol)
+
+        wrong_nums = np.flatnonzero(wrong)
+
+        if len(wrong_nums):
+
+            index = int(wrong_nums[0])
+
+            with np.errstate(invalid="ignore"):
+
+                error = np.abs(
+                    values[wrong_nums].astype(np.float64)
+                    - reference_values[wrong_nums].astype(np.float64)
+                ).max()
+
+            return (
+                field,
+                index,
+                reference_values[index].item(),
+                values[index].item(),
+                len(wrong_nums),
+                float(error),
+            )
+
+    return None
+
+
+def get_phases(engine):
+
+    keywords = getattr(getattr(engine, "advance", None), "keywords", {})
+
+    if not all(name in keywords for name in phase_names):
+
+        return None
+
+    return [keywords[name] for name in phase_names]
+
+
+def verify(
+    get_model,
+    get_engine=neurons.engine.ArrayModel,
+    steps=600,
+    dt=1 / 60,
+    seed=0,
+    rtol=0,
+    atol=0,
+    phases=True,
+):
+
+    # get_model builds the network (and must build the same one every call),
+    # get_engine wraps a second copy of it as the engine under test.
+    reference = get_model()
+    alternative = get_engine(get_model())
+
+    reference_phases = get_phases(reference)
+    alternative_phases = get_phases(alternative) if phases else None
+
+    result = VerifyResult(ticks=0)
+
+    def check(tick, phase):
+
+        mismatch = compare(reference, alternative, rtol=rtol, atol=atol)
+
+        if mismatch is None:
+
+            return False
+
+        field, index, expected, actual, count, max_error = mismatch
+
+        result.divergence = Divergence(
+            tick=tick,
+            phase=phase,
+            field=field,
+            index=index,
+            element=get_element(reference, field, index) if index >= 0 else "shape",
+            reference=expected,
+            alternative=actual,
+            count=count,
+            max_error=max_error,
+        )
+
+        log.info("diverged: %s", result.divergence)
+
+        return True
+
+    neurons.model.rng.seed(seed)
+    np.random.seed(seed)
+
+    if check(0, None):
+
+        return result
+
+    for tick in range(1, steps + 1):
+
+        if alternative_phases is None:
+
+            random_state = (neurons.model.rng.getstate(), np.random.get_state())
+
+            reference.advance(dt=dt)
+
+            advanced_state = (neurons.model.rng.getstate(), np.random.get_state())
+
+            neurons.model.rng.setstate(random_state[0])
+            np.random.set_state(random_state[1])
+
+            alternative.advance_many(1, dt)
+
+            neurons.model.rng.setstate(advanced_state[0])
+            np.random.set_state(advanced_state[1])
+
+            if check(tick, None):
+
+                return result
+
+        else:
+
+            for name, reference_phase, alternative_phase in zip(
+                phase_names, reference_phases, alternative_phases
+            ):
+
+                random_state = (neurons.model.rng.getstate(), np.random.get_state())
+
+                reference_phase(dt)
+
+                advanced_state = (neurons.model.rng.getstate(), np.random.get_state())
+
+                neurons.model.rng.setstate(random_state[0])
+                np.random.set_state(random_state[1])
+
+                alternative_phase(dt)
+
+                neurons.model.rng.setstate(advanced_state[0])
+                np.random.set_state(advanced_state[1])
+
+                if check(tick, name):
+
+                    return result
+
+        result.ticks = tick
+
+    return result
+
+
+def get_random_network(node_count, nerve_count, seed):
+
+    # A random network with random starting energies so it is active from
+    # the first tick.
+    model = neurons.model.get_random_model(node_count, nerve_count, seed=seed)
+
+    network_rng = random.Random(seed)
+
+    for node in model.nodes:
+
+        node.energy = network_rng.uniform(0, model.energy_start_firing_threshold * 1.5)
+
+    return model
+
+
+def verify_many(
+    get_engine=neurons.engine.ArrayModel,
+    seeds=range(10),
+    node_count=100,
+    nerve_count=50,
+    **verify_kwargs,
+):
+
+    # Yields (seed, result) for a generated network per seed.
+    for seed in seeds:
+
+        get_model = functools.partial(get_random_network, node_count, nerve_count, seed)
+
+        yield seed, verify(get_model, get_engine, seed=seed, **verify_kwargs)
+
+
+def main():
+
+    for phases in [True, False]:
+
+        for seed, result in verify_many(phases=phases):
+
+            log.info(
+                "%s seed %s: %s ticks %s",
+                "phased" if phases else "fused",
+                seed,
+                result.ticks,
+                "ok" if result.ok else result.divergence,
+            )
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)-4s %(name)s %(message)s",
+        style="%",
+    )
+
+    main()
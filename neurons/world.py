@@ -1,8 +1,10 @@
 import collections, datetime, functools, itertools, os
 import json, logging, pathlib, random, re
 import time
+from timeit import default_timer as timer
 from neurons.model import Nerve
 import math
+import numpy as np
 
 log = logging.getLogger(__name__)
 log.silent = functools.partial(log.log, 0)
@@ -104,11 +106,148 @@ class Agent:
         return f"{self.icon}(motor={self.motor.output:+0.2f})"
 
 
+class ArrayWorld:
+
+    # World with agent state held as (world_count, agent_count) arrays, so
+    # many independent tracks advance together. Sensor and motor values live
+    # in arrays named after the Agent nerves they replace.
+    friction = World.friction
+
+    def __init__(self, size=100, agent_count=3, world_count=1, target_pos=None):
+
+        self.size = size
+
+        shape = (world_count, agent_count)
+
+        self.pos = np.array(
+            [rng.randrange(self.size) for num in range(world_count * agent_count)],
+            dtype=np.float64,
+        ).reshape(shape)
+
+        self.vel = np.zeros(shape)
+        self.accel = np.zeros(shape)
+
+        self.contact_sensor = np.zeros(shape)
+        self.position_sensor = np.zeros(shape)
+        self.target_sensor = np.zeros(shape)
+        self.motor = np.zeros(shape)
+
+        if target_pos is None:
+
+            target_pos = [rng.randrange(self.size) for num in range(world_count)]
+
+        self.target_pos = np.broadcast_to(
+            np.asarray(target_pos, dtype=np.float64), (world_count,)
+        ).copy()
+
+        self.icons = [chr(ord("A") + num % 26) for num in range(agent_count)]
+
+    @property
+    def world_count(self):
+
+        return self.pos.shape[0]
+
+    @property
+    def agent_count(self):
+
+        return self.pos.shape[1]
+
+    def from_world(world):
+
+        array_world = ArrayWorld(
+            size=world.size,
+            agent_count=len(world.agents),
+            target_pos=world.target_pos,
+        )
+
+        for num, agent in enumerate(world.agents):
+
+            array_world.pos[0, num] = agent.pos
+            array_world.vel[0, num] = agent.vel
+            array_world.accel[0, num] = agent.accel
+            array_world.contact_sensor[0, num] = agent.contact_sensor.output
+            array_world.position_sensor[0, num] = agent.position_sensor.output
+            array_world.target_sensor[0, num] = agent.target_sensor.output
+            array_world.motor[0, num] = agent.motor.output
+
+        array_world.icons = [agent.icon for agent in world.agents]
+
+        return array_world
+
+    def render(self, world_num=0):
+
+        char_buffer = ["_"] * self.size
+
+        for icon, pos in zip(self.icons, self.pos[world_num].tolist()):
+
+            char_buffer[math.floor(pos)] = icon
+
+        return "".join(char_buffer)
+
+    def update(self, dt):
+
+        self.update_inputs(dt=dt)
+        self.update_state(dt=dt)
+
+    def get_contact(self):
+
+        # World.update_inputs compares every pair with abs(a - b), without
+        # wrapping round the track. Along each sorted row an agent touches
+        # some other agent exactly when it touches a sorted neighbour.
+        order = np.argsort(self.pos, axis=1, kind="stable")
+
+        sorted_pos = np.take_along_axis(self.pos, order, axis=1)
+
+        close = np.diff(sorted_pos, axis=1) < Agent.contact_radius
+
+        sorted_contact = np.zeros(self.pos.shape, dtype=np.bool_)
+
+        sorted_contact[:, 1:] |= close
+        sorted_contact[:, :-1] |= close
+
+        contact = np.empty_like(sorted_contact)
+
+        np.put_along_axis(contact, order, sorted_contact, axis=1)
+
+        return contact
+
+    def update_inputs(self, dt):
+
+        # Like the Agent nerve, the contact sensor keeps its last value while
+        # out of contact.
+        np.copyto(
+            self.contact_sensor, Agent.contact_constant * dt, where=self.get_contact()
+        )
+
+        np.multiply(self.pos, dt, out=self.position_sensor)
+
+        np.subtract(self.pos, self.target_pos[:, None], out=self.target_sensor)
+        np.abs(self.target_sensor, out=self.target_sensor)
+
+    def update_state(self, dt):
+
+        self.vel += self.accel
+        self.vel -= self.vel * self.friction * dt
+
+        self.pos += self.vel
+        np.remainder(self.pos, self.size, out=self.pos)
+
+        np.copyto(self.accel, self.motor)
+
+
 class DummyModel:
-    def __init__(self, world):
+
+    # headless skips clearing the terminal and sleeping, so the world runs as
+    # fast as the CPU allows. dt=None draws each tick's dt from 0.1-0.2s as
+    # before, render_every=None never renders.
+    def __init__(self, world, headless=False, dt=None, render_every=1):
 
         self.world = world
+        self.headless = headless
+        self.dt = dt
+        self.render_every = render_every
         self.run_time = 0
+        self.ticks = 0
         self.accelerations = [
             dict(
                 accel=rng.choice([-1, 0, 1]),
@@ -118,9 +257,7 @@ class DummyModel:
             for agent in self.world.agents
         ]
 
-    def tick(self):
-
-        os.system("clear")
+    def render(self):
 
         log.info(
             "time: %5.1f. world=%s agents=%s %s",
@@ -133,7 +270,17 @@ class DummyModel:
             ),
         )
 
-        sleep_time = rng.uniform(0.1, 0.2)
+    def tick(self):
+
+        if not self.headless:
+
+            os.system("clear")
+
+        if self.render_every and self.ticks % self.render_every == 0:
+
+            self.render()
+
+        dt = rng.uniform(0.1, 0.2) if self.dt is None else self.dt
 
         for accel in self.accelerations:
 
@@ -142,18 +289,24 @@ class DummyModel:
                 accel["duration"] = rng.uniform(1, 5)
                 accel["accel"] = rng.choice([-1, 0, 1])
 
-            accel["agent"].motor.output = accel["accel"] * sleep_time
-            accel["duration"] -= sleep_time
+            accel["agent"].motor.output = accel["accel"] * dt
+            accel["duration"] -= dt
 
-        time.sleep(sleep_time)
+        if not self.headless:
 
-        self.world.update(dt=sleep_time)
+            time.sleep(dt)
 
-        self.run_time += sleep_time
+        self.world.update(dt=dt)
 
-    def run(self, max_time):
+        self.run_time += dt
+        self.ticks += 1
+
+    def run(self, max_time, max_ticks=None):
 
         self.run_time = 0
+        self.ticks = 0
+
+        start = timer()
 
         while True:
 
@@ -163,7 +316,22 @@ class DummyModel:
 
                 break
 
-        log.info("finished. Time %s", self.run_time)
+            if max_ticks is not None and self.ticks >= max_ticks:
+
+                break
+
+        wall_time = timer() - start
+
+        stats = {
+            "ticks": self.ticks,
+            "sim_time": self.run_time,
+            "wall_time": wall_time,
+            "sim_seconds_per_wall_second": self.run_time / wall_time,
+        }
+
+        log.info("finished. Time %s. %s", self.run_time, stats)
+
+        return stats
 
 
 def main():